@@ -0,0 +1,127 @@
+"""Measure the import and cold-start cost of the Lambda handlers.
+
+Each measurement runs in a fresh Python process, so module and botocore model caches start cold,
+just like a new Lambda container. Three things are compared for every handler:
+
+- eager: importing boto3 and creating the handler's clients at import time, as the handlers used to
+- lazy import: importing the handler module, which now defers client creation
+- first call: creating the handler's clients on first use through helpers.clients
+
+Usage:
+    python benchmarks/cold_start.py [--runs 5] [--json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+# Directory holding the handlers and helpers
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda')
+
+# Clients used by each handler
+HANDLER_CLIENTS: Dict[str, List[str]] = {
+    'trigger': ['s3', 'stepfunctions'],
+    'transcribe': ['s3', 'transcribe'],
+    'status_transcription': ['s3', 'transcribe'],
+    'translate': ['translate', 's3'],
+    'status_translation': ['s3'],
+    'synthesize': ['s3', 'polly'],
+    'status_synthesis': ['s3'],
+}
+
+# Code timing the old pattern: import boto3 and create every client up front
+EAGER_SNIPPET = """
+import time
+start = time.perf_counter()
+import boto3
+clients = [boto3.client(name) for name in {clients!r}]
+print(time.perf_counter() - start)
+"""
+
+# Code timing the import of a handler module
+LAZY_IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import {handler}
+print(time.perf_counter() - start)
+"""
+
+# Code timing the creation of the handler's clients on first use, after the import
+FIRST_CALL_SNIPPET = """
+import time
+import {handler}
+from helpers.clients import get_client
+start = time.perf_counter()
+clients = [get_client(name) for name in {clients!r}]
+print(time.perf_counter() - start)
+"""
+
+def run_snippet(snippet: str) -> float:
+    """Run a timing snippet in a fresh interpreter.
+
+    Args:
+        snippet (str): The code to run, which prints the elapsed seconds.
+
+    Returns:
+        float: The elapsed seconds.
+    """
+
+    # Provide a region and dummy credentials so clients can be created offline
+    env = dict(os.environ)
+    env.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    env.setdefault('AWS_ACCESS_KEY_ID', 'benchmark')
+    env.setdefault('AWS_SECRET_ACCESS_KEY', 'benchmark')
+
+    # Run the snippet from the Lambda directory and parse its output
+    output = subprocess.run([sys.executable, '-c', snippet], cwd=LAMBDA_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+def measure(snippet: str, runs: int) -> float:
+    """Get the median elapsed time of a snippet over several runs, in milliseconds.
+
+    Args:
+        snippet (str): The timing snippet.
+        runs (int): The number of runs.
+
+    Returns:
+        float: The median elapsed milliseconds.
+    """
+
+    # Run the snippet repeatedly and take the median
+    return statistics.median(run_snippet(snippet) for _ in range(runs)) * 1000
+
+def main() -> None:
+    """Run the benchmark and print the results."""
+
+    # Parse the command line
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='runs per measurement (default: 5)')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    # Measure each handler
+    results = {}
+    for handler, clients in HANDLER_CLIENTS.items():
+        results[handler] = {
+            'eager_ms': round(measure(EAGER_SNIPPET.format(clients=clients), args.runs), 1),
+            'lazy_import_ms': round(measure(LAZY_IMPORT_SNIPPET.format(handler=handler), args.runs), 1),
+            'first_call_ms': round(measure(FIRST_CALL_SNIPPET.format(handler=handler, clients=clients), args.runs), 1),
+        }
+
+    # Print the results as JSON
+    if args.json:
+        print(json.dumps({'runs': args.runs, 'results': results}, indent=2))
+        return
+
+    # Print the results as a table
+    print(f"{'handler':<22}{'eager (ms)':>12}{'lazy import (ms)':>18}{'first call (ms)':>17}")
+    for handler, result in results.items():
+        print(f"{handler:<22}{result['eager_ms']:>12}{result['lazy_import_ms']:>18}{result['first_call_ms']:>17}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Measure the per-invocation cost of the handlers' logging at each log level.
+
+A typical invocation is replayed: the received event is logged at INFO, a handful of small messages
+at DEBUG, and an intermediate result at DEBUG. It is timed twice at each level, once serializing
+the payloads eagerly with json.dumps, as the handlers used to, and once with helpers.logger.LazyJson.
+Records are written to os.devnull, so only the logging work itself is measured.
+
+Usage:
+    python benchmarks/logging_overhead.py [--iterations 2000] [--json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+from typing import Any, Callable, Dict
+
+# Make the helpers importable
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda'))
+
+from helpers.logger import LazyJson, handler, logger, set_log_level
+
+# Log levels to measure
+LEVELS = ['DEBUG', 'INFO', 'WARNING']
+
+def build_event() -> Dict[str, Any]:
+    """Build an event shaped like the synthesis input, with a long transcript excerpt.
+
+    Returns:
+        Dict[str, Any]: The event.
+    """
+
+    # Results for a dozen languages and a large text field
+    results = {f'l{index}': f's3://bucket/translations/recording_translation_l{index}.txt' for index in range(12)}
+    return {
+        'bucket': 'bucket',
+        'key': 'audio_inputs/recording.mp3',
+        'target_languages': list(results),
+        'transcript': 'The quick brown fox jumps over the lazy dog. ' * 400,
+        'translationResult': {'statusCode': 200, 'body': json.dumps({'results': results})}
+    }
+
+def invocation(wrap: Callable[[Any], Any], event: Dict[str, Any]) -> None:
+    """Replay the logging of one invocation.
+
+    Args:
+        wrap (Callable[[Any], Any]): How payloads are passed to the logger.
+        event (Dict[str, Any]): The received event.
+    """
+
+    # Log like a handler does
+    logger.info("Received event: %s", wrap(event))
+    for language in event['target_languages'][:5]:
+        logger.debug("Processing language: %s", language)
+    logger.debug("Intermediate result: %s", wrap(event['translationResult']))
+    logger.info("Finished processing %d language(s).", len(event['target_languages']))
+
+def main() -> None:
+    """Run the benchmark and print the results."""
+
+    # Parse the command line
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=2000, help='invocations per measurement (default: 2000)')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    # Discard the log output
+    handler.setStream(open(os.devnull, 'w'))
+    event = build_event()
+
+    # Time each level with eager and lazy serialization
+    results = {}
+    for level in LEVELS:
+        set_log_level(level)
+        eager = timeit.timeit(lambda: invocation(json.dumps, event), number=args.iterations)
+        lazy = timeit.timeit(lambda: invocation(LazyJson, event), number=args.iterations)
+        results[level] = {
+            'eager_us': round(eager / args.iterations * 1e6, 1),
+            'lazy_us': round(lazy / args.iterations * 1e6, 1)
+        }
+
+    # Print the results as JSON
+    if args.json:
+        print(json.dumps({'iterations': args.iterations, 'results': results}, indent=2))
+        return
+
+    # Print the results as a table
+    print(f"{'level':<10}{'eager (us/invocation)':>24}{'lazy (us/invocation)':>23}")
+    for level, result in results.items():
+        print(f"{level:<10}{result['eager_us']:>24}{result['lazy_us']:>23}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+"""Measure per-handler latency, end-to-end latency and files per minute of the whole pipeline.
+
+The pipeline runs in-process through local_runner, against fake AWS services whose latency is
+modelled per operation, so only the time spent in the handlers and the modelled AWS calls counts.
+Transcription waits are simulated and reported separately. Every combination of the swept settings
+is run, and the results are saved as JSON for comparison across commits:
+
+    python benchmarks/pipeline_throughput.py --words 200,2000 --languages 1,3 --workers 1,4
+    python benchmarks/pipeline_throughput.py --compare benchmarks/results/<earlier run>.json
+
+Settings:
+- words: transcript length in words
+- languages: number of target languages
+- workers: concurrent requests per language and languages per function (the *_MAX_WORKERS variables)
+- parallel: executions run at once
+- batch-size: uploads processed by one execution (MAX_BATCH_SIZE)
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+# Make the local runner importable; the pipeline module puts the handlers on the path first
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, REPO_DIR)
+
+from local_runner.pipeline import LocalPipeline
+from local_runner.fake_aws import FakeBehaviour, generate_text
+
+# Target languages used for the language sweep, in order
+LANGUAGES = ['es', 'fr', 'de', 'it', 'pt', 'ja', 'ko', 'nl', 'sv', 'pl']
+
+# Default directory of the saved results
+RESULTS_DIR = os.path.join(REPO_DIR, 'benchmarks', 'results')
+
+def parse_ints(value: str) -> List[int]:
+    """Parse a comma-separated list of integers.
+
+    Args:
+        value (str): The list, e.g. '1,4'.
+
+    Returns:
+        List[int]: The integers.
+    """
+
+    # Split and convert the values
+    return [int(item) for item in value.split(',') if item.strip()]
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """Summarize a list of milliseconds.
+
+    Args:
+        values (List[float]): The values.
+
+    Returns:
+        Dict[str, float]: The count, mean, p50, p95 and max.
+    """
+
+    # Compute the statistics
+    ordered = sorted(values)
+    return {
+        'count': len(ordered),
+        'mean': round(statistics.fmean(ordered), 1),
+        'p50': round(ordered[len(ordered) // 2], 1),
+        'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1),
+        'max': round(ordered[-1], 1)
+    }
+
+def run_case(words: int, languages: int, workers: int, parallel: int, files: int, behaviour: Dict[str, Any],
+             use_cache: bool, batch_size: int = 1) -> Dict[str, Any]:
+    """Run one combination of settings.
+
+    Args:
+        words (int): The transcript length in words.
+        languages (int): The number of target languages.
+        workers (int): The concurrency of the handlers.
+        parallel (int): The executions run at once.
+        files (int): The number of files processed.
+        behaviour (Dict[str, Any]): The latency model of the fake services.
+        use_cache (bool): Whether the transcript, translation and audio caches are enabled.
+        batch_size (int): The maximum number of files processed by one execution.
+
+    Returns:
+        Dict[str, Any]: The settings and the measured latencies and throughput.
+    """
+
+    # Configure the handlers for the case
+    environment = {
+        'LOG_LEVEL': 'ERROR',
+        'TARGET_LANGUAGES': ','.join(LANGUAGES[:languages]),
+        'TRANSLATE_MAX_WORKERS': str(workers),
+        'TRANSLATE_CHUNK_MAX_WORKERS': str(workers),
+        'SYNTHESIZE_MAX_WORKERS': str(workers),
+        'SYNTHESIZE_CHUNK_MAX_WORKERS': str(workers),
+        'MAX_BATCH_SIZE': str(batch_size),
+    }
+    if not use_cache:
+        environment.update({f'{name}_CACHE_BACKEND': 'none' for name in ('TRANSCRIPT', 'TRANSLATION', 'AUDIO')})
+    pipeline = LocalPipeline(behaviour=FakeBehaviour(behaviour), environment=environment,
+                             transcript_text=lambda data: generate_text(words, len(data)))
+
+    # Upload distinct files and process them
+    keys = []
+    for index in range(files):
+        key = f'audio_inputs/bench-{index:03d}.mp3'
+        pipeline.upload(key, index.to_bytes(4, 'big') * 256)
+        keys.append(key)
+    report = pipeline.process(keys, parallel)
+
+    # Collect the latency of each Task state and of each execution
+    handlers: Dict[str, List[float]] = {}
+    for execution in report['executions']:
+        for state in execution['history']:
+            if state['type'] == 'Task':
+                handlers.setdefault(state['state'], []).append(state['elapsed_ms'])
+
+    # Summarize the case, counting the files of batch executions one by one
+    succeeded = [execution for execution in report['executions'] if execution['status'] == 'SUCCEEDED']
+    succeeded_files = sum(len(execution['key'].split(', ')) for execution in succeeded)
+    return {
+        'settings': {'words': words, 'languages': languages, 'workers': workers, 'parallel': parallel,
+                     'files': files, 'cache': use_cache, 'batch_size': batch_size},
+        'succeeded': succeeded_files,
+        'failed': files - succeeded_files,
+        'executions': len(report['executions']),
+        'transitions_per_file': round(sum(len(execution['history']) for execution in report['executions']) / files, 1),
+        'handler_ms': {name: summarize(values) for name, values in handlers.items()},
+        'end_to_end_ms': summarize([execution['elapsed_ms'] for execution in report['executions']]),
+        'simulated_wait_seconds': summarize([execution['wait_seconds'] for execution in report['executions']]),
+        'total_ms': report['elapsed_ms'],
+        'files_per_minute': round(succeeded_files / (report['elapsed_ms'] / 60000), 1) if report['elapsed_ms'] else 0.0
+    }
+
+def case_name(settings: Dict[str, Any]) -> str:
+    """Name a case by its settings.
+
+    Args:
+        settings (Dict[str, Any]): The settings.
+
+    Returns:
+        str: The name, e.g. 'words=200 languages=3 workers=4 parallel=1', with the batch size when it is not 1.
+    """
+
+    # Join the swept settings, leaving out the default batch size so earlier runs still compare
+    names = ('words', 'languages', 'workers', 'parallel') + (('batch_size',) if settings.get('batch_size', 1) != 1 else ())
+    return ' '.join(f'{name}={settings[name]}' for name in names)
+
+def git_commit() -> Optional[str]:
+    """Get the current commit of the repository.
+
+    Returns:
+        Optional[str]: The short commit hash, or None outside a git checkout.
+    """
+
+    # Ask git for the commit
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_results(results: List[Dict[str, Any]], baseline: Optional[Dict[str, Any]] = None) -> None:
+    """Print the results as a table, with the change from a baseline run when given.
+
+    Args:
+        results (List[Dict[str, Any]]): The results of the cases.
+        baseline (Optional[Dict[str, Any]]): An earlier saved run.
+    """
+
+    # Index the baseline cases by name
+    previous = {case_name(case['settings']): case for case in (baseline or {}).get('results', [])}
+
+    # Print one row per case
+    print(f"{'case':<60}{'e2e p50 (ms)':>14}{'e2e p95 (ms)':>14}{'files/min':>11}{'failed':>8}")
+    for case in results:
+        name = case_name(case['settings'])
+        row = f"{name:<60}{case['end_to_end_ms']['p50']:>14}{case['end_to_end_ms']['p95']:>14}{case['files_per_minute']:>11}{case['failed']:>8}"
+        if name in previous:
+            before = previous[name]['end_to_end_ms']['p50']
+            row += f"   p50 {(case['end_to_end_ms']['p50'] - before) / before * 100:+.1f}% vs {baseline.get('commit')}" if before else ''
+        print(row)
+
+def main() -> None:
+    """Run the sweep, save the results and print them."""
+
+    # Parse the command line
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--words', type=parse_ints, default=[200, 2000, 10000], help='transcript lengths (default: 200,2000,10000)')
+    parser.add_argument('--languages', type=parse_ints, default=[1, 3, 6], help='numbers of languages (default: 1,3,6)')
+    parser.add_argument('--workers', type=parse_ints, default=[1, 4], help='handler concurrency settings (default: 1,4)')
+    parser.add_argument('--parallel', type=parse_ints, default=[1], help='executions run at once (default: 1)')
+    parser.add_argument('--batch-size', type=parse_ints, default=[1], help='files processed per execution (default: 1)')
+    parser.add_argument('--files', type=int, default=3, help='files processed per case (default: 3)')
+    parser.add_argument('--latency-scale', type=float, default=1.0, help='multiplier of the modelled latency (default: 1)')
+    parser.add_argument('--profile', help='JSON file with the latency model (see local_runner.fake_aws.FakeBehaviour)')
+    parser.add_argument('--cache', action='store_true', help='keep the transcript, translation and audio caches enabled')
+    parser.add_argument('--output', help='where to save the results (default: benchmarks/results/pipeline-<commit>-<time>.json)')
+    parser.add_argument('--compare', help='an earlier results file to compare with')
+    args = parser.parse_args()
+
+    # Load the latency model
+    behaviour: Dict[str, Any] = {}
+    if args.profile:
+        with open(args.profile, 'r', encoding='utf-8') as profile_file:
+            behaviour = json.load(profile_file)
+    behaviour['latency_scale'] = args.latency_scale
+
+    # Run every combination of the settings
+    results = []
+    for words, languages, workers, parallel, batch_size in itertools.product(args.words, args.languages, args.workers,
+                                                                            args.parallel, args.batch_size):
+        results.append(run_case(words, languages, workers, parallel, args.files, behaviour, args.cache, batch_size))
+        print(f"done: {case_name(results[-1]['settings'])}", file=sys.stderr)
+
+    # Save the results
+    commit = git_commit()
+    run = {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'behaviour': behaviour,
+        'results': results
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"pipeline-{commit or 'unknown'}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as output_file:
+        json.dump(run, output_file, indent=2)
+
+    # Print the results, compared with the baseline if given
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+    print_results(results, baseline)
+    print(f'Saved to {output}')
+
+if __name__ == '__main__':
+    main()
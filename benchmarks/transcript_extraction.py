@@ -0,0 +1,136 @@
+"""Measure the time and peak memory of extracting the text from an Amazon Transcribe JSON output.
+
+The JSON output of a transcription job is generated for each transcript length, with one item per
+word as Amazon Transcribe writes them, and the text is extracted twice: by reading the whole body
+and parsing it with json.loads, as the transcript helpers used to, and by streaming it through
+helpers.json_stream.JsonStreamReader in 64 KiB chunks. Peak memory is measured with tracemalloc.
+
+Usage:
+    python benchmarks/transcript_extraction.py [--words 1000,10000,100000] [--json]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterator, List
+
+# Make the helpers importable
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda'))
+
+from helpers.json_stream import JsonStreamReader
+from helpers.transcript import TRANSCRIPT_READ_CHUNK_SIZE, TRANSCRIPT_TEXT_PATH
+
+# Words the generated transcripts are made of
+VOCABULARY = ['the', 'quick', 'brown', 'fox', 'jumps', 'over', 'lazy', 'dog', 'speech', 'recognition', 'année', 'naïve']
+
+def build_output(words: int) -> bytes:
+    """Build an Amazon Transcribe JSON output.
+
+    Args:
+        words (int): The number of words transcribed.
+
+    Returns:
+        bytes: The UTF-8 encoded JSON output.
+    """
+
+    # Generate the words and one item per word
+    rng = random.Random(words)
+    transcript = [rng.choice(VOCABULARY) for _ in range(words)]
+    items = [{
+        'type': 'pronunciation', 'start_time': f'{index * 0.4:.2f}', 'end_time': f'{index * 0.4 + 0.35:.2f}',
+        'alternatives': [{'confidence': f'{rng.uniform(0.8, 1):.4f}', 'content': word}]
+    } for index, word in enumerate(transcript)]
+
+    # Lay the output out as Amazon Transcribe does
+    return json.dumps({
+        'jobName': 'benchmark', 'accountId': '123456789012', 'status': 'COMPLETED',
+        'results': {'transcripts': [{'transcript': ' '.join(transcript)}], 'items': items}
+    }).encode('utf-8')
+
+def extract_with_json_loads(body: bytes) -> str:
+    """Extract the text by reading and parsing the whole output.
+
+    Args:
+        body (bytes): The JSON output.
+
+    Returns:
+        str: The transcribed text.
+    """
+
+    # Read the body in full, as StreamingBody.read() does, and parse it
+    data = bytes(body)
+    return json.loads(data.decode('utf-8'))['results']['transcripts'][0]['transcript']
+
+def extract_with_stream(body: bytes) -> str:
+    """Extract the text by streaming the output in chunks.
+
+    Args:
+        body (bytes): The JSON output.
+
+    Returns:
+        str: The transcribed text.
+    """
+
+    # Read the body in chunks, as StreamingBody.iter_chunks() does
+    def chunks() -> Iterator[bytes]:
+        for start in range(0, len(body), TRANSCRIPT_READ_CHUNK_SIZE):
+            yield body[start:start + TRANSCRIPT_READ_CHUNK_SIZE]
+
+    # Stream the text, joined here only to compare it with the other method
+    return ''.join(JsonStreamReader(chunks()).iter_string(TRANSCRIPT_TEXT_PATH))
+
+def measure(extract: Callable[[bytes], str], body: bytes) -> Dict[str, Any]:
+    """Time one extraction and measure its peak memory.
+
+    Args:
+        extract (Callable[[bytes], str]): The extraction method.
+        body (bytes): The JSON output.
+
+    Returns:
+        Dict[str, Any]: The elapsed milliseconds, the peak memory in KiB and the extracted text.
+    """
+
+    # Measure the time without tracing, then the memory with it
+    started = time.perf_counter()
+    text = extract(body)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    tracemalloc.start()
+    extract(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'elapsed_ms': round(elapsed_ms, 1), 'peak_kib': round(peak / 1024, 1), 'text': text}
+
+def main() -> None:
+    """Run the benchmark and print the results."""
+
+    # Parse the command line
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--words', default='1000,10000,100000', help='transcript lengths (default: 1000,10000,100000)')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    # Measure both methods for each transcript length
+    results: List[Dict[str, Any]] = []
+    for words in [int(value) for value in args.words.split(',') if value.strip()]:
+        body = build_output(words)
+        loads = measure(extract_with_json_loads, body)
+        stream = measure(extract_with_stream, body)
+        if loads.pop('text') != stream.pop('text'):
+            raise SystemExit(f'The extracted texts differ for {words} words')
+        results.append({'words': words, 'json_kib': round(len(body) / 1024, 1), 'json_loads': loads, 'stream': stream})
+
+    # Print the results
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'words':>8}{'JSON (KiB)':>12}{'loads ms':>10}{'loads KiB':>11}{'stream ms':>11}{'stream KiB':>12}")
+    for result in results:
+        print(f"{result['words']:>8}{result['json_kib']:>12}{result['json_loads']['elapsed_ms']:>10}"
+              f"{result['json_loads']['peak_kib']:>11}{result['stream']['elapsed_ms']:>11}{result['stream']['peak_kib']:>12}")
+
+if __name__ == '__main__':
+    main()
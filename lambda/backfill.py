@@ -0,0 +1,362 @@
+import hashlib
+import json
+import os
+import uuid
+from datetime import datetime, timezone
+from botocore.exceptions import ClientError
+from typing import Any, Dict, Optional
+from helpers.logger import DEFAULT_LOG_LEVEL, LazyJson, set_log_level, logger
+from helpers.clients import LazyClient
+from helpers.executions import ALREADY_STARTED, FAILED, STARTED, start_execution
+from helpers.languages import get_target_languages, get_voice
+from helpers.media_format import EXTENSION_FORMATS
+from helpers.metrics import instrumented
+from helpers.output_keys import TRANSCRIPT_LANGUAGE_CODE, get_audio_key, get_base_name, get_synthesis_output_id, get_transcript_key, get_transcription_output_id, get_translation_key, get_translation_output_id
+from helpers.rate_limit import TokenBucket
+from helpers.s3_exists import EXISTS, check_objects_exist
+from helpers.s3_uri import S3Location
+
+# Initialize Boto3 clients, created on first use
+s3 = LazyClient('s3')
+stepfunctions = LazyClient('stepfunctions')
+lambda_client = LazyClient('lambda')
+
+# Default prefix of the audio files to backfill
+DEFAULT_PREFIX = 'audio_inputs/'
+
+# Prefix of the backfill checkpoints
+CHECKPOINT_PREFIX = 'backfill/checkpoints/'
+
+# Default Amazon Transcribe concurrent job quota and expected job duration, which set the default start rate
+DEFAULT_TRANSCRIBE_CONCURRENT_JOBS = 100
+DEFAULT_EXPECTED_JOB_SECONDS = 300
+
+# Default number of executions started back to back before the rate limit applies
+DEFAULT_BURST = 10
+
+# Default number of keys listed per page
+DEFAULT_PAGE_SIZE = 1000
+
+# Default suffixes of the files to backfill, those of every media format Amazon Transcribe accepts
+DEFAULT_SUFFIXES = ','.join(EXTENSION_FORMATS)
+
+# Seconds kept in reserve to save the checkpoint and hand over to the next invocation
+TIME_MARGIN_SECONDS = 30
+
+# Maximum number of failed keys kept in the checkpoint
+MAX_FAILED_KEYS = 100
+
+# Backfill states
+RUNNING = 'RUNNING'
+PAUSED = 'PAUSED'
+COMPLETED = 'COMPLETED'
+
+def get_rate_per_second() -> float:
+    """Get the rate at which executions are started.
+
+    BACKFILL_RATE_PER_SECOND wins; otherwise the rate keeps Amazon Transcribe at its concurrent
+    job quota (BACKFILL_TRANSCRIBE_CONCURRENT_JOBS) for jobs lasting BACKFILL_EXPECTED_JOB_SECONDS,
+    so the backfill does not get throttled by StartTranscriptionJob or crowd out new uploads.
+
+    Returns:
+        float: The executions started per second.
+    """
+
+    # Use the configured rate, if any
+    rate = os.environ.get('BACKFILL_RATE_PER_SECOND')
+    if rate:
+        return float(rate)
+
+    # Derive the rate from the quota and the expected job duration
+    concurrent_jobs = int(os.environ.get('BACKFILL_TRANSCRIBE_CONCURRENT_JOBS', DEFAULT_TRANSCRIBE_CONCURRENT_JOBS))
+    expected_seconds = float(os.environ.get('BACKFILL_EXPECTED_JOB_SECONDS', DEFAULT_EXPECTED_JOB_SECONDS))
+    return concurrent_jobs / expected_seconds
+
+def execution_name(backfill_id: str, bucket: str, key: str) -> str:
+    """Build the execution name of a backfilled file.
+
+    The name is the same every time the backfill reaches the file, so Step Functions refuses to
+    start it twice when a page is retried after a pause or failure.
+
+    Args:
+        backfill_id (str): The backfill ID.
+        bucket (str): The bucket holding the file.
+        key (str): The key of the file.
+
+    Returns:
+        str: The execution name, within the 80 characters Step Functions allows.
+    """
+
+    # Hash the backfill ID and the object
+    return f"backfill-{hashlib.sha256(f'{backfill_id}:{bucket}/{key}'.encode('utf-8')).hexdigest()[:40]}"
+
+def is_processed(bucket: str, key: str) -> bool:
+    """Check whether this version of an audio file was already processed into every target language.
+
+    The outputs are looked up under the deterministic keys the pipeline derives for them (see
+    helpers/output_keys.py): the transcript from the key and version of the file, the translations
+    from the transcript, and the audio from the translations. Another file with the same name, or
+    an earlier version of this one, therefore does not count.
+
+    Args:
+        bucket (str): The bucket holding the file and its outputs.
+        key (str): The key of the file.
+
+    Returns:
+        bool: True if the synthesized audio exists for every target language of the file.
+    """
+
+    # Try to look up the outputs of the file
+    try:
+
+        # Identify the version of the file and its target languages
+        head_response = s3.head_object(Bucket=bucket, Key=key)
+        target_languages = get_target_languages(head_response.get('Metadata', {}))
+        base_name = get_base_name(key.split('/')[-1])
+
+        # Derive the keys of the transcript and of its translation into each target language
+        transcript_key = get_transcript_key(
+            base_name, TRANSCRIPT_LANGUAGE_CODE,
+            get_transcription_output_id(bucket, key, head_response, TRANSCRIPT_LANGUAGE_CODE)
+        )
+        translation_keys = {
+            language: get_translation_key(base_name, language, get_translation_output_id(bucket, transcript_key, language, []))
+            for language in target_languages
+        }
+
+        # Derive the key of the audio of each language from its translation and voice
+        audio_keys = []
+        for language, translation_key in translation_keys.items():
+            voice = get_voice(language)
+            if not voice:
+                return False
+            audio_keys.append(get_audio_key(base_name, language, get_synthesis_output_id(S3Location(bucket, translation_key).uri, voice)))
+
+        # Check the transcript, the translations and the audio in turn, each group sharing a prefix to list
+        for keys in ([transcript_key], list(translation_keys.values()), audio_keys):
+            if any(status != EXISTS for status in check_objects_exist(s3, bucket, keys).values()):
+                return False
+
+        # Every output exists
+        return True
+
+    # Handle ClientError exceptions
+    except ClientError as e:
+
+        # Log a warning and process the file; the pipeline reuses whatever outputs exist
+        logger.warning("Could not check the outputs of s3://%s/%s: %s", bucket, key, e)
+        return False
+
+def load_checkpoint(bucket: str, backfill_id: str) -> Optional[Dict[str, Any]]:
+    """Load the checkpoint of a backfill.
+
+    Args:
+        bucket (str): The bucket holding the checkpoint.
+        backfill_id (str): The backfill ID.
+
+    Returns:
+        Optional[Dict[str, Any]]: The checkpoint, or None if the backfill has not started.
+    """
+
+    # Try to read the checkpoint
+    try:
+        response = s3.get_object(Bucket=bucket, Key=f'{CHECKPOINT_PREFIX}{backfill_id}.json')
+        return json.loads(response['Body'].read())
+
+    # A missing checkpoint means a new backfill
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+
+def save_checkpoint(bucket: str, checkpoint: Dict[str, Any]) -> None:
+    """Save the checkpoint of a backfill.
+
+    Args:
+        bucket (str): The bucket holding the checkpoint.
+        checkpoint (Dict[str, Any]): The checkpoint.
+    """
+
+    # Stamp and write the checkpoint
+    checkpoint['updated_at'] = datetime.now(timezone.utc).isoformat()
+    s3.put_object(Bucket=bucket, Key=f"{CHECKPOINT_PREFIX}{checkpoint['backfill_id']}.json",
+                  Body=json.dumps(checkpoint).encode('utf-8'), ContentType='application/json')
+
+def remaining_seconds(context: Any) -> Optional[float]:
+    """Get the time left in this invocation, less the margin to hand over.
+
+    Args:
+        context (Any): The context object provided by AWS Lambda.
+
+    Returns:
+        Optional[float]: The usable seconds, or None if the context does not tell.
+    """
+
+    # Read the remaining time from the context
+    if context is None or not hasattr(context, 'get_remaining_time_in_millis'):
+        return None
+    return context.get_remaining_time_in_millis() / 1000 - TIME_MARGIN_SECONDS
+
+# Function to handle the AWS Lambda invocation and start an execution for every unprocessed file under a prefix
+@instrumented('backfill')
+def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+
+    """Start Step Functions executions for the audio files already under a prefix.
+
+    The prefix is paged through with list_objects_v2 in key order. Files whose current version
+    already has its synthesized audio for every target language are skipped (see is_processed), and
+    the others are started under a token bucket rate limit (see get_rate_per_second). Progress is
+    saved after every page in a checkpoint under 'backfill/checkpoints/', so invoking the function
+    again with the same backfill_id resumes where it stopped. When the invocation runs out of time,
+    it saves the checkpoint and, unless 'continue' is false, invokes itself asynchronously to carry
+    on. Execution names are derived from the backfill ID and the key, so a file is never started
+    twice by the same backfill.
+
+    Args:
+        event (Dict[str, Any]): The backfill, with optional 'bucket', 'prefix' (default 'audio_inputs/'),
+            'backfill_id' (generated if not provided), 'dry_run', 'max_executions' and 'continue'.
+        context (Any): The context object provided by AWS Lambda.
+
+    Returns:
+        Dict[str, Any]: A response dict with the backfill ID, its status, counts, and the last key reached.
+    """
+
+    # Set log level from the event, default to the LOG_LEVEL environment variable (DEBUG if unset)
+    # Expecting logLevel to be one of 'DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'
+    log_level = event.get('logLevel', DEFAULT_LOG_LEVEL)
+    set_log_level(log_level)
+
+    # Log the invocation of the Lambda function
+    logger.info("Backfill function invoked")
+
+    # Log the received event
+    logger.info("Received event: %s", LazyJson(event))
+
+    # Extract data from the event, default to the environment
+    bucket = event.get('bucket') or os.environ.get('S3_BUCKET')
+    prefix = event.get('prefix', DEFAULT_PREFIX)
+    backfill_id = event.get('backfill_id') or f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    dry_run = bool(event.get('dry_run', False))
+    max_executions = event.get('max_executions')
+    state_machine_arn = os.environ.get('STATE_MACHINE_ARN')
+
+    # Check for required parameters
+    if not bucket or not state_machine_arn:
+
+        # Log an error and return a 400 response
+        logger.error("Missing bucket in the event or S3_BUCKET/STATE_MACHINE_ARN in the environment.")
+
+        # Return a response indicating missing parameters
+        return {'statusCode': 400, 'backfill_id': backfill_id, 'status': FAILED}
+
+    # Load the checkpoint, or start a new one
+    checkpoint = load_checkpoint(bucket, backfill_id) or {
+        'backfill_id': backfill_id, 'bucket': bucket, 'prefix': prefix, 'status': RUNNING, 'start_after': '',
+        'counts': {'listed': 0, 'started': 0, 'skipped': 0, 'failed': 0}, 'failed_keys': []
+    }
+    prefix = checkpoint['prefix']
+    counts = checkpoint['counts']
+
+    # Return finished backfills as they are
+    if checkpoint['status'] == COMPLETED:
+        logger.info("Backfill %s already completed.", backfill_id)
+        return {'statusCode': 200, **{name: checkpoint[name] for name in ('backfill_id', 'status', 'counts', 'start_after')}}
+
+    # Read the settings from the environment
+    rate_per_second = float(event.get('rate_per_second') or get_rate_per_second())
+    bucket_limiter = TokenBucket(rate_per_second, max(1, int(os.environ.get('BACKFILL_BURST', DEFAULT_BURST))))
+    page_size = int(os.environ.get('BACKFILL_PAGE_SIZE', DEFAULT_PAGE_SIZE))
+    suffixes = tuple(suffix.strip().lower() for suffix in os.environ.get('BACKFILL_SUFFIXES', DEFAULT_SUFFIXES).split(',') if suffix.strip())
+    logger.info("Backfilling s3://%s/%s as %s after %r at %.3f execution(s) per second.", bucket, prefix, backfill_id,
+                checkpoint['start_after'], rate_per_second)
+
+    # Initialize the state of this invocation
+    checkpoint['status'] = RUNNING
+    started_here = 0
+    paused = False
+
+    # Page through the prefix from the checkpoint
+    while True:
+
+        # List the next page
+        page = s3.list_objects_v2(Bucket=bucket, Prefix=prefix, MaxKeys=page_size,
+                                  **({'StartAfter': checkpoint['start_after']} if checkpoint['start_after'] else {}))
+
+        # Loop through each listed file
+        for item in page.get('Contents', []):
+
+            # Stop when the invocation limit is reached, or is about to run out of time
+            key = item['Key']
+            seconds_left = remaining_seconds(context)
+            if (max_executions is not None and started_here >= int(max_executions)) or \
+                    (seconds_left is not None and seconds_left <= 0):
+                paused = True
+                break
+
+            # Ignore files that are not audio, and versions already processed for every target language
+            if not key.lower().endswith(suffixes) or is_processed(bucket, key):
+                logger.debug("Skipping s3://%s/%s", bucket, key)
+                counts['skipped'] += 1
+                counts['listed'] += 1
+                checkpoint['start_after'] = key
+                continue
+
+            # Wait for the rate limit, pausing if it would take longer than the time left
+            if not bucket_limiter.acquire(timeout=seconds_left):
+                paused = True
+                break
+
+            # Start the execution under its backfill name
+            if dry_run:
+                result = {'status': STARTED}
+                logger.info("Dry run, would start s3://%s/%s", bucket, key)
+            else:
+                result = start_execution(s3, stepfunctions, state_machine_arn, bucket, key, execution_name(backfill_id, bucket, key))
+
+            # Count the result
+            counts['listed'] += 1
+            if result['status'] == STARTED:
+                counts['started'] += 1
+                started_here += 1
+            elif result['status'] == ALREADY_STARTED:
+                counts['skipped'] += 1
+            else:
+                counts['failed'] += 1
+                checkpoint['failed_keys'] = (checkpoint['failed_keys'] + [key])[-MAX_FAILED_KEYS:]
+            checkpoint['start_after'] = key
+
+        # Pause when stopped early, and finish once the last page has been read
+        if paused:
+            checkpoint['status'] = PAUSED
+        elif not page.get('IsTruncated'):
+            checkpoint['status'] = COMPLETED
+
+        # Save the progress after every page, except in dry runs
+        if not dry_run:
+            save_checkpoint(bucket, checkpoint)
+        if checkpoint['status'] != RUNNING:
+            break
+
+    # Log the progress of the backfill
+    logger.info("Backfill %s %s: %s", backfill_id, checkpoint['status'].lower(), LazyJson(counts))
+
+    # Carry on in a new invocation when stopped by the time limit
+    if checkpoint['status'] == PAUSED and event.get('continue', True) and max_executions is None and context is not None:
+
+        # Invoke this function again asynchronously with the same backfill
+        lambda_client.invoke(
+            FunctionName=context.function_name,
+            InvocationType='Event',
+            Payload=json.dumps({**event, 'backfill_id': backfill_id, 'rate_per_second': rate_per_second}).encode('utf-8')
+        )
+        logger.info("Invoked %s to continue backfill %s", context.function_name, backfill_id)
+
+    # Return the progress of the backfill
+    return {
+        'statusCode': 200,
+        'backfill_id': backfill_id,
+        'status': checkpoint['status'],
+        'counts': counts,
+        'start_after': checkpoint['start_after'],
+        'rate_per_second': rate_per_second
+    }
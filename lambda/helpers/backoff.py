@@ -0,0 +1,173 @@
+import os
+import random
+from typing import List, Optional
+
+# Default schedule (in seconds) between transcription status checks
+DEFAULT_POLL_SCHEDULE = [5, 10, 15, 30, 60]
+
+# Default schedule (in seconds) between translation and synthesis status checks
+DEFAULT_STATUS_CHECK_SCHEDULE = [1, 2, 4, 8, 16, 30]
+
+# Default fraction by which each wait is randomly lengthened or shortened
+DEFAULT_JITTER_RATIO = 0.2
+
+# Longest single wait (in seconds) before the expected completion of a job
+MAX_EXPECTED_WAIT_SECONDS = 600
+
+# Bit rate (in kbit/s) assumed when estimating the duration of MP3 audio from its size
+DEFAULT_MEDIA_BITRATE_KBPS = 128
+
+# Typical bit rates (in kbit/s) of lossless formats, whose files are much larger per second than MP3
+LOSSLESS_BITRATES_KBPS = {'wav': 1411, 'flac': 800}
+
+# Estimated fixed time (in seconds) Amazon Transcribe takes to start a job
+TRANSCRIBE_STARTUP_SECONDS = 10
+
+# Estimated seconds Amazon Transcribe takes per second of audio
+TRANSCRIBE_SECONDS_PER_MEDIA_SECOND = 0.3
+
+def get_poll_schedule(env_var: str = 'TRANSCRIPTION_POLL_SCHEDULE', default: Optional[List[int]] = None) -> List[int]:
+    """Load the polling backoff schedule from the environment.
+
+    Args:
+        env_var (str): The environment variable holding a comma-separated list of wait seconds.
+        default (Optional[List[int]]): The schedule used when the variable is unset or malformed, DEFAULT_POLL_SCHEDULE if not provided.
+
+    Returns:
+        List[int]: The wait seconds to use for each successive poll attempt.
+    """
+
+    # Read the raw schedule from the environment
+    raw_schedule = os.environ.get(env_var, '')
+
+    # Try to parse the schedule into a list of positive integers
+    try:
+
+        # Split the schedule and drop empty or non-positive entries
+        schedule = [int(value) for value in raw_schedule.split(',') if value.strip()]
+        schedule = [value for value in schedule if value > 0]
+
+    # Handle malformed schedules
+    except ValueError:
+
+        # Fall back to the default schedule if the value cannot be parsed
+        schedule = []
+
+    # Return the parsed schedule or the default one
+    return schedule or list(default or DEFAULT_POLL_SCHEDULE)
+
+def get_wait_seconds(attempt: int, schedule: Optional[List[int]] = None) -> int:
+    """Get the number of seconds to wait before the given poll attempt.
+
+    Args:
+        attempt (int): The zero-based poll attempt number.
+        schedule (Optional[List[int]]): The backoff schedule, loaded from the environment if not provided.
+
+    Returns:
+        int: The seconds to wait; the last schedule entry is reused once the schedule is exhausted.
+    """
+
+    # Load the schedule if one was not provided
+    if not schedule:
+        schedule = get_poll_schedule()
+
+    # Clamp the attempt number to the bounds of the schedule
+    index = min(max(attempt, 0), len(schedule) - 1)
+
+    # Return the wait seconds for this attempt
+    return schedule[index]
+
+def get_jitter_ratio() -> float:
+    """Load the jitter ratio applied to the waits from the environment.
+
+    Returns:
+        float: The POLL_JITTER_RATIO environment variable, between 0 and 1.
+    """
+
+    # Try to parse the ratio
+    try:
+        ratio = float(os.environ.get('POLL_JITTER_RATIO', DEFAULT_JITTER_RATIO))
+
+    # Handle malformed ratios
+    except ValueError:
+        ratio = DEFAULT_JITTER_RATIO
+
+    # Clamp the ratio to a sensible range
+    return min(max(ratio, 0.0), 1.0)
+
+def estimate_media_seconds(size_bytes: Optional[int], media_format: Optional[str] = None) -> Optional[float]:
+    """Estimate the duration of audio from its size.
+
+    Args:
+        size_bytes (Optional[int]): The size of the audio file in bytes.
+        media_format (Optional[str]): The format of the audio, e.g. 'mp3' or 'wav', if known.
+
+    Returns:
+        Optional[float]: The estimated duration in seconds, at the typical bit rate of lossless formats
+            and at MEDIA_BITRATE_KBPS (128 by default) otherwise, or None if the size is unknown.
+    """
+
+    # Nothing to estimate without a size
+    if not size_bytes:
+        return None
+
+    # Divide the size by the bit rate
+    bitrate_kbps = LOSSLESS_BITRATES_KBPS.get(media_format) or float(os.environ.get('MEDIA_BITRATE_KBPS', DEFAULT_MEDIA_BITRATE_KBPS))
+    return round(size_bytes * 8 / (bitrate_kbps * 1000), 1)
+
+def estimate_transcription_seconds(media_seconds: Optional[float]) -> Optional[float]:
+    """Estimate how long Amazon Transcribe takes to transcribe some audio.
+
+    Args:
+        media_seconds (Optional[float]): The duration of the audio in seconds.
+
+    Returns:
+        Optional[float]: The expected job duration in seconds, or None if the audio duration is unknown.
+    """
+
+    # Nothing to estimate without a duration
+    if not media_seconds:
+        return None
+
+    # Add the time per second of audio to the startup time
+    return TRANSCRIBE_STARTUP_SECONDS + TRANSCRIBE_SECONDS_PER_MEDIA_SECOND * media_seconds
+
+def get_adaptive_wait_seconds(attempt: int, elapsed_seconds: Optional[float] = None, expected_seconds: Optional[float] = None,
+                              schedule: Optional[List[int]] = None, jitter_ratio: Optional[float] = None,
+                              rng: Optional[random.Random] = None) -> int:
+    """Get the number of seconds to wait before the next status check of a job.
+
+    Until the job is expected to be done, the wait runs to its expected completion (at most
+    MAX_EXPECTED_WAIT_SECONDS at a time), so short jobs are checked early and long ones are not
+    checked needlessly. After that, or when the duration is unknown, the backoff schedule applies.
+    Either way the wait is randomly lengthened or shortened by the jitter ratio, so executions
+    started together do not check in lockstep.
+
+    Args:
+        attempt (int): The zero-based status check attempt number.
+        elapsed_seconds (Optional[float]): The seconds since the job started, if known.
+        expected_seconds (Optional[float]): The expected job duration in seconds, if known.
+        schedule (Optional[List[int]]): The backoff schedule, loaded from the environment if not provided.
+        jitter_ratio (Optional[float]): The jitter ratio, loaded from the environment if not provided.
+        rng (Optional[random.Random]): The random number generator, the module's one if not provided.
+
+    Returns:
+        int: The seconds to wait, at least 1.
+    """
+
+    # Wait until the expected completion while it is ahead
+    remaining_seconds = (expected_seconds - elapsed_seconds) if expected_seconds and elapsed_seconds is not None else None
+    if remaining_seconds is not None and remaining_seconds >= 1:
+        wait_seconds = min(remaining_seconds, MAX_EXPECTED_WAIT_SECONDS)
+
+    # Otherwise back off along the schedule
+    else:
+        wait_seconds = get_wait_seconds(attempt, schedule)
+
+    # Apply the jitter
+    if jitter_ratio is None:
+        jitter_ratio = get_jitter_ratio()
+    wait_seconds *= (rng or random).uniform(1 - jitter_ratio, 1 + jitter_ratio)
+
+    # Return a whole number of seconds, as Wait states expect
+    return max(1, int(round(wait_seconds)))
@@ -0,0 +1,501 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from botocore.exceptions import ClientError
+from helpers.logger import logger
+
+def make_cache_key(*parts: Any) -> str:
+    """Build a content-addressed cache key from the values that determine an output.
+
+    Args:
+        *parts (Any): JSON-serializable values, such as the input text and the stage parameters.
+
+    Returns:
+        str: The SHA-256 hex digest of the values.
+    """
+
+    # Serialize the values in a stable form and hash them
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class CacheStats:
+    """Thread-safe hit and miss counters for a cache."""
+
+    def __init__(self) -> None:
+        """Initialize the counters."""
+
+        # Initialize the counters and the lock protecting them
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, hit: bool) -> None:
+        """Record a cache lookup.
+
+        Args:
+            hit (bool): Whether the lookup was a hit.
+        """
+
+        # Increment the matching counter
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def to_dict(self) -> Dict[str, int]:
+        """Return the counters as a dictionary.
+
+        Returns:
+            Dict[str, int]: The hit and miss counts.
+        """
+
+        # Return a snapshot of the counters
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+class LRUIndex:
+    """Thread-safe, size-bounded, least-recently-used map of cache keys to their creation times.
+
+    Kept at module level, the index survives across warm invocations of the same container and
+    lets a cache answer repeat lookups without a round trip to S3.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        """Initialize the index.
+
+        Args:
+            max_entries (int): The maximum number of keys kept; the least recently used are evicted first.
+        """
+
+        # Initialize the ordered entries and the lock protecting them
+        self.max_entries = max(1, max_entries)
+        self._entries: 'OrderedDict[str, float]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, cache_key: str) -> Optional[float]:
+        """Get the creation time of a key, marking it as recently used.
+
+        Args:
+            cache_key (str): The cache key.
+
+        Returns:
+            Optional[float]: The creation time as a UNIX timestamp, or None if the key is not indexed.
+        """
+
+        # Look up the key and move it to the most recently used end
+        with self._lock:
+            created_at = self._entries.get(cache_key)
+            if created_at is not None:
+                self._entries.move_to_end(cache_key)
+            return created_at
+
+    def put(self, cache_key: str, created_at: float) -> None:
+        """Add or refresh a key, evicting the least recently used keys beyond max_entries.
+
+        Args:
+            cache_key (str): The cache key.
+            created_at (float): The creation time of the cached object as a UNIX timestamp.
+        """
+
+        # Store the key at the most recently used end and trim the oldest keys
+        with self._lock:
+            self._entries[cache_key] = created_at
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, cache_key: str) -> None:
+        """Remove a key from the index, if present.
+
+        Args:
+            cache_key (str): The cache key.
+        """
+
+        # Drop the key
+        with self._lock:
+            self._entries.pop(cache_key, None)
+
+class S3ObjectCache:
+    """Cache of S3 objects stored under a prefix of the same bucket, reused through server-side copies.
+
+    Entries are removed by the bucket lifecycle rule on the cache prefix once they are older than
+    CacheExpirationInDays, which bounds the cache by age: it holds at most the outputs of that many
+    days, and every entry is an output the pipeline also keeps outside the cache. To bound it by
+    size as well, set max_entries or max_bytes; every store then lists the prefix and deletes the
+    oldest entries beyond the limits, at the cost of one LIST request per 1000 entries.
+    """
+
+    def __init__(self, s3: Any, bucket: str, prefix: str, ttl_seconds: int, index: Optional[LRUIndex] = None,
+                 max_entries: int = 0, max_bytes: int = 0) -> None:
+        """Initialize the cache.
+
+        Args:
+            s3 (Any): The Boto3 S3 client.
+            bucket (str): The bucket holding the cache.
+            prefix (str): The prefix the cached objects are stored under.
+            ttl_seconds (int): How long a cached object stays valid (0 disables expiry).
+            index (Optional[LRUIndex]): An in-memory index of known entries, consulted before S3.
+            max_entries (int): The maximum number of objects kept; the oldest are evicted first (0 disables the limit).
+            max_bytes (int): The maximum total size of the objects kept (0 disables the limit).
+        """
+
+        # Store the cache settings
+        self.s3 = s3
+        self.bucket = bucket
+        self.prefix = prefix.rstrip('/') + '/'
+        self.ttl_seconds = ttl_seconds
+        self.index = index
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+
+    def is_fresh(self, created_at: float) -> bool:
+        """Check whether an entry created at the given time is still within its TTL.
+
+        Args:
+            created_at (float): The creation time as a UNIX timestamp.
+
+        Returns:
+            bool: True if the entry has not expired.
+        """
+
+        # Entries never expire when no TTL is set
+        return not self.ttl_seconds or time.time() - created_at <= self.ttl_seconds
+
+    def object_key(self, cache_key: str) -> str:
+        """Get the S3 key a cache entry is stored under.
+
+        Args:
+            cache_key (str): The cache key.
+
+        Returns:
+            str: The S3 key of the cache entry.
+        """
+
+        # Build the key of the cached object
+        return f'{self.prefix}{cache_key}'
+
+    def contains(self, cache_key: str) -> bool:
+        """Check whether a valid entry exists for the cache key, recording a hit or a miss.
+
+        Args:
+            cache_key (str): The cache key.
+
+        Returns:
+            bool: True if the entry exists and has not expired.
+        """
+
+        # Answer from the in-memory index when the entry is known and still fresh
+        created_at = self.index.get(cache_key) if self.index is not None else None
+        if created_at is not None and self.is_fresh(created_at):
+            self.stats.record(True)
+            return True
+
+        # Try to look up the cached object
+        try:
+
+            # Check if the cached object exists
+            response = self.s3.head_object(Bucket=self.bucket, Key=self.object_key(cache_key))
+
+            # Treat expired entries as misses; the bucket lifecycle rule removes them
+            created_at = response['LastModified'].timestamp()
+            hit = self.is_fresh(created_at)
+
+            # Remember fresh entries in the in-memory index
+            if hit and self.index is not None:
+                self.index.put(cache_key, created_at)
+
+        # Handle ClientError exceptions
+        except ClientError as e:
+
+            # Log anything other than a missing object; the lookup never fails the caller
+            if e.response['Error']['Code'] not in ('404', 'NoSuchKey', 'NotFound'):
+                logger.warning("Cache lookup failed for %s: %s", cache_key, e)
+
+            # A missing or unreadable object is a miss
+            hit = False
+
+        # Forget entries that are no longer valid
+        if not hit and self.index is not None:
+            self.index.discard(cache_key)
+
+        # Record and return the lookup result
+        self.stats.record(hit)
+        return hit
+
+    def copy_to(self, cache_key: str, bucket: str, key: str) -> None:
+        """Copy a cached object to an output key.
+
+        Args:
+            cache_key (str): The cache key.
+            bucket (str): The destination bucket.
+            key (str): The destination key.
+
+        Raises:
+            ClientError: If the copy fails, for example because the entry was removed since it was indexed.
+        """
+
+        # Try to copy the cached object server-side
+        try:
+
+            # Copy the cached object to the output key
+            self.s3.copy_object(
+                Bucket=bucket,
+                Key=key,
+                CopySource={'Bucket': self.bucket, 'Key': self.object_key(cache_key)}
+            )
+
+        # Handle ClientError exceptions
+        except ClientError:
+
+            # Forget the entry so the next lookup goes back to S3, then re-raise
+            if self.index is not None:
+                self.index.discard(cache_key)
+            raise
+
+    def store_from(self, cache_key: str, bucket: str, key: str) -> None:
+        """Store an output object in the cache, evicting the oldest objects beyond max_entries or max_bytes.
+
+        Args:
+            cache_key (str): The cache key.
+            bucket (str): The source bucket.
+            key (str): The source key.
+        """
+
+        # Copy the output object into the cache server-side
+        self.s3.copy_object(
+            Bucket=self.bucket,
+            Key=self.object_key(cache_key),
+            CopySource={'Bucket': bucket, 'Key': key}
+        )
+
+        # Remember the new entry in the in-memory index
+        if self.index is not None:
+            self.index.put(cache_key, time.time())
+
+        # Evict the oldest objects once the cache is over its size
+        if self.max_entries or self.max_bytes:
+            self.evict(self.object_key(cache_key))
+
+    def evict(self, keep_key: str) -> int:
+        """Delete the oldest cached objects until the cache is within max_entries and max_bytes.
+
+        Args:
+            keep_key (str): The S3 key of an object never to evict, such as the one just stored.
+
+        Returns:
+            int: The number of objects deleted.
+        """
+
+        # Initialize the number of deleted objects
+        deleted = 0
+
+        # Try to trim the cache
+        try:
+
+            # List the cached objects from oldest to newest with their sizes
+            entries = []
+            paginator = self.s3.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+                entries.extend(page.get('Contents', []))
+            entries.sort(key=lambda entry: entry['LastModified'])
+            count = len(entries)
+            total_bytes = sum(entry.get('Size', 0) for entry in entries)
+
+            # Remove the oldest objects until both limits are met, always keeping the given one
+            for entry in entries:
+                if (not self.max_entries or count <= self.max_entries) and (not self.max_bytes or total_bytes <= self.max_bytes):
+                    break
+                if entry['Key'] == keep_key:
+                    continue
+                logger.debug("Evicting cache entry: s3://%s/%s", self.bucket, entry['Key'])
+                self.s3.delete_object(Bucket=self.bucket, Key=entry['Key'])
+                if self.index is not None:
+                    self.index.discard(entry['Key'][len(self.prefix):])
+                count -= 1
+                total_bytes -= entry.get('Size', 0)
+                deleted += 1
+
+        # Handle ClientError exceptions
+        except ClientError as e:
+
+            # Log a warning; the lifecycle rule still removes the entries once they expire
+            logger.warning("Cache eviction failed under s3://%s/%s: %s", self.bucket, self.prefix, e)
+
+        # Return the number of deleted objects
+        return deleted
+
+class LocalObjectCache:
+    """Cache of S3 objects stored as files on the local filesystem, mainly for tests and local runs."""
+
+    def __init__(self, s3: Any, directory: str, ttl_seconds: int, max_entries: int = 1000, max_bytes: int = 0) -> None:
+        """Initialize the cache.
+
+        Args:
+            s3 (Any): The Boto3 S3 client used to read and write the output objects.
+            directory (str): The directory holding the cached files.
+            ttl_seconds (int): How long a cached file stays valid (0 disables expiry).
+            max_entries (int): The maximum number of files kept; the oldest are evicted first.
+            max_bytes (int): The maximum total size of the files kept (0 disables the limit).
+        """
+
+        # Store the cache settings and make sure the directory exists
+        self.s3 = s3
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, cache_key: str) -> str:
+        """Get the path a cache entry is stored under.
+
+        Args:
+            cache_key (str): The cache key.
+
+        Returns:
+            str: The path of the cached file.
+        """
+
+        # Build the path of the cached file
+        return os.path.join(self.directory, cache_key)
+
+    def contains(self, cache_key: str) -> bool:
+        """Check whether a valid entry exists for the cache key, recording a hit or a miss.
+
+        Args:
+            cache_key (str): The cache key.
+
+        Returns:
+            bool: True if the entry exists and has not expired.
+        """
+
+        # Try to look up the cached file
+        try:
+
+            # Work out the age of the cached file
+            age = time.time() - os.path.getmtime(self.path(cache_key))
+
+            # Check whether the cached file has expired
+            hit = not self.ttl_seconds or age <= self.ttl_seconds
+
+            # Remove expired files
+            if not hit:
+                os.remove(self.path(cache_key))
+
+        # Handle missing files
+        except FileNotFoundError:
+
+            # A missing file is a miss
+            hit = False
+
+        # Record and return the lookup result
+        self.stats.record(hit)
+        return hit
+
+    def copy_to(self, cache_key: str, bucket: str, key: str) -> None:
+        """Copy a cached file to an output key.
+
+        Args:
+            cache_key (str): The cache key.
+            bucket (str): The destination bucket.
+            key (str): The destination key.
+
+        Raises:
+            ClientError: If the cached file is gone, e.g. evicted by another invocation since the
+                lookup, as the S3 backend raises for a missing entry, so callers fall back the same way.
+        """
+
+        # Try to read the cached file
+        try:
+            with open(self.path(cache_key), 'rb') as cached_file:
+                body = cached_file.read()
+
+        # Report a missing file as S3 reports a missing key
+        except FileNotFoundError as e:
+            raise ClientError({'Error': {'Code': 'NoSuchKey', 'Message': f'Cache entry not found: {cache_key}'}}, 'CopyObject') from e
+
+        # Upload the cached file to the output key
+        self.s3.put_object(Bucket=bucket, Key=key, Body=body)
+
+    def store_from(self, cache_key: str, bucket: str, key: str) -> None:
+        """Store an output object in the cache, evicting the oldest files beyond max_entries or max_bytes.
+
+        Args:
+            cache_key (str): The cache key.
+            bucket (str): The source bucket.
+            key (str): The source key.
+        """
+
+        # Download the output object into the cache
+        body = self.s3.get_object(Bucket=bucket, Key=key)['Body'].read()
+        with open(self.path(cache_key), 'wb') as cached_file:
+            cached_file.write(body)
+
+        # Evict the oldest files once the cache is over its size
+        with self._lock:
+
+            # List the cached files from oldest to newest with their sizes
+            entries = sorted(
+                (os.path.join(self.directory, name) for name in os.listdir(self.directory)),
+                key=os.path.getmtime
+            )
+            sizes = [os.path.getsize(entry) for entry in entries]
+            total_bytes = sum(sizes)
+
+            # Remove the oldest files until both limits are met, always keeping the newest file
+            for stale_path, size in zip(entries[:-1], sizes[:-1]):
+                if len(entries) <= self.max_entries and (not self.max_bytes or total_bytes <= self.max_bytes):
+                    break
+                logger.debug("Evicting cache entry: %s", stale_path)
+                os.remove(stale_path)
+                entries = entries[1:]
+                total_bytes -= size
+
+def get_object_cache(s3: Any, bucket: str, name: str, prefix: Optional[str] = None,
+                     index: Optional[LRUIndex] = None) -> Optional[Any]:
+    """Build the cache configured for a stage through its environment variables.
+
+    For a cache named 'translation', TRANSLATION_CACHE_BACKEND selects 's3' (default), 'local', or
+    'none'; TRANSLATION_CACHE_TTL_SECONDS sets the expiry; TRANSLATION_CACHE_MAX_ENTRIES and
+    TRANSLATION_CACHE_MAX_BYTES bound its size (by default 1000 entries for the local backend and
+    no bound beyond the lifecycle rule for the S3 backend); TRANSLATION_CACHE_DIR sets the
+    directory of the local backend.
+
+    Args:
+        s3 (Any): The Boto3 S3 client.
+        bucket (str): The bucket the stage writes its outputs to.
+        name (str): The cache name, used for the environment variables.
+        prefix (Optional[str]): The S3 prefix of the cache, 'cache/<name>s/' by default.
+        index (Optional[LRUIndex]): An in-memory index for the S3 backend, if any.
+
+    Returns:
+        Optional[Any]: The cache, or None if caching is disabled.
+    """
+
+    # Read the cache settings from the environment
+    env_prefix = name.upper()
+    backend = os.environ.get(f'{env_prefix}_CACHE_BACKEND', 's3').lower()
+    ttl_seconds = int(os.environ.get(f'{env_prefix}_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+    max_bytes = int(os.environ.get(f'{env_prefix}_CACHE_MAX_BYTES', 0))
+
+    # Build the local filesystem backend
+    if backend == 'local':
+        directory = os.environ.get(f'{env_prefix}_CACHE_DIR', f'/tmp/cache/{name}s')
+        max_entries = int(os.environ.get(f'{env_prefix}_CACHE_MAX_ENTRIES', 1000))
+        return LocalObjectCache(s3, directory, ttl_seconds, max_entries, max_bytes)
+
+    # Build the S3 backend, expired by the bucket lifecycle rule and bounded in size only when configured
+    if backend == 's3':
+        max_entries = int(os.environ.get(f'{env_prefix}_CACHE_MAX_ENTRIES', 0))
+        return S3ObjectCache(s3, bucket, prefix or f'cache/{name}s/', ttl_seconds, index, max_entries, max_bytes)
+
+    # Caching is disabled
+    return None
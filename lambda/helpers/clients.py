@@ -0,0 +1,151 @@
+import os
+import threading
+from typing import Any, Dict
+from helpers.metrics import instrument_client
+
+# Default size of the connection pool of each client, large enough for the handlers' thread pools
+DEFAULT_MAX_POOL_CONNECTIONS = 50
+
+# Default maximum number of attempts per API call, including the first one
+DEFAULT_MAX_ATTEMPTS = 5
+
+# Default retry mode ('legacy', 'standard' or 'adaptive')
+DEFAULT_RETRY_MODE = 'standard'
+
+# Clients created so far, shared across warm invocations
+_clients: Dict[str, Any] = {}
+
+# Session shared by all clients, created on first use
+_session = None
+
+# Lock guarding the session and the clients, which are created from several threads
+_lock = threading.Lock()
+
+def get_client_config() -> Any:
+    """Build the botocore configuration shared by all clients.
+
+    The pool size, retry attempts and retry mode can be tuned with the BOTO_MAX_POOL_CONNECTIONS,
+    BOTO_MAX_ATTEMPTS and BOTO_RETRY_MODE environment variables. TCP keep-alive is always enabled.
+
+    Returns:
+        Any: The botocore Config.
+    """
+
+    # Import botocore only when the first client is built
+    from botocore.config import Config
+
+    # Build the configuration from the environment
+    return Config(
+        max_pool_connections=int(os.environ.get('BOTO_MAX_POOL_CONNECTIONS', DEFAULT_MAX_POOL_CONNECTIONS)),
+        retries={
+            'total_max_attempts': int(os.environ.get('BOTO_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)),
+            'mode': os.environ.get('BOTO_RETRY_MODE', DEFAULT_RETRY_MODE)
+        },
+        tcp_keepalive=True
+    )
+
+def get_client(service_name: str) -> Any:
+    """Get the Boto3 client for a service, creating it on first use.
+
+    Clients are created from one shared session with the shared configuration and cached for the
+    lifetime of the container, so warm invocations reuse their connections. Their calls are recorded
+    in the metrics of the current invocation.
+
+    Args:
+        service_name (str): The AWS service name, e.g. 's3'.
+
+    Returns:
+        Any: The Boto3 client.
+    """
+
+    # Return the cached client if there is one
+    client = _clients.get(service_name)
+    if client is not None:
+        return client
+
+    # Create the session and the client under the lock, as sessions are not thread-safe
+    global _session
+    with _lock:
+
+        # Another thread may have created the client in the meantime
+        client = _clients.get(service_name)
+        if client is None:
+
+            # Import boto3 only when the first client is built
+            import boto3
+
+            # Create the shared session on first use
+            if _session is None:
+                _session = boto3.session.Session()
+
+            # Create the client, record its calls in the invocation metrics, and cache it
+            client = _session.client(service_name, config=get_client_config())
+            instrument_client(client, service_name)
+            _clients[service_name] = client
+
+    # Return the client
+    return client
+
+def set_client(service_name: str, client: Any) -> None:
+    """Use the given client for a service instead of creating one, e.g. a local stand-in.
+
+    The client is not instrumented; stand-ins record their own calls in the invocation metrics.
+
+    Args:
+        service_name (str): The AWS service name, e.g. 's3'.
+        client (Any): The client to use.
+    """
+
+    # Replace the cached client under the lock
+    with _lock:
+        _clients[service_name] = client
+
+def reset_clients() -> None:
+    """Drop the cached session and clients, so the next call to get_client creates new ones."""
+
+    # Clear the cache under the lock
+    global _session
+    with _lock:
+        _clients.clear()
+        _session = None
+
+class LazyClient:
+    """A stand-in for a Boto3 client that creates the real client on first attribute access.
+
+    Handlers can keep a module-level client without paying for it at import time, or at all on
+    paths that never call AWS.
+    """
+
+    def __init__(self, service_name: str) -> None:
+        """Initialize the lazy client.
+
+        Args:
+            service_name (str): The AWS service name, e.g. 's3'.
+        """
+
+        # Remember the service to create the client for
+        self._service_name = service_name
+
+    def __getattr__(self, name: str) -> Any:
+        """Forward attribute access to the real client.
+
+        Args:
+            name (str): The attribute name.
+
+        Returns:
+            Any: The attribute of the real client.
+        """
+
+        # Get the real client and forward the attribute
+        return getattr(get_client(self._service_name), name)
+
+    def __repr__(self) -> str:
+        """Describe the lazy client.
+
+        Returns:
+            str: The description.
+        """
+
+        # Show the service and whether the client was created yet
+        state = 'created' if self._service_name in _clients else 'not created'
+        return f"LazyClient('{self._service_name}', {state})"
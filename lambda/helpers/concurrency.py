@@ -0,0 +1,68 @@
+import contextvars
+import functools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, TypeVar
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+def in_current_context(func: Callable[..., R]) -> Callable[..., R]:
+    """Bind a function to a copy of the caller's context variables, to run it on a worker thread.
+
+    Worker threads start with an empty context, so without this the tasks of a handler would not
+    see its context variables, such as the metrics recorder of the invocation. Each call runs in
+    its own copy, so concurrent tasks do not share changes to the variables.
+
+    Args:
+        func (Callable[..., R]): The function to bind.
+
+    Returns:
+        Callable[..., R]: The function, running in a copy of the context current when it was bound.
+    """
+
+    # Capture the caller's context
+    context = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> R:
+
+        # Run the call in its own copy of the captured context
+        return context.copy().run(func, *args, **kwargs)
+
+    return wrapper
+
+def ordered_map(func: Callable[[T], R], items: Iterable[T], max_workers: int) -> Iterator[R]:
+    """Apply a function to items concurrently and yield the results in input order.
+
+    At most twice `max_workers` items are in flight at any time, so results are handed to the caller
+    as they become available instead of accumulating in memory.
+
+    Args:
+        func (Callable[[T], R]): The function to apply to each item.
+        items (Iterable[T]): The items to process.
+        max_workers (int): The maximum number of threads.
+
+    Returns:
+        Iterator[R]: The results, in the same order as the items.
+    """
+
+    # Bound the number of submitted but not yet consumed items
+    window = max(1, max_workers) * 2
+
+    # Run the function on a bounded thread pool, in the caller's context
+    task = in_current_context(func)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+
+        # Initialize the queue of pending results
+        pending = deque()
+
+        # Submit each item and yield the oldest result once the window is full
+        for item in items:
+            pending.append(executor.submit(task, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+
+        # Yield the remaining results in order
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,204 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional
+from botocore.exceptions import ClientError
+from helpers.languages import get_target_languages
+from helpers.logger import LazyJson, logger
+from helpers.metrics import timed
+from helpers.output_keys import get_object_version
+
+# Status of an object whose execution was started
+STARTED = 'STARTED'
+
+# Status of an object whose execution had already been started under the same name
+ALREADY_STARTED = 'ALREADY_STARTED'
+
+# Status of an object whose execution could not be started
+FAILED = 'FAILED'
+
+def build_execution_item(s3: Any, bucket: str, key: str) -> Dict[str, Any]:
+    """Build the execution input of one uploaded object.
+
+    The target languages come from the object's 'target-languages' metadata when it is set,
+    and from the TARGET_LANGUAGES environment variable otherwise.
+
+    Args:
+        s3 (Any): The Boto3 S3 client.
+        bucket (str): The bucket holding the uploaded object.
+        key (str): The key of the uploaded object.
+
+    Returns:
+        Dict[str, Any]: The bucket, key, version (None if it could not be read) and target languages of the object.
+    """
+
+    # Try to read the version and the target languages from the object metadata
+    try:
+
+        # Get the version and the user metadata of the uploaded object
+        head_response = s3.head_object(Bucket=bucket, Key=key)
+        version = get_object_version(head_response)
+        metadata = head_response.get('Metadata', {})
+
+    # Handle ClientError exceptions
+    except ClientError as e:
+
+        # Log a warning and fall back to the configured target languages
+        logger.warning("Could not read metadata for bucket: %s, key: %s. Error: %s", bucket, key, e)
+        version = None
+        metadata = {}
+
+    # Resolve the target languages & log them
+    target_languages = get_target_languages(metadata)
+    logger.debug("Target languages for key %s: %s", key, target_languages)
+
+    # Return the input of the object
+    return {'bucket': bucket, 'key': key, 'version': version, 'target_languages': target_languages}
+
+def batch_execution_name(items: List[Dict[str, Any]]) -> str:
+    """Build the execution name of a batch of uploaded objects.
+
+    The name depends only on the objects and their versions, in any order, so a batch delivered
+    again after a trigger timeout or crash gets the same name and Step Functions refuses to start
+    it twice, while a new upload under the same key gets a new execution.
+
+    Args:
+        items (List[Dict[str, Any]]): The inputs of the objects, from build_execution_item.
+
+    Returns:
+        str: The execution name, within the 80 characters Step Functions allows.
+    """
+
+    # Hash the sorted bucket, key and version of every object
+    identities = sorted(f"{item['bucket']}/{item['key']}@{item.get('version') or ''}" for item in items)
+    return f"upload-{hashlib.sha256(json.dumps(identities).encode('utf-8')).hexdigest()[:40]}"
+
+def start_items_execution(stepfunctions: Any, state_machine_arn: str, items: List[Dict[str, Any]],
+                          name: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Start a Step Functions execution for one or more objects and report the outcome of each.
+
+    A single object is started with its own bucket, key and target languages as the input, and
+    several objects as a batch, with the list of them under 'items', which the state machine
+    transcribes one by one and then translates and synthesizes together. The TRANSCRIBE_MODE
+    environment variable is passed on, so the state machine waits for a transcription callback in
+    'callback' mode and polls the job status otherwise.
+
+    Args:
+        stepfunctions (Any): The Boto3 Step Functions client.
+        state_machine_arn (str): The ARN of the state machine to start.
+        items (List[Dict[str, Any]]): The inputs of the objects, from build_execution_item.
+        name (Optional[str]): The execution name; starting a second execution under the same name is
+            reported as ALREADY_STARTED instead of starting it twice. Generated if not provided.
+
+    Returns:
+        List[Dict[str, Any]]: The per-object results with their status and execution ARN or error, in item order.
+    """
+
+    # Build the input of a single object or of a batch
+    transcribe_mode = os.environ.get('TRANSCRIBE_MODE', 'async').lower()
+    if len(items) == 1:
+        execution_input = {**items[0], 'transcribe_mode': transcribe_mode}
+    else:
+        execution_input = {'items': items, 'transcribe_mode': transcribe_mode}
+
+    # Build the result of every object from the outcome of the execution
+    def results(status: str, **fields: Any) -> List[Dict[str, Any]]:
+        return [{'bucket': item['bucket'], 'key': item['key'], 'status': status, **fields} for item in items]
+
+    # Describe the objects for the logs
+    description = ', '.join(f"{item['bucket']}/{item['key']}" for item in items)
+
+    # Try to start the Step Functions execution
+    try:
+
+        # Start the Step Functions execution with the objects and their target languages
+        response = stepfunctions.start_execution(
+            stateMachineArn=state_machine_arn,
+            input=json.dumps(execution_input),
+            **({'name': name} if name else {})
+        )
+
+        # Log the successful start of the Step Functions execution
+        logger.info("Started Step Functions execution for %d object(s): %s", len(items), response['executionArn'])
+
+        # Log the full response for debugging with serialization of datetime objects
+        logger.debug("Step Functions response: %s", LazyJson(response))
+
+        # Return a success result
+        return results(STARTED, executionArn=response['executionArn'])
+
+    # Handle ClientError exceptions
+    except ClientError as e:
+
+        # Report an execution started earlier under the same name
+        if e.response['Error']['Code'] == 'ExecutionAlreadyExists':
+            logger.info("Execution %s already exists for: %s", name, description)
+            return results(ALREADY_STARTED)
+
+        # Log the ClientError with traceback
+        logger.error("ClientError while starting Step Functions execution for: %s. Error: %s", description,
+                     e.response['Error']['Message'], exc_info=True)
+
+        # Return a failure result
+        return results(FAILED, error=f'ClientError: {e.response["Error"]["Message"]}')
+
+    # Handle unexpected exceptions
+    except Exception as e:
+
+        # Log the exception with traceback
+        logger.critical("Critical error starting Step Functions execution for: %s. Error: %s", description, str(e),
+                        exc_info=True)
+
+        # Return a failure result
+        return results(FAILED, error=f'Error starting Step Function execution: {str(e)}')
+
+@timed('start_execution')
+def start_execution(s3: Any, stepfunctions: Any, state_machine_arn: str, bucket: str, key: str,
+                    name: Optional[str] = None) -> Dict[str, Any]:
+    """Start a Step Functions execution for one uploaded object.
+
+    Args:
+        s3 (Any): The Boto3 S3 client.
+        stepfunctions (Any): The Boto3 Step Functions client.
+        state_machine_arn (str): The ARN of the state machine to start.
+        bucket (str): The bucket holding the uploaded object.
+        key (str): The key of the uploaded object.
+        name (Optional[str]): The execution name; starting a second execution under the same name is
+            reported as ALREADY_STARTED instead of starting it twice. Generated if not provided.
+
+    Returns:
+        Dict[str, Any]: The per-record result with its status and execution ARN or error.
+    """
+
+    # Log the preparation for starting the Step Functions execution
+    logger.debug("Preparing to start Step Functions execution with bucket: %s, key: %s", bucket, key)
+
+    # Start the execution for the object alone
+    return start_items_execution(stepfunctions, state_machine_arn, [build_execution_item(s3, bucket, key)], name)[0]
+
+@timed('start_batch_execution')
+def start_batch_execution(s3: Any, stepfunctions: Any, state_machine_arn: str, objects: List[Dict[str, Any]],
+                          name: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Start one Step Functions execution for a batch of uploaded objects.
+
+    Batching amortizes the state transitions and Lambda invocations of an execution over several
+    small uploads; a batch of one object is started as a single-object execution.
+
+    Args:
+        s3 (Any): The Boto3 S3 client.
+        stepfunctions (Any): The Boto3 Step Functions client.
+        state_machine_arn (str): The ARN of the state machine to start.
+        objects (List[Dict[str, Any]]): The uploaded objects, each with its 'bucket' and 'key'.
+        name (Optional[str]): The execution name. Derived from the objects and their versions with
+            batch_execution_name if not provided, so a redelivered batch is reported as ALREADY_STARTED.
+
+    Returns:
+        List[Dict[str, Any]]: The per-record results, which share the status of the execution, in object order.
+    """
+
+    # Log the preparation for starting the Step Functions execution
+    logger.debug("Preparing to start Step Functions execution for a batch of %d object(s)", len(objects))
+
+    # Start one execution for all the objects, named after them unless a name is given
+    items = [build_execution_item(s3, s3_object['bucket'], s3_object['key']) for s3_object in objects]
+    return start_items_execution(stepfunctions, state_machine_arn, items, name or batch_execution_name(items))
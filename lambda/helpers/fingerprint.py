@@ -0,0 +1,48 @@
+import hashlib
+from typing import Any, Dict, Optional
+from helpers.metrics import timed
+
+# Size of the blocks read when hashing an object (1 MiB)
+HASH_BLOCK_SIZE = 1024 * 1024
+
+@timed('fingerprint')
+def get_object_fingerprint(s3: Any, bucket: str, key: str, head_response: Optional[Dict[str, Any]] = None) -> str:
+    """Get a content fingerprint of an S3 object, avoiding a full read whenever S3 already has one.
+
+    A full-object SHA-256 checksum is used when the object was uploaded with one, then the ETag of
+    single-part uploads (the MD5 of the content). Multipart ETags and checksums depend on the part
+    size rather than just the content, so for those the object is streamed through SHA-256.
+
+    Args:
+        s3 (Any): The Boto3 S3 client.
+        bucket (str): The bucket holding the object.
+        key (str): The key of the object.
+        head_response (Optional[Dict[str, Any]]): A head_object response for the object, requested
+            with ChecksumMode='ENABLED', if the caller already has one.
+
+    Returns:
+        str: The fingerprint, prefixed with the algorithm it was computed with.
+    """
+
+    # Get the object metadata if the caller did not provide it
+    if head_response is None:
+        head_response = s3.head_object(Bucket=bucket, Key=key, ChecksumMode='ENABLED')
+
+    # Use the full-object SHA-256 checksum if S3 has one
+    checksum = head_response.get('ChecksumSHA256')
+    if checksum and '-' not in checksum:
+        return f'sha256:{checksum}'
+
+    # Use the ETag of single-part uploads, which is the MD5 of the content
+    etag = head_response.get('ETag', '').strip('"')
+    if etag and '-' not in etag:
+        return f'md5:{etag}'
+
+    # Stream the object through SHA-256 otherwise
+    digest = hashlib.sha256()
+    body = s3.get_object(Bucket=bucket, Key=key)['Body']
+    for block in iter(lambda: body.read(HASH_BLOCK_SIZE), b''):
+        digest.update(block)
+
+    # Return the computed fingerprint
+    return f'sha256-hex:{digest.hexdigest()}'
@@ -0,0 +1,279 @@
+import codecs
+import re
+from typing import Iterable, Iterator, List, Union
+
+# Characters that end a run of plain string content
+STRING_SPECIAL = re.compile(r'["\\]')
+
+# Characters that matter while skipping over an object or array
+STRUCTURE_SPECIAL = re.compile(r'["{}\[\]]')
+
+# Characters that may appear in a number or a true, false or null literal
+LITERAL_CHARS = set('0123456789+-.eEtruefalsn')
+
+# Single-character escape sequences and the characters they stand for
+ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+class JsonStreamError(ValueError):
+    """Raised when the JSON ends early, is malformed, or does not contain the requested path."""
+
+class JsonStreamReader:
+    """Read values out of a JSON document streamed in chunks, without parsing all of it.
+
+    Only the path to the requested value is followed; everything else is scanned over without being
+    decoded or kept, and reading stops as soon as the value has been read. Memory use depends on the
+    chunk size and nesting depth, not on the size of the document. The reader is lenient: it finds
+    the value in well-formed JSON, but does not validate the parts it skips.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        """Initialize the reader.
+
+        Args:
+            chunks (Iterable[bytes]): The UTF-8 encoded document, e.g. a StreamingBody's iter_chunks().
+        """
+
+        # Keep the chunk source and an empty decoded buffer
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._pos = 0
+        self.bytes_read = 0
+
+    def _fill(self) -> bool:
+        """Append the next chunk to the buffer, dropping what was already consumed.
+
+        Returns:
+            bool: False once the document has been read to the end.
+        """
+
+        # Read chunks until one decodes to some text
+        for chunk in self._chunks:
+            self.bytes_read += len(chunk)
+            text = self._decoder.decode(chunk)
+            if text:
+                self._buffer = self._buffer[self._pos:] + text
+                self._pos = 0
+                return True
+
+        # Flush the decoder at the end of the document
+        text = self._decoder.decode(b'', final=True)
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        return bool(text)
+
+    def _available(self, count: int) -> bool:
+        """Read until the buffer holds some unconsumed characters, or the document ends.
+
+        Args:
+            count (int): The number of characters needed.
+
+        Returns:
+            bool: Whether that many characters are buffered.
+        """
+
+        # Read more until enough characters are buffered
+        while len(self._buffer) - self._pos < count:
+            if not self._fill():
+                return False
+        return True
+
+    def _require(self, count: int) -> None:
+        """Make sure the buffer holds at least some unconsumed characters.
+
+        Args:
+            count (int): The number of characters needed.
+
+        Raises:
+            JsonStreamError: If the document ends first.
+        """
+
+        # Fail if the document ends first
+        if not self._available(count):
+            raise JsonStreamError('Unexpected end of JSON document')
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character without consuming it.
+
+        Returns:
+            str: The character, or '' at the end of the document.
+        """
+
+        # Skip whitespace, reading more as needed
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in ' \t\r\n':
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ''
+
+    def _expect(self, char: str) -> None:
+        """Consume the next non-whitespace character, which must be the given one.
+
+        Args:
+            char (str): The expected character.
+
+        Raises:
+            JsonStreamError: If another character comes next.
+        """
+
+        # Compare and consume the character
+        found = self.peek()
+        if found != char:
+            raise JsonStreamError(f"Expected '{char}' but found '{found or 'end of document'}'")
+        self._pos += 1
+
+    def _iter_string(self) -> Iterator[str]:
+        """Decode a string whose opening quote was consumed, piece by piece.
+
+        Yields:
+            str: Consecutive pieces of the decoded string.
+        """
+
+        # Yield runs of plain content and decoded escape sequences until the closing quote
+        while True:
+            match = STRING_SPECIAL.search(self._buffer, self._pos)
+            if match is None:
+                if self._pos < len(self._buffer):
+                    yield self._buffer[self._pos:]
+                self._pos = len(self._buffer)
+                self._require(1)
+                continue
+            if match.start() > self._pos:
+                yield self._buffer[self._pos:match.start()]
+            self._pos = match.start() + 1
+            if match.group() == '"':
+                return
+            yield self._read_escape()
+
+    def _read_escape(self) -> str:
+        """Decode an escape sequence whose backslash was consumed.
+
+        Returns:
+            str: The decoded character, or the pair of surrogates combined into one character.
+
+        Raises:
+            JsonStreamError: If the escape sequence is invalid.
+        """
+
+        # Decode single-character escapes
+        self._require(1)
+        char = self._buffer[self._pos]
+        if char in ESCAPES:
+            self._pos += 1
+            return ESCAPES[char]
+        if char != 'u':
+            raise JsonStreamError(f'Invalid escape sequence: \\{char}')
+
+        # Decode a \uXXXX escape, joining a surrogate pair into one character
+        self._require(5)
+        code = int(self._buffer[self._pos + 1:self._pos + 5], 16)
+        self._pos += 5
+        if 0xD800 <= code < 0xDC00:
+            if self._available(6) and self._buffer[self._pos:self._pos + 2] == '\\u':
+                low = int(self._buffer[self._pos + 2:self._pos + 6], 16)
+                if 0xDC00 <= low < 0xE000:
+                    self._pos += 6
+                    return chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00))
+        return chr(code)
+
+    def _read_key(self) -> str:
+        """Read an object key and the colon after it.
+
+        Returns:
+            str: The key.
+        """
+
+        # Keys are short, so they are joined in memory
+        self._expect('"')
+        key = ''.join(self._iter_string())
+        self._expect(':')
+        return key
+
+    def _skip_value(self) -> None:
+        """Consume the next value without decoding it.
+
+        Raises:
+            JsonStreamError: If no value comes next.
+        """
+
+        # Skip strings, objects and arrays by their delimiters
+        char = self.peek()
+        if char == '"':
+            self._pos += 1
+            for _ in self._iter_string():
+                pass
+            return
+        if char and char in '{[':
+            self._pos += 1
+            depth = 1
+            while depth:
+                match = STRUCTURE_SPECIAL.search(self._buffer, self._pos)
+                if match is None:
+                    self._pos = len(self._buffer)
+                    self._require(1)
+                    continue
+                self._pos = match.start() + 1
+                if match.group() == '"':
+                    for _ in self._iter_string():
+                        pass
+                elif match.group() in '{[':
+                    depth += 1
+                else:
+                    depth -= 1
+            return
+
+        # Skip numbers and the true, false and null literals
+        if not char or char not in LITERAL_CHARS:
+            raise JsonStreamError(f"Expected a value but found '{char or 'end of document'}'")
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in LITERAL_CHARS:
+                self._pos += 1
+            if self._pos < len(self._buffer) or not self._fill():
+                return
+
+    def _enter(self, step: Union[str, int]) -> None:
+        """Move into the value of an object key or array index, skipping the values before it.
+
+        Args:
+            step (Union[str, int]): The key or index.
+
+        Raises:
+            JsonStreamError: If the container does not hold the key or index.
+        """
+
+        # Look through the array items or object members in order
+        opening, closing = ('[', ']') if isinstance(step, int) else ('{', '}')
+        self._expect(opening)
+        index = 0
+        while self.peek() != closing:
+            if index:
+                self._expect(',')
+            if isinstance(step, int):
+                if index == step:
+                    return
+            elif self._read_key() == step:
+                return
+            self._skip_value()
+            index += 1
+        raise JsonStreamError(f'Path step not found: {step!r}')
+
+    def iter_string(self, path: List[Union[str, int]]) -> Iterator[str]:
+        """Stream the string at a path from the start of the document, e.g. ['results', 'transcripts', 0, 'transcript'].
+
+        Args:
+            path (List[Union[str, int]]): The object keys and array indexes leading to the string.
+
+        Yields:
+            str: Consecutive pieces of the decoded string.
+
+        Raises:
+            JsonStreamError: If the path does not exist, or does not lead to a string.
+        """
+
+        # Follow the path, then decode the string
+        for step in path:
+            self._enter(step)
+        self._expect('"')
+        yield from self._iter_string()
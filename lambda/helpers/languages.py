@@ -0,0 +1,111 @@
+import json
+import os
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+# Target languages used when neither the object metadata nor the environment name any
+DEFAULT_TARGET_LANGUAGES = ['es', 'fr', 'de']
+
+# Object metadata key (x-amz-meta-target-languages) that overrides the target languages per upload
+TARGET_LANGUAGES_METADATA_KEY = 'target-languages'
+
+# Amazon Translate language codes mapped to the Polly voice and engine used to speak them
+DEFAULT_LANGUAGE_REGISTRY: Dict[str, Dict[str, str]] = {
+    'ar': {'voice_id': 'Zeina', 'engine': 'standard'},  # Arabic
+    'ca': {'voice_id': 'Arlet', 'engine': 'neural'},  # Catalan
+    'cy': {'voice_id': 'Gwyneth', 'engine': 'standard'},  # Welsh
+    'da': {'voice_id': 'Naja', 'engine': 'standard'},  # Danish
+    'de': {'voice_id': 'Marlene', 'engine': 'standard'},  # German
+    'en': {'voice_id': 'Joanna', 'engine': 'standard'},  # English
+    'es': {'voice_id': 'Lucia', 'engine': 'standard'},  # Spanish
+    'es-MX': {'voice_id': 'Mia', 'engine': 'standard'},  # Spanish (Mexico)
+    'fi': {'voice_id': 'Suvi', 'engine': 'neural'},  # Finnish
+    'fr': {'voice_id': 'Celine', 'engine': 'standard'},  # French
+    'fr-CA': {'voice_id': 'Chantal', 'engine': 'standard'},  # French (Canada)
+    'hi': {'voice_id': 'Aditi', 'engine': 'standard'},  # Hindi
+    'is': {'voice_id': 'Dora', 'engine': 'standard'},  # Icelandic
+    'it': {'voice_id': 'Carla', 'engine': 'standard'},  # Italian
+    'ja': {'voice_id': 'Mizuki', 'engine': 'standard'},  # Japanese
+    'ko': {'voice_id': 'Seoyeon', 'engine': 'standard'},  # Korean
+    'nl': {'voice_id': 'Lotte', 'engine': 'standard'},  # Dutch
+    'no': {'voice_id': 'Liv', 'engine': 'standard'},  # Norwegian
+    'pl': {'voice_id': 'Ewa', 'engine': 'standard'},  # Polish
+    'pt': {'voice_id': 'Camila', 'engine': 'standard'},  # Portuguese (Brazil)
+    'pt-PT': {'voice_id': 'Ines', 'engine': 'standard'},  # Portuguese (Portugal)
+    'ro': {'voice_id': 'Carmen', 'engine': 'standard'},  # Romanian
+    'ru': {'voice_id': 'Tatyana', 'engine': 'standard'},  # Russian
+    'sv': {'voice_id': 'Astrid', 'engine': 'standard'},  # Swedish
+    'tr': {'voice_id': 'Filiz', 'engine': 'standard'},  # Turkish
+    'zh': {'voice_id': 'Zhiyu', 'engine': 'standard'},  # Chinese (Simplified)
+}
+
+@lru_cache(maxsize=1)
+def load_language_registry() -> Dict[str, Dict[str, str]]:
+    """Load the language to voice and engine registry, once per container.
+
+    Entries from the LANGUAGE_REGISTRY environment variable, a JSON object such as
+    {"it": {"voice_id": "Bianca", "engine": "neural"}}, are merged over the defaults.
+
+    Returns:
+        Dict[str, Dict[str, str]]: The registry, keyed by Amazon Translate language code.
+    """
+
+    # Start from the default registry
+    registry = {language: dict(entry) for language, entry in DEFAULT_LANGUAGE_REGISTRY.items()}
+
+    # Merge the overrides from the environment
+    overrides = json.loads(os.environ.get('LANGUAGE_REGISTRY', '') or '{}')
+    for language, entry in overrides.items():
+        registry[language] = {'voice_id': entry['voice_id'], 'engine': entry.get('engine', 'standard')}
+
+    # Return the registry
+    return registry
+
+def get_voice(language: str) -> Optional[Dict[str, str]]:
+    """Get the Polly voice and engine registered for a language.
+
+    Args:
+        language (str): The Amazon Translate language code.
+
+    Returns:
+        Optional[Dict[str, str]]: The 'voice_id' and 'engine' for the language, or None if none is registered.
+    """
+
+    # Look up the language in the registry
+    return load_language_registry().get(language)
+
+def parse_language_list(value: Any) -> List[str]:
+    """Parse a list of language codes from a comma-separated string or a list.
+
+    Args:
+        value (Any): The comma-separated string or list of language codes.
+
+    Returns:
+        List[str]: The language codes, without blanks or duplicates, in their original order.
+    """
+
+    # Split comma-separated strings
+    if isinstance(value, str):
+        value = value.split(',')
+
+    # Strip and deduplicate the codes
+    return list(dict.fromkeys(language.strip() for language in value or [] if language and language.strip()))
+
+def get_target_languages(metadata: Optional[Dict[str, str]] = None) -> List[str]:
+    """Get the target languages for an upload.
+
+    The 'target-languages' object metadata wins, then the TARGET_LANGUAGES environment variable,
+    then the defaults.
+
+    Args:
+        metadata (Optional[Dict[str, str]]): The user metadata of the uploaded object, if known.
+
+    Returns:
+        List[str]: The target language codes.
+    """
+
+    # Use the languages named in the object metadata, if any
+    languages = parse_language_list((metadata or {}).get(TARGET_LANGUAGES_METADATA_KEY, ''))
+
+    # Fall back to the environment, then the defaults
+    return languages or parse_language_list(os.environ.get('TARGET_LANGUAGES', '')) or list(DEFAULT_TARGET_LANGUAGES)
@@ -1,12 +1,186 @@
+import json
 import logging
+import os
+from datetime import datetime
+from typing import Any, Dict
+
+# Default log level, used when the event does not specify one
+DEFAULT_LOG_LEVEL = os.environ.get('LOG_LEVEL', 'DEBUG').upper()
+
+# Maximum length of a logged string before it is truncated
+MAX_FIELD_LENGTH = int(os.environ.get('LOG_MAX_FIELD_LENGTH', 1024))
+
+# Maximum number of list items or dictionary keys logged before the rest are summarized
+MAX_ITEMS = int(os.environ.get('LOG_MAX_ITEMS', 20))
+
+def truncate_value(value: Any, max_length: int = MAX_FIELD_LENGTH, max_items: int = MAX_ITEMS) -> Any:
+    """Shorten a value for logging, keeping its shape.
+
+    Long strings are cut to max_length characters and long lists and dictionaries to their first
+    max_items entries, with a marker saying how much was left out.
+
+    Args:
+        value (Any): The value to shorten.
+        max_length (int): The maximum length of a string.
+        max_items (int): The maximum number of list items or dictionary keys.
+
+    Returns:
+        Any: The shortened value.
+    """
+
+    # Cut long strings
+    if isinstance(value, str):
+        if len(value) > max_length:
+            return f"{value[:max_length]}...<{len(value) - max_length} more chars>"
+        return value
+
+    # Shorten each entry of a dictionary, keeping the first keys
+    if isinstance(value, dict):
+        result = {}
+        for index, (key, item) in enumerate(value.items()):
+            if index == max_items:
+                result['...'] = f"<{len(value) - max_items} more keys>"
+                break
+            result[key] = truncate_value(item, max_length, max_items)
+        return result
+
+    # Shorten each item of a list, keeping the first items
+    if isinstance(value, (list, tuple)):
+        result = [truncate_value(item, max_length, max_items) for item in value[:max_items]]
+        if len(value) > max_items:
+            result.append(f"...<{len(value) - max_items} more items>")
+        return result
+
+    # Leave anything else as it is
+    return value
+
+def _json_default(obj: Any) -> str:
+    """Convert values that json cannot serialize for logging.
+
+    Args:
+        obj (Any): The value to convert.
+
+    Returns:
+        str: The ISO format of datetimes, the representation of anything else.
+    """
+
+    # Use the ISO format for datetimes and the representation otherwise
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    return truncate_value(repr(obj))
+
+def to_json(value: Any) -> str:
+    """Serialize a value for logging, after shortening it.
+
+    Args:
+        value (Any): The value to serialize.
+
+    Returns:
+        str: The JSON text.
+    """
+
+    # Shorten and serialize the value
+    return json.dumps(truncate_value(value), default=_json_default)
+
+class LazyJson:
+    """A log argument that is serialized to JSON only if the record is emitted.
+
+    Use it in place of json.dumps, e.g. logger.debug("Received event: %s", LazyJson(event)).
+    """
+
+    __slots__ = ('value',)
+
+    def __init__(self, value: Any) -> None:
+        """Initialize the lazy argument.
+
+        Args:
+            value (Any): The value to serialize.
+        """
+
+        # Keep a reference to the value
+        self.value = value
+
+    def __str__(self) -> str:
+        """Serialize the value.
+
+        Returns:
+            str: The JSON text, with long fields shortened.
+        """
+
+        # Serialize the value when the message is formatted
+        return to_json(self.value)
+
+def fields(**values: Any) -> Dict[str, Any]:
+    """Build the extra argument attaching structured fields to a log record.
+
+    For example, logger.info("Translation stored", extra=fields(language='es', bytes=1024)).
+
+    Args:
+        **values (Any): The fields to attach.
+
+    Returns:
+        Dict[str, Any]: The extra argument.
+    """
+
+    # Wrap the fields for the formatters
+    return {'fields': values}
+
+class TextFormatter(logging.Formatter):
+    """Format records as text, followed by their structured fields, if any."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Format a record.
+
+        Args:
+            record (logging.LogRecord): The record to format.
+
+        Returns:
+            str: The formatted line.
+        """
+
+        # Format the message and append the fields
+        line = super().format(record)
+        record_fields = getattr(record, 'fields', None)
+        return f"{line} {to_json(record_fields)}" if record_fields else line
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line, with their structured fields at the top level."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Format a record.
+
+        Args:
+            record (logging.LogRecord): The record to format.
+
+        Returns:
+            str: The JSON line.
+        """
+
+        # Build the payload from the record and its fields
+        payload = {
+            'timestamp': self.formatTime(record),
+            'level': record.levelname,
+            'message': record.getMessage()
+        }
+        payload.update(truncate_value(getattr(record, 'fields', None) or {}))
+
+        # Add the traceback of exceptions
+        if record.exc_info:
+            payload['exception'] = self.formatException(record.exc_info)
+
+        # Serialize the payload, whose message was already shortened by its arguments
+        return json.dumps(payload, default=_json_default)
 
 # Set up logging
 logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
+logger.setLevel(DEFAULT_LOG_LEVEL)
 
-# Create a handler and set the formatter
+# Create a handler and set the formatter, JSON if LOG_FORMAT is 'json'
 handler = logging.StreamHandler()
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+if os.environ.get('LOG_FORMAT', 'text').lower() == 'json':
+    formatter = JsonFormatter()
+else:
+    formatter = TextFormatter('%(asctime)s - %(levelname)s - %(message)s')
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
@@ -27,7 +201,7 @@ def set_log_level(level: str) -> None:
         logger.setLevel(level)
 
         # Log the change
-        logger.info(f"Log level set to {level}.")
+        logger.debug("Log level set to %s.", level)
 
     else:
 
@@ -0,0 +1,123 @@
+import os
+from typing import Any, Dict, Optional
+from botocore.exceptions import ClientError
+from helpers.logger import logger
+from helpers.metrics import timed
+
+# Number of leading bytes read to recognize the format of a media file
+HEADER_BYTES = 64
+
+# Media formats accepted by Amazon Transcribe, by the file extensions that usually carry them
+EXTENSION_FORMATS = {
+    '.mp3': 'mp3',
+    '.mp4': 'mp4',
+    '.m4a': 'm4a',
+    '.wav': 'wav',
+    '.flac': 'flac',
+    '.ogg': 'ogg',
+    '.oga': 'ogg',
+    '.opus': 'ogg',
+    '.amr': 'amr',
+    '.webm': 'webm'
+}
+
+# ISO base media major brands of audio-only files, which Amazon Transcribe reads as m4a rather than mp4
+M4A_BRANDS = (b'M4A ', b'M4B ', b'M4P ')
+
+class UnsupportedMediaError(ValueError):
+    """Raised when the format of a media file is not one Amazon Transcribe accepts."""
+
+def detect_media_format(header: bytes) -> Optional[str]:
+    """Recognize the format of a media file from its leading bytes.
+
+    Args:
+        header (bytes): The first bytes of the file; HEADER_BYTES are enough.
+
+    Returns:
+        Optional[str]: The Amazon Transcribe MediaFormat, or None if the bytes match no supported format.
+    """
+
+    # Match the container signatures
+    if header[:4] == b'RIFF' and header[8:12] == b'WAVE':
+        return 'wav'
+    if header[:4] == b'fLaC':
+        return 'flac'
+    if header[:4] == b'OggS':
+        return 'ogg'
+    if header[:4] == b'\x1aE\xdf\xa3':
+        return 'webm'
+    if header[:5] == b'#!AMR':
+        return 'amr'
+    if header[4:8] == b'ftyp':
+        return 'm4a' if header[8:12] in M4A_BRANDS else 'mp4'
+
+    # Match MP3 files, with an ID3 tag or starting at an MPEG audio frame sync
+    if header[:3] == b'ID3' or (len(header) > 1 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0):
+        return 'mp3'
+
+    # Report anything else as unknown
+    return None
+
+def get_extension_format(filename: str) -> Optional[str]:
+    """Guess the format of a media file from its extension.
+
+    Args:
+        filename (str): The filename or key.
+
+    Returns:
+        Optional[str]: The Amazon Transcribe MediaFormat, or None if the extension is not a supported one.
+    """
+
+    # Look up the last extension only, so dots earlier in the name do not matter
+    return EXTENSION_FORMATS.get(os.path.splitext(filename)[1].lower())
+
+@timed('detect_media_format')
+def get_object_media_format(s3: Any, bucket: str, key: str, head_response: Optional[Dict[str, Any]] = None) -> str:
+    """Get the format of a media file in S3 from its leading bytes, read with a small ranged request.
+
+    The extension is used when the bytes match no known signature, such as for raw MP3 streams that
+    start with padding, or when the object cannot be read.
+
+    Args:
+        s3 (Any): The Boto3 S3 client.
+        bucket (str): The bucket holding the media file.
+        key (str): The key of the media file.
+        head_response (Optional[Dict[str, Any]]): A head_object response for the object, if the caller
+            already has one; empty objects are not read.
+
+    Returns:
+        str: The Amazon Transcribe MediaFormat.
+
+    Raises:
+        UnsupportedMediaError: If neither the bytes nor the extension name a supported format.
+    """
+
+    # Read the first bytes of non-empty objects
+    media_format = None
+    if head_response is None or head_response.get('ContentLength', 1) > 0:
+
+        # Try to read the header of the object
+        try:
+
+            # Request only the header
+            header = s3.get_object(Bucket=bucket, Key=key, Range=f'bytes=0-{HEADER_BYTES - 1}')['Body'].read()
+            media_format = detect_media_format(header)
+
+        # Handle ClientError exceptions
+        except ClientError as e:
+
+            # Log a warning and fall back to the extension
+            logger.warning("Could not read the header of s3://%s/%s, using its extension: %s", bucket, key, e)
+
+    # Fall back to the extension
+    if media_format is None:
+        media_format = get_extension_format(key)
+        logger.debug("Media format of s3://%s/%s from its extension: %s", bucket, key, media_format)
+
+    # Reject files Amazon Transcribe cannot read
+    if media_format is None:
+        raise UnsupportedMediaError(f'Unsupported media format: s3://{bucket}/{key}')
+
+    # Return the format
+    logger.info("Media format of s3://%s/%s: %s", bucket, key, media_format)
+    return media_format
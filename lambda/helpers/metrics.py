@@ -0,0 +1,320 @@
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, ContextManager, Dict, Iterator
+
+# CloudWatch namespace of the metrics emitted in Embedded Metric Format
+DEFAULT_NAMESPACE = 'SpeakEasy'
+
+# S3 operations whose request body is counted as bytes written
+UPLOAD_OPERATIONS = ('PutObject', 'UploadPart')
+
+class MetricsRecorder:
+    """Collect stage timings, API call counts and byte counts for one invocation.
+
+    Recording is thread-safe, so the handlers' worker threads, run with in_current_context, can share
+    the recorder of the invocation. Timings of stages that run in several threads at once add up.
+    """
+
+    def __init__(self, function_name: str) -> None:
+        """Initialize the recorder.
+
+        Args:
+            function_name (str): The name of the function, used as the metrics dimension.
+        """
+
+        # Initialize the recorded values
+        self.function_name = function_name
+        self.started = time.perf_counter()
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.api_calls: Dict[str, Dict[str, float]] = {}
+        self.bytes: Dict[str, int] = {}
+        self.counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """Time a stage of the invocation.
+
+        Args:
+            stage (str): The name of the stage.
+        """
+
+        # Time the block, recording it even if it raises
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                entry = self.stages.setdefault(stage, {'count': 0, 'total_ms': 0.0})
+                entry['count'] += 1
+                entry['total_ms'] += elapsed_ms
+
+    def add_bytes(self, name: str, value: int) -> None:
+        """Add to a byte count.
+
+        Args:
+            name (str): The name of the byte count, e.g. 's3_read'.
+            value (int): The number of bytes.
+        """
+
+        # Add the bytes
+        with self._lock:
+            self.bytes[name] = self.bytes.get(name, 0) + value
+
+    def add_count(self, name: str, value: int = 1) -> None:
+        """Add to a counter.
+
+        Args:
+            name (str): The name of the counter.
+            value (int): The amount to add.
+        """
+
+        # Add to the counter
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def record_api_call(self, operation: str, elapsed_ms: float, error: bool = False) -> None:
+        """Record an AWS API call.
+
+        Args:
+            operation (str): The service and operation, e.g. 's3.GetObject'.
+            elapsed_ms (float): How long the call took, including retries.
+            error (bool): Whether the call failed.
+        """
+
+        # Add the call to the operation's totals
+        with self._lock:
+            entry = self.api_calls.setdefault(operation, {'count': 0, 'errors': 0, 'total_ms': 0.0})
+            entry['count'] += 1
+            entry['errors'] += int(error)
+            entry['total_ms'] += elapsed_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Summarize the recorded metrics.
+
+        Returns:
+            Dict[str, Any]: The duration, stages, API calls, bytes and counts, with times in milliseconds.
+        """
+
+        # Round the times for the summary
+        with self._lock:
+            return {
+                'duration_ms': round((time.perf_counter() - self.started) * 1000, 1),
+                'stages': {name: {'count': entry['count'], 'total_ms': round(entry['total_ms'], 1)}
+                           for name, entry in self.stages.items()},
+                'api_calls': {name: {'count': entry['count'], 'errors': entry['errors'], 'total_ms': round(entry['total_ms'], 1)}
+                              for name, entry in self.api_calls.items()},
+                'bytes': dict(self.bytes),
+                'counts': dict(self.counts)
+            }
+
+    def to_emf(self, summary: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the CloudWatch Embedded Metric Format document of a summary.
+
+        Args:
+            summary (Dict[str, Any]): The summary from to_dict.
+
+        Returns:
+            Dict[str, Any]: The EMF document, with the function name as the only dimension.
+        """
+
+        # Flatten the summary into metric values and units
+        values = {'Duration': (summary['duration_ms'], 'Milliseconds')}
+        for name, entry in summary['stages'].items():
+            values[f'stage.{name}'] = (entry['total_ms'], 'Milliseconds')
+        for name, entry in summary['api_calls'].items():
+            values[f'api.{name}.calls'] = (entry['count'], 'Count')
+            values[f'api.{name}.errors'] = (entry['errors'], 'Count')
+            values[f'api.{name}.time'] = (entry['total_ms'], 'Milliseconds')
+        for name, value in summary['bytes'].items():
+            values[f'bytes.{name}'] = (value, 'Bytes')
+        for name, value in summary['counts'].items():
+            values[f'count.{name}'] = (value, 'Count')
+
+        # Build the document
+        document = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': os.environ.get('METRICS_NAMESPACE', DEFAULT_NAMESPACE),
+                    'Dimensions': [['Function']],
+                    'Metrics': [{'Name': name, 'Unit': unit} for name, (_, unit) in values.items()]
+                }]
+            },
+            'Function': self.function_name
+        }
+        document.update({name: value for name, (value, _) in values.items()})
+        return document
+
+# Recorder of the current invocation, per context so that handlers run concurrently in one process
+# (e.g. the local runner's Map iterations) each record their own metrics
+_current: contextvars.ContextVar[MetricsRecorder] = contextvars.ContextVar('metrics_recorder', default=MetricsRecorder('default'))
+
+def get_metrics() -> MetricsRecorder:
+    """Get the recorder of the current invocation.
+
+    Returns:
+        MetricsRecorder: The recorder.
+    """
+
+    # Return the current recorder
+    return _current.get()
+
+def start_metrics(function_name: str) -> MetricsRecorder:
+    """Start recording the metrics of a new invocation.
+
+    Args:
+        function_name (str): The name of the function.
+
+    Returns:
+        MetricsRecorder: The new recorder.
+    """
+
+    # Replace the recorder of the current context
+    recorder = MetricsRecorder(function_name)
+    _current.set(recorder)
+    return recorder
+
+def timer(stage: str) -> ContextManager[None]:
+    """Time a stage with the recorder of the current invocation.
+
+    Args:
+        stage (str): The name of the stage.
+
+    Returns:
+        ContextManager[None]: The context manager timing the stage.
+    """
+
+    # Delegate to the current recorder
+    return get_metrics().timer(stage)
+
+def timed(stage: str) -> Callable:
+    """Decorate a function to time each call as a stage of the current invocation.
+
+    Args:
+        stage (str): The name of the stage.
+
+    Returns:
+        Callable: The decorator.
+    """
+
+    # Wrap the function
+    def decorator(func: Callable) -> Callable:
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+
+            # Time the call with the recorder current at call time
+            with timer(stage):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+def emit_metrics(summary: Dict[str, Any], recorder: MetricsRecorder) -> None:
+    """Write a summary to stdout in Embedded Metric Format, unless METRICS_EMF is 'false'.
+
+    Args:
+        summary (Dict[str, Any]): The summary from to_dict.
+        recorder (MetricsRecorder): The recorder the summary came from.
+    """
+
+    # Skip the output when disabled
+    if os.environ.get('METRICS_EMF', 'true').lower() == 'false':
+        return
+
+    # Write one JSON line, which CloudWatch Logs turns into metrics
+    print(json.dumps(recorder.to_emf(summary)), flush=True)
+
+def instrumented(function_name: str) -> Callable:
+    """Decorate a Lambda handler to record its metrics.
+
+    A new recorder is started for each invocation. When the handler returns, the metrics are written
+    in Embedded Metric Format and, if the handler returned a dictionary, attached to it as 'metrics'.
+
+    Args:
+        function_name (str): The name of the function, used as the metrics dimension.
+
+    Returns:
+        Callable: The decorator.
+    """
+
+    # Wrap the handler
+    def decorator(handler: Callable[[Dict[str, Any], Any], Any]) -> Callable[[Dict[str, Any], Any], Any]:
+
+        @functools.wraps(handler)
+        def wrapper(event: Dict[str, Any], context: Any) -> Any:
+
+            # Record the invocation and summarize it
+            recorder = start_metrics(function_name)
+            result = handler(event, context)
+            summary = recorder.to_dict()
+            emit_metrics(summary, recorder)
+
+            # Attach the metrics to the result
+            if isinstance(result, dict):
+                result['metrics'] = summary
+            return result
+
+        return wrapper
+
+    return decorator
+
+def instrument_client(client: Any, service_name: str) -> None:
+    """Record the calls made by a Boto3 client in the recorder of the current invocation.
+
+    Each call is counted and timed per operation, and the bytes read from and written to S3 are
+    counted.
+
+    Args:
+        client (Any): The Boto3 client.
+        service_name (str): The service name of the client, e.g. 's3'.
+    """
+
+    # Note the start of each call in its request context
+    def before_call(model: Any, context: Dict[str, Any], **kwargs: Any) -> None:
+        context['metrics_started'] = time.perf_counter()
+
+    # Record each call once it completes
+    def after_call(model: Any, context: Dict[str, Any], parsed: Dict[str, Any], **kwargs: Any) -> None:
+        started = context.get('metrics_started', time.perf_counter())
+        recorder = get_metrics()
+        recorder.record_api_call(f'{service_name}.{model.name}', (time.perf_counter() - started) * 1000)
+        if model.name == 'GetObject':
+            recorder.add_bytes(f'{service_name}_read', parsed.get('ContentLength', 0))
+
+    # Record each failed call
+    def after_call_error(model: Any, context: Dict[str, Any], **kwargs: Any) -> None:
+        started = context.get('metrics_started', time.perf_counter())
+        get_metrics().record_api_call(f'{service_name}.{model.name}', (time.perf_counter() - started) * 1000, error=True)
+
+    # Count the bytes of uploads, whose body botocore may already have wrapped in a file-like object
+    def before_parameter_build(params: Dict[str, Any], model: Any, **kwargs: Any) -> None:
+        body = params.get('Body')
+        if model.name not in UPLOAD_OPERATIONS or body is None:
+            return
+        if isinstance(body, str):
+            size = len(body.encode('utf-8'))
+        elif isinstance(body, (bytes, bytearray)):
+            size = len(body)
+        elif hasattr(body, 'seek') and hasattr(body, 'tell'):
+            position = body.tell()
+            size = body.seek(0, os.SEEK_END) - position
+            body.seek(position)
+        else:
+            return
+        get_metrics().add_bytes(f'{service_name}_written', size)
+
+    # Register the hooks for every operation of the client
+    events = client.meta.events
+    events.register('before-call', before_call)
+    events.register('after-call', after_call)
+    events.register('after-call-error', after_call_error)
+    events.register('before-parameter-build', before_parameter_build)
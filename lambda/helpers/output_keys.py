@@ -0,0 +1,177 @@
+import os
+import re
+from typing import Any, Dict, List
+from helpers.cache import make_cache_key
+
+# Number of hex digits of the output IDs
+OUTPUT_ID_LENGTH = 16
+
+# Characters not allowed in Amazon Transcribe job names
+JOB_NAME_DISALLOWED = re.compile(r'[^0-9A-Za-z._-]+')
+
+# Maximum length of an Amazon Transcribe job name
+MAX_JOB_NAME_LENGTH = 200
+
+# Language the audio is transcribed in
+TRANSCRIPT_LANGUAGE_CODE = 'en-US'
+
+# Language the transcripts are translated from
+SOURCE_LANGUAGE_CODE = 'en'
+
+# Format of the synthesized audio
+AUDIO_FORMAT = 'mp3'
+
+def get_object_version(head_response: Dict[str, Any]) -> str:
+    """Identify the version of an S3 object from its head_object response.
+
+    The version ID is used in versioned buckets and the ETag otherwise, so a new upload under the
+    same key gets new outputs while retries of the same upload find the outputs they saved before.
+
+    Args:
+        head_response (Dict[str, Any]): The head_object response.
+
+    Returns:
+        str: The version ID or ETag, prefixed with which of them it is.
+    """
+
+    # Prefer the version ID, which is 'null' for objects written before versioning was enabled
+    version_id = head_response.get('VersionId')
+    if version_id and version_id != 'null':
+        return f'version:{version_id}'
+
+    # Fall back to the ETag
+    etag = head_response.get('ETag', '').strip('"')
+    return f'etag:{etag}'
+
+def get_base_name(filename: str) -> str:
+    """Get the name an input file's outputs are named after.
+
+    Args:
+        filename (str): The filename, e.g. 'team.sync.2025-07.wav'.
+
+    Returns:
+        str: The filename without its last extension, e.g. 'team.sync.2025-07'.
+    """
+
+    # Remove only the last extension, keeping the dots within the name
+    return os.path.splitext(filename)[0]
+
+def make_output_id(*parts: Any) -> str:
+    """Build a short ID from the values that determine a stage's output.
+
+    Args:
+        *parts (Any): JSON-serializable values, such as the input's identity and the stage parameters.
+
+    Returns:
+        str: The first OUTPUT_ID_LENGTH hex digits of their SHA-256 digest.
+    """
+
+    # Hash the values as the cache keys do, shortened for readable keys
+    return make_cache_key(*parts)[:OUTPUT_ID_LENGTH]
+
+def get_transcription_output_id(bucket: str, key: str, head_response: Dict[str, Any], language_code: str) -> str:
+    """Build the output ID of the transcription of an audio file.
+
+    Args:
+        bucket (str): The bucket holding the audio file.
+        key (str): The key of the audio file.
+        head_response (Dict[str, Any]): The head_object response of the audio file.
+        language_code (str): The language of the audio.
+
+    Returns:
+        str: The output ID, the same for every attempt on the same version of the file.
+    """
+
+    # Identify the audio by its location and version
+    return make_output_id(bucket, key, get_object_version(head_response), language_code)
+
+def get_translation_output_id(bucket: str, transcript_key: str, target_language: str, terminology_names: List[str]) -> str:
+    """Build the output ID of the translation of a transcript.
+
+    Args:
+        bucket (str): The bucket holding the transcript.
+        transcript_key (str): The key of the transcript, which already identifies the audio version.
+        target_language (str): The language translated into.
+        terminology_names (List[str]): The custom terminologies applied, in any order.
+
+    Returns:
+        str: The output ID.
+    """
+
+    # Identify the translation by its transcript and parameters
+    return make_output_id(bucket, transcript_key, SOURCE_LANGUAGE_CODE, target_language, sorted(terminology_names))
+
+def get_synthesis_output_id(translation: str, voice: Dict[str, str]) -> str:
+    """Build the output ID of the audio synthesized from a translation.
+
+    Args:
+        translation (str): The S3 URI of the translation, which already identifies its text, or
+            the translated text itself when it was passed inline.
+        voice (Dict[str, str]): The Polly 'voice_id' and 'engine'.
+
+    Returns:
+        str: The output ID.
+    """
+
+    # Identify the audio by the translation and the voice speaking it
+    return make_output_id(translation, voice['voice_id'], AUDIO_FORMAT, voice['engine'])
+
+def get_transcription_job_name(base_name: str, output_id: str) -> str:
+    """Build the Amazon Transcribe job name of an audio file.
+
+    Args:
+        base_name (str): The audio filename without its extension.
+        output_id (str): The output ID of the transcription.
+
+    Returns:
+        str: The job name, made of the characters and within the length Amazon Transcribe allows.
+    """
+
+    # Replace disallowed characters and leave room for the output ID
+    safe_name = JOB_NAME_DISALLOWED.sub('-', base_name)[:MAX_JOB_NAME_LENGTH - OUTPUT_ID_LENGTH - 1]
+    return f'{safe_name}-{output_id}'
+
+def get_transcript_key(base_name: str, language_code: str, output_id: str) -> str:
+    """Build the key of a transcript.
+
+    Args:
+        base_name (str): The audio filename without its extension.
+        language_code (str): The language of the audio.
+        output_id (str): The output ID of the transcription.
+
+    Returns:
+        str: The key under 'transcripts/'.
+    """
+
+    # Name the transcript after the audio and the output ID
+    return f'transcripts/{base_name}_transcript_{language_code}-{output_id}.txt'
+
+def get_translation_key(base_name: str, target_language: str, output_id: str) -> str:
+    """Build the key of a translation.
+
+    Args:
+        base_name (str): The audio filename without its extension.
+        target_language (str): The language translated into.
+        output_id (str): The output ID of the translation.
+
+    Returns:
+        str: The key under 'translations/'.
+    """
+
+    # Name the translation after the audio, the language and the output ID
+    return f'translations/{base_name}_translation_{target_language}-{output_id}.txt'
+
+def get_audio_key(base_name: str, target_language: str, output_id: str) -> str:
+    """Build the key of synthesized audio.
+
+    Args:
+        base_name (str): The audio filename without its extension.
+        target_language (str): The language spoken.
+        output_id (str): The output ID of the synthesis.
+
+    Returns:
+        str: The key under 'audio_outputs/'.
+    """
+
+    # Name the audio after the input audio, the language and the output ID
+    return f'audio_outputs/{base_name}_{target_language}-{output_id}.{AUDIO_FORMAT}'
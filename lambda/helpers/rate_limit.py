@@ -0,0 +1,84 @@
+import threading
+import time
+from typing import Callable, Optional
+
+class TokenBucket:
+    """A token bucket rate limiter.
+
+    Tokens are added at a steady rate up to the capacity, and each acquired token takes one away,
+    so calls run at the rate on average with bursts of up to the capacity. The bucket starts full.
+    """
+
+    def __init__(self, rate_per_second: float, capacity: float = 1.0, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep) -> None:
+        """Initialize the bucket.
+
+        Args:
+            rate_per_second (float): The tokens added per second.
+            capacity (float): The maximum number of tokens, i.e. the largest burst.
+            clock (Callable[[], float]): Returns the current time in seconds.
+            sleep (Callable[[float], None]): Waits for a number of seconds.
+
+        Raises:
+            ValueError: If the rate or capacity is not positive.
+        """
+
+        # Validate the settings
+        if rate_per_second <= 0 or capacity <= 0:
+            raise ValueError('The rate and capacity of a token bucket must be positive.')
+
+        # Start with a full bucket
+        self.rate_per_second = rate_per_second
+        self.capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = capacity
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        """Add the tokens earned since the last refill. The lock must be held."""
+
+        # Add tokens for the elapsed time, up to the capacity
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate_per_second)
+        self._updated_at = now
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Take tokens if they are available.
+
+        Args:
+            tokens (float): The number of tokens to take.
+
+        Returns:
+            float: 0 if the tokens were taken, otherwise the seconds until they will be available.
+        """
+
+        # Take the tokens, or work out how long until there are enough
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate_per_second
+
+    def acquire(self, tokens: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """Take tokens, waiting until they are available.
+
+        Args:
+            tokens (float): The number of tokens to take.
+            timeout (Optional[float]): The longest time to wait in seconds, or None to wait as long as needed.
+
+        Returns:
+            bool: True if the tokens were taken, False if they would not be available within the timeout.
+        """
+
+        # Wait for the tokens, giving up early if they would arrive too late
+        deadline = None if timeout is None else self._clock() + timeout
+        while True:
+            wait_seconds = self.try_acquire(tokens)
+            if wait_seconds == 0:
+                return True
+            if deadline is not None and self._clock() + wait_seconds > deadline:
+                return False
+            self._sleep(wait_seconds)
@@ -0,0 +1,225 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional, TypedDict
+from helpers.logger import logger
+from helpers.metrics import timed
+from helpers.s3_uri import S3Location, parse_s3_uri
+
+# Overall status values carried by every stage result
+SUBMITTED = 'SUBMITTED'
+IN_PROGRESS = 'IN_PROGRESS'
+COMPLETED = 'COMPLETED'
+FAILED = 'FAILED'
+
+# Default size (in bytes of JSON) above which a result field is stored in S3 and passed as a pointer
+DEFAULT_MAX_INLINE_BYTES = 8 * 1024
+
+# Prefix of the result fields stored in S3
+PAYLOAD_PREFIX = 'payloads/'
+
+# Key marking a result field that was stored in S3
+POINTER_KEY = 'payload_uri'
+
+# Maximum length of an error message carried in a result
+MAX_MESSAGE_LENGTH = 1024
+
+class TranscriptionResult(TypedDict, total=False):
+    """Result of the transcribe function."""
+    statusCode: int
+    status: str
+    job_name: str
+    bucket: str
+    key: str
+    original_filename: str
+    transcript_key: str
+    transcript_uri: Optional[str]
+    cache_key: Optional[str]
+    cached: bool
+    media_seconds: Optional[float]
+    next_wait_seconds: int
+    error: str
+    message: str
+
+class TranscriptionStatus(TypedDict, total=False):
+    """Result of the transcription status function."""
+    statusCode: int
+    status: str
+    job_name: str
+    bucket: str
+    original_filename: str
+    transcript_key: Optional[str]
+    transcript_uri: Optional[str]
+    poll_attempt: int
+    next_wait_seconds: int
+    error: str
+    message: str
+
+class TranslationResult(TypedDict, total=False):
+    """Result of the translate function; 'translations' and 'errors' map languages to S3 URIs and messages."""
+    statusCode: int
+    status: str
+    bucket: str
+    key: str
+    original_filename: str
+    target_language: Optional[str]
+    target_languages: List[str]
+    translations: Dict[str, str]
+    errors: Dict[str, str]
+    cache: Dict[str, int]
+    error: str
+    message: str
+
+class TranslationStatus(TypedDict, total=False):
+    """Result of the translation status function; 'translation_statuses' maps languages to existence statuses."""
+    statusCode: int
+    status: str
+    bucket: str
+    original_filename: str
+    translation_statuses: Dict[str, str]
+    check_attempt: int
+    next_wait_seconds: int
+    error: str
+    message: str
+
+class SynthesisResult(TypedDict, total=False):
+    """Result of the synthesize function; 'audio_keys' maps languages to the keys of their audio."""
+    statusCode: int
+    status: str
+    bucket: str
+    original_filename: str
+    audio_keys: Dict[str, str]
+    cache: Dict[str, int]
+    error: str
+    message: str
+
+class BatchResult(TypedDict, total=False):
+    """Result of a function given a batch of 'items'; 'items' holds the result of each item, in order."""
+    statusCode: int
+    status: str
+    items: List[Dict[str, Any]]
+    completed: int
+    failed: int
+
+class SynthesisStatus(TypedDict, total=False):
+    """Result of the synthesis status function; 'audio_statuses' maps languages to existence statuses."""
+    statusCode: int
+    status: str
+    audio_statuses: Dict[str, str]
+    check_attempt: int
+    next_wait_seconds: int
+    error: str
+    message: str
+
+def error_result(status_code: int, error: str, message: Optional[str] = None, **fields: Any) -> Dict[str, Any]:
+    """Build the result of a stage that failed.
+
+    Args:
+        status_code (int): The HTTP-style status code, e.g. 400 or 500.
+        error (str): A short description of the error.
+        message (Optional[str]): The details, truncated to MAX_MESSAGE_LENGTH characters.
+        **fields (Any): Other result fields, e.g. the bucket.
+
+    Returns:
+        Dict[str, Any]: The result, with a FAILED status.
+    """
+
+    # Build the flat error result
+    result = {'statusCode': status_code, 'status': FAILED, 'error': error, **fields}
+    if message is not None:
+        result['message'] = str(message)[:MAX_MESSAGE_LENGTH]
+    return result
+
+def batch_result(results: List[Dict[str, Any]]) -> BatchResult:
+    """Build the result of a stage that processed a batch of items.
+
+    Args:
+        results (List[Dict[str, Any]]): The result of each item, in order.
+
+    Returns:
+        BatchResult: The item results with their counts; COMPLETED if any item completed, FAILED otherwise.
+    """
+
+    # Count the completed items
+    completed = sum(1 for result in results if result.get('status') == COMPLETED)
+    return {
+        'statusCode': 200,
+        'status': COMPLETED if completed else FAILED,
+        'items': results,
+        'completed': completed,
+        'failed': len(results) - completed
+    }
+
+def get_max_inline_bytes() -> int:
+    """Get the size above which result fields are stored in S3.
+
+    Returns:
+        int: The size in bytes, from the PAYLOAD_MAX_INLINE_BYTES environment variable.
+    """
+
+    # Read the limit from the environment
+    return int(os.environ.get('PAYLOAD_MAX_INLINE_BYTES', DEFAULT_MAX_INLINE_BYTES))
+
+def is_pointer(value: Any) -> bool:
+    """Check whether a result field was stored in S3.
+
+    Args:
+        value (Any): The field value.
+
+    Returns:
+        bool: True if the value is a pointer to S3.
+    """
+
+    # A pointer is a dictionary holding only the payload URI
+    return isinstance(value, dict) and set(value) == {POINTER_KEY}
+
+@timed('store_payload')
+def store_payload(s3: Any, bucket: str, name: str, value: Any) -> Any:
+    """Keep a result field inline, or store it in S3 and return a pointer when it is too large.
+
+    Stored fields are named after the hash of their content, so storing the same value twice
+    writes the same object.
+
+    Args:
+        s3 (Any): The Boto3 S3 client.
+        bucket (str): The bucket to store the field in.
+        name (str): The field name, used to name the object, e.g. 'translations'.
+        value (Any): The JSON-serializable field value.
+
+    Returns:
+        Any: The value itself, or {'payload_uri': 's3://<bucket>/payloads/...'}.
+    """
+
+    # Keep small values inline
+    payload = json.dumps(value, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    if len(payload) <= get_max_inline_bytes():
+        return value
+
+    # Store the value under the hash of its content
+    key = f'{PAYLOAD_PREFIX}{name}-{hashlib.sha256(payload).hexdigest()}.json'
+    s3.put_object(Bucket=bucket, Key=key, Body=payload, ContentType='application/json')
+
+    # Log the stored field and return the pointer
+    logger.info("Stored %s (%d bytes) at: s3://%s/%s", name, len(payload), bucket, key)
+    return {POINTER_KEY: S3Location(bucket, key).uri}
+
+@timed('load_payload')
+def load_payload(s3: Any, value: Any) -> Any:
+    """Resolve a result field that may have been stored in S3.
+
+    Args:
+        s3 (Any): The Boto3 S3 client.
+        value (Any): The field value, or a pointer returned by store_payload.
+
+    Returns:
+        Any: The field value.
+    """
+
+    # Return inline values as they are
+    if not is_pointer(value):
+        return value
+
+    # Fetch the stored value
+    bucket, key = parse_s3_uri(value[POINTER_KEY])
+    response = s3.get_object(Bucket=bucket, Key=key)
+    return json.loads(response['Body'].read().decode('utf-8'))
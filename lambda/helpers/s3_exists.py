@@ -0,0 +1,121 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+from botocore.exceptions import ClientError
+from helpers.concurrency import in_current_context
+from helpers.logger import logger
+from helpers.metrics import timed
+
+# Status values returned for each key
+EXISTS = 'EXISTS'
+NOT_FOUND = 'NOT_FOUND'
+
+# Default number of keys above which a single listing replaces the per-key checks
+DEFAULT_LIST_THRESHOLD = 10
+
+# Default maximum number of concurrent head_object calls
+DEFAULT_MAX_WORKERS = 10
+
+def head_object_status(s3: Any, bucket: str, key: str) -> str:
+    """Check whether a single object exists with head_object.
+
+    Args:
+        s3 (Any): The Boto3 S3 client.
+        bucket (str): The bucket to check.
+        key (str): The key to check.
+
+    Returns:
+        str: EXISTS, NOT_FOUND, or 'ERROR: <message>'.
+    """
+
+    # Try to head the object
+    try:
+
+        # Check if the object exists
+        s3.head_object(Bucket=bucket, Key=key)
+        return EXISTS
+
+    # Handle ClientError exceptions
+    except ClientError as e:
+
+        # A 404 means the object does not exist
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            return NOT_FOUND
+
+        # Log and report any other error
+        logger.error("Error checking object: s3://%s/%s, Error: %s", bucket, key, e)
+        return f'ERROR: {str(e)}'
+
+def list_objects_status(s3: Any, bucket: str, keys: List[str]) -> Dict[str, str]:
+    """Check whether objects exist with a single paginated listing of their shared prefix.
+
+    Args:
+        s3 (Any): The Boto3 S3 client.
+        bucket (str): The bucket to check.
+        keys (List[str]): The keys to check.
+
+    Returns:
+        Dict[str, str]: EXISTS or NOT_FOUND for each key.
+    """
+
+    # Work out the longest prefix shared by all keys
+    prefix = os.path.commonprefix(keys)
+    logger.debug("Listing s3://%s/%s to check %d key(s)", bucket, prefix, len(keys))
+
+    # Collect the wanted keys found under the prefix
+    wanted = set(keys)
+    found = set()
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        found.update(item['Key'] for item in page.get('Contents', []) if item['Key'] in wanted)
+
+        # Stop listing once every key has been found
+        if found == wanted:
+            break
+
+    # Return the status of each key
+    return {key: EXISTS if key in found else NOT_FOUND for key in keys}
+
+@timed('check_objects')
+def check_objects_exist(s3: Any, bucket: str, keys: List[str]) -> Dict[str, str]:
+    """Check whether several objects exist, in time that stays flat as the number of keys grows.
+
+    Up to S3_EXISTS_LIST_THRESHOLD keys are checked with concurrent head_object calls (at most
+    S3_EXISTS_MAX_WORKERS at a time); above it, one list_objects_v2 over the keys' shared prefix is used.
+
+    Args:
+        s3 (Any): The Boto3 S3 client.
+        bucket (str): The bucket to check.
+        keys (List[str]): The keys to check.
+
+    Returns:
+        Dict[str, str]: EXISTS, NOT_FOUND, or 'ERROR: <message>' for each key.
+    """
+
+    # Nothing to check
+    if not keys:
+        return {}
+
+    # Read the thresholds from the environment
+    list_threshold = int(os.environ.get('S3_EXISTS_LIST_THRESHOLD', DEFAULT_LIST_THRESHOLD))
+    max_workers = max(1, int(os.environ.get('S3_EXISTS_MAX_WORKERS', DEFAULT_MAX_WORKERS)))
+
+    # Use a single listing for many keys
+    if len(keys) > list_threshold:
+
+        # Try to list the shared prefix
+        try:
+            return list_objects_status(s3, bucket, keys)
+
+        # Handle ClientError exceptions
+        except ClientError as e:
+
+            # Log a warning and fall back to per-key checks
+            logger.warning("Listing failed, falling back to per-key checks: %s", e)
+
+    # Check each key concurrently
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(keys))) as executor:
+        statuses = list(executor.map(in_current_context(lambda key: head_object_status(s3, bucket, key)), keys))
+
+    # Return the status of each key
+    return dict(zip(keys, statuses))
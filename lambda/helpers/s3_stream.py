@@ -0,0 +1,94 @@
+from typing import Any, Iterable, Optional
+from helpers.logger import logger
+from helpers.metrics import timed
+
+# Minimum size of every multipart upload part except the last (5 MiB)
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+@timed('upload_stream')
+def upload_stream(s3: Any, bucket: str, key: str, parts: Iterable[bytes], content_type: Optional[str] = None) -> int:
+    """Stream an iterable of byte strings into a single S3 object.
+
+    Data is buffered only up to the multipart part size, so the full object never has to be held in
+    memory. Objects smaller than one part are written with a single put_object call instead, and a
+    failed multipart upload is aborted so no orphaned parts are left behind.
+
+    Args:
+        s3 (Any): The Boto3 S3 client.
+        bucket (str): The bucket to write to.
+        key (str): The key to write to.
+        parts (Iterable[bytes]): The object data, in order.
+        content_type (Optional[str]): The content type of the object, if any.
+
+    Returns:
+        int: The total number of bytes written.
+    """
+
+    # Build the extra arguments shared by put_object and create_multipart_upload
+    extra_args = {'ContentType': content_type} if content_type else {}
+
+    # Initialize the upload state
+    buffer = bytearray()
+    upload_id = None
+    completed_parts = []
+    total_bytes = 0
+
+    # Try to upload the data
+    try:
+
+        # Loop through the incoming data and upload a part whenever the buffer is full
+        for data in parts:
+
+            # Add the data to the buffer
+            buffer.extend(data)
+            total_bytes += len(data)
+
+            # Keep buffering until a full part is available
+            if len(buffer) < MIN_PART_SIZE:
+                continue
+
+            # Start the multipart upload on the first full part
+            if upload_id is None:
+                upload_id = s3.create_multipart_upload(Bucket=bucket, Key=key, **extra_args)['UploadId']
+                logger.debug("Started multipart upload for s3://%s/%s: %s", bucket, key, upload_id)
+
+            # Upload the buffered part and reset the buffer
+            part_number = len(completed_parts) + 1
+            response = s3.upload_part(Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=part_number, Body=bytes(buffer))
+            completed_parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+            buffer = bytearray()
+
+        # Write small objects with a single request
+        if upload_id is None:
+
+            # Save the buffered data to S3
+            s3.put_object(Bucket=bucket, Key=key, Body=bytes(buffer), **extra_args)
+
+            # Return the number of bytes written
+            return total_bytes
+
+        # Upload whatever is left as the final part
+        if buffer:
+            part_number = len(completed_parts) + 1
+            response = s3.upload_part(Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=part_number, Body=bytes(buffer))
+            completed_parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+
+        # Complete the multipart upload
+        s3.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={'Parts': completed_parts})
+
+        # Log the completion of the multipart upload
+        logger.debug("Completed multipart upload for s3://%s/%s in %d part(s)", bucket, key, len(completed_parts))
+
+        # Return the number of bytes written
+        return total_bytes
+
+    # Handle any failure while uploading
+    except Exception:
+
+        # Abort the multipart upload so its parts are not left behind
+        if upload_id is not None:
+            logger.error("Aborting multipart upload for s3://%s/%s", bucket, key)
+            s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+
+        # Re-raise the original error
+        raise
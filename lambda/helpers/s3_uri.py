@@ -0,0 +1,120 @@
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional
+from urllib.parse import quote, unquote, urlsplit
+
+# Host of a path-style URL, e.g. s3.eu-west-1.amazonaws.com, s3-eu-west-1.amazonaws.com or s3.amazonaws.com
+PATH_STYLE_HOST = re.compile(r'^s3(?:[.-](?:dualstack\.)?(?P<region>[a-z0-9-]+))?\.amazonaws\.com(?:\.cn)?$')
+
+# Host of a virtual-hosted-style URL, e.g. my-bucket.s3.eu-west-1.amazonaws.com or my.bucket.s3.amazonaws.com
+VIRTUAL_HOSTED_HOST = re.compile(
+    r'^(?P<bucket>[a-z0-9][a-z0-9.-]*[a-z0-9])\.s3(?:[.-](?:dualstack\.)?(?P<region>[a-z0-9-]+))?\.amazonaws\.com(?:\.cn)?$'
+)
+
+# Maximum number of parsed URIs kept per container
+CACHE_SIZE = 4096
+
+class S3UriError(ValueError):
+    """Raised when a value is not an S3 URI or an S3 URL."""
+
+class S3Location(NamedTuple):
+    """The bucket and key of an S3 object, unpacked as bucket, key = location."""
+
+    bucket: str
+    key: str
+
+    @property
+    def uri(self) -> str:
+        """str: The s3://bucket/key URI of the object."""
+        return f's3://{self.bucket}/{self.key}'
+
+    def url(self, region: str) -> str:
+        """Build the path-style HTTPS URL of the object, as Amazon Transcribe reports its outputs.
+
+        Args:
+            region (str): The region of the bucket.
+
+        Returns:
+            str: The URL, with the key percent-encoded.
+        """
+
+        # Encode the key, keeping its slashes
+        return f"https://s3.{region}.amazonaws.com/{self.bucket}/{quote(self.key, safe='/~')}"
+
+def is_s3_uri(value: Optional[str]) -> bool:
+    """Check whether a value looks like an S3 URI or URL rather than a bare key.
+
+    Args:
+        value (Optional[str]): The value.
+
+    Returns:
+        bool: True for s3://, http:// and https:// values.
+    """
+
+    # Look at the scheme only
+    return bool(value) and value.startswith(('s3://', 'https://', 'http://'))
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_s3_uri(uri: str) -> S3Location:
+    """Parse an S3 URI or URL into its bucket and key.
+
+    Accepts s3://bucket/key URIs, and virtual-hosted-style (https://bucket.s3.region.amazonaws.com/key)
+    and path-style (https://s3.region.amazonaws.com/bucket/key) URLs in any region, including the
+    legacy s3-region and global s3.amazonaws.com endpoints, dual-stack endpoints and the China
+    partition. Keys in URLs are percent-decoded; keys in s3:// URIs are taken as they are. Results
+    are cached, as the same URIs are parsed again on every status check.
+
+    Args:
+        uri (str): The URI or URL.
+
+    Returns:
+        S3Location: The bucket and key; the key is empty for a URI naming only a bucket.
+
+    Raises:
+        S3UriError: If the value is not an S3 URI or URL.
+    """
+
+    # Split s3:// URIs at the first slash after the bucket
+    if uri.startswith('s3://'):
+        bucket, _, key = uri[5:].partition('/')
+        if not bucket:
+            raise S3UriError(f'S3 URI has no bucket: {uri}')
+        return S3Location(bucket, key)
+
+    # Parse the URL, removing only the slash before the path, as keys may start with one
+    parts = urlsplit(uri)
+    host = (parts.hostname or '').lower()
+    path = parts.path[1:] if parts.path.startswith('/') else parts.path
+    if parts.scheme not in ('https', 'http'):
+        raise S3UriError(f'Not an S3 URI or URL: {uri}')
+
+    # Take the bucket from the path of path-style URLs
+    if PATH_STYLE_HOST.match(host):
+        bucket, _, key = path.partition('/')
+        if not bucket:
+            raise S3UriError(f'S3 URL has no bucket: {uri}')
+        return S3Location(bucket, unquote(key))
+
+    # Take the bucket from the host of virtual-hosted-style URLs
+    match = VIRTUAL_HOSTED_HOST.match(host)
+    if match:
+        return S3Location(match.group('bucket'), unquote(path))
+
+    # Reject URLs of other hosts
+    raise S3UriError(f'Not an S3 URL: {uri}')
+
+def to_object_key(value: str) -> str:
+    """Get the object key from an S3 URI or URL, or from a value that is already a key.
+
+    Args:
+        value (str): The S3 URI, URL or key.
+
+    Returns:
+        str: The key.
+
+    Raises:
+        S3UriError: If the value is a URL that does not point to S3.
+    """
+
+    # Parse URIs and return keys as they are
+    return parse_s3_uri(value).key if is_s3_uri(value) else value
@@ -0,0 +1,142 @@
+import hashlib
+import json
+from typing import Any, Dict, List
+from botocore.exceptions import ClientError
+from helpers.logger import logger
+from helpers.results import FAILED
+
+# Prefix of the stored task tokens, one object per waiting execution under a folder per transcription job
+TASK_TOKEN_PREFIX = 'callbacks/transcription/'
+
+# Number of hex digits of the token hashes the stored tokens are named after
+TOKEN_HASH_LENGTH = 32
+
+# Error reported to Step Functions when a stage fails in callback mode
+CALLBACK_ERROR = 'TranscriptionFailed'
+
+def task_token_prefix(job_name: str) -> str:
+    """Build the prefix the task tokens waiting for a transcription job are stored under.
+
+    Args:
+        job_name (str): The transcription job name.
+
+    Returns:
+        str: The S3 prefix, ending with a slash.
+    """
+
+    # Group the tokens in a folder named after the job
+    return f'{TASK_TOKEN_PREFIX}{job_name}/'
+
+def task_token_key(job_name: str, task_token: str) -> str:
+    """Build the key an execution's task token is stored under.
+
+    Job names are deterministic, so executions of the same upload wait for the same job; each of
+    them stores its token under its own key, named after the token's hash.
+
+    Args:
+        job_name (str): The transcription job name.
+        task_token (str): The task token of the waiting execution.
+
+    Returns:
+        str: The S3 key.
+    """
+
+    # Name the object after the hash of the token, which is too long for a key of its own
+    token_hash = hashlib.sha256(task_token.encode('utf-8')).hexdigest()[:TOKEN_HASH_LENGTH]
+    return f'{task_token_prefix(job_name)}{token_hash}.json'
+
+def save_task_token(s3: Any, bucket: str, job_name: str, task_token: str, details: Dict[str, Any]) -> None:
+    """Store the Step Functions task token of an execution waiting for a transcription job.
+
+    Args:
+        s3 (Any): The Boto3 S3 client.
+        bucket (str): The bucket to store the token in.
+        job_name (str): The transcription job name.
+        task_token (str): The task token to resume the execution with.
+        details (Dict[str, Any]): What the completion handler needs to build the result, e.g. the transcript key.
+    """
+
+    # Store the token with the job details
+    s3.put_object(
+        Bucket=bucket,
+        Key=task_token_key(job_name, task_token),
+        Body=json.dumps({'task_token': task_token, **details}).encode('utf-8'),
+        ContentType='application/json'
+    )
+
+def load_task_tokens(s3: Any, bucket: str, job_name: str) -> List[Dict[str, Any]]:
+    """Load the task tokens of every execution waiting for a transcription job.
+
+    Args:
+        s3 (Any): The Boto3 S3 client.
+        bucket (str): The bucket holding the tokens.
+        job_name (str): The transcription job name.
+
+    Returns:
+        List[Dict[str, Any]]: The task tokens and job details, empty if no execution is waiting for the job.
+    """
+
+    # Initialize the list of stored tokens
+    callbacks: List[Dict[str, Any]] = []
+
+    # List the tokens stored for the job
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=task_token_prefix(job_name)):
+        for item in page.get('Contents', []):
+
+            # Try to fetch the token
+            try:
+
+                # Read and parse the stored token
+                response = s3.get_object(Bucket=bucket, Key=item['Key'])
+                callbacks.append(json.loads(response['Body'].read().decode('utf-8')))
+
+            # Handle ClientError exceptions
+            except ClientError as e:
+
+                # A token deleted since the listing was handled by another delivery of the event
+                if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                    continue
+                raise
+
+    # Return the tokens
+    return callbacks
+
+def delete_task_token(s3: Any, bucket: str, job_name: str, task_token: str) -> None:
+    """Delete the task token an execution stored for a transcription job.
+
+    Args:
+        s3 (Any): The Boto3 S3 client.
+        bucket (str): The bucket holding the token.
+        job_name (str): The transcription job name.
+        task_token (str): The task token of the execution.
+    """
+
+    # Delete the token
+    s3.delete_object(Bucket=bucket, Key=task_token_key(job_name, task_token))
+
+def send_task_result(stepfunctions: Any, task_token: str, result: Dict[str, Any]) -> None:
+    """Resume a waiting execution with a stage result.
+
+    Results with a FAILED status fail the task, so the state's Catch rules apply; any other result
+    becomes the task output.
+
+    Args:
+        stepfunctions (Any): The Boto3 Step Functions client.
+        task_token (str): The task token of the waiting state.
+        result (Dict[str, Any]): The stage result.
+    """
+
+    # Fail the task with the error of a failed result
+    if result.get('status') == FAILED:
+        logger.info("Sending task failure: %s", result.get('error'))
+        stepfunctions.send_task_failure(
+            taskToken=task_token,
+            error=CALLBACK_ERROR,
+            cause=json.dumps({'error': result.get('error'), 'message': result.get('message')})
+        )
+        return
+
+    # Complete the task with the result as its output
+    logger.info("Sending task success with status: %s", result.get('status'))
+    stepfunctions.send_task_success(taskToken=task_token, output=json.dumps(result))
@@ -0,0 +1,135 @@
+import re
+from typing import Callable, List
+
+# Sentence boundaries: after terminal punctuation (Latin and CJK) and before whitespace
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?。！？])(?=\s)')
+
+# Word boundaries: a run of non-whitespace followed by its trailing whitespace
+WORD_PATTERN = re.compile(r'\S+\s*|\s+')
+
+def utf8_length(text: str) -> int:
+    """Measure text by its UTF-8 encoded size.
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: The number of bytes the text takes up in UTF-8.
+    """
+
+    # Return the encoded length of the text
+    return len(text.encode('utf-8'))
+
+def split_oversized(text: str, max_size: int, measure: Callable[[str], int]) -> List[str]:
+    """Split a piece of text that does not fit a chunk at word, then character, boundaries.
+
+    Args:
+        text (str): The text to split.
+        max_size (int): The maximum size of each piece.
+        measure (Callable[[str], int]): The function used to measure the size of text.
+
+    Returns:
+        List[str]: The pieces, each no larger than max_size.
+    """
+
+    # Initialize the list of pieces and the piece being built
+    pieces: List[str] = []
+    current = ''
+
+    # Loop through each word, keeping its trailing whitespace
+    for word in WORD_PATTERN.findall(text):
+
+        # Add the word to the current piece if it still fits
+        if measure(current + word) <= max_size:
+            current += word
+            continue
+
+        # Close the current piece before starting a new one
+        if current:
+            pieces.append(current)
+            current = ''
+
+        # Keep the word whole if it fits in a piece of its own
+        if measure(word) <= max_size:
+            current = word
+            continue
+
+        # Split a word that is larger than a piece character by character
+        for character in word:
+
+            # Close the current piece once the next character no longer fits
+            if current and measure(current + character) > max_size:
+                pieces.append(current)
+                current = ''
+
+            # Add the character to the current piece
+            current += character
+
+    # Add the last piece, if any
+    if current:
+        pieces.append(current)
+
+    # Return the pieces
+    return pieces
+
+def chunk_text(text: str, max_size: int, measure: Callable[[str], int] = utf8_length) -> List[str]:
+    """Split text into chunks no larger than max_size, breaking at sentence boundaries where possible.
+
+    Sentences are packed greedily into chunks. A sentence that is larger than a chunk on its own is
+    split at word boundaries, and a single word larger than a chunk is split between characters.
+    Concatenating the chunks gives back the original text, less any chunks of whitespace only, so
+    text that is empty or all whitespace has no chunks.
+
+    Args:
+        text (str): The text to split.
+        max_size (int): The maximum size of each chunk, as measured by `measure`.
+        measure (Callable[[str], int]): The function used to measure the size of text (UTF-8 bytes by default).
+
+    Returns:
+        List[str]: The chunks, in order.
+
+    Raises:
+        ValueError: If max_size is not positive.
+    """
+
+    # Check that the chunk size is usable
+    if max_size <= 0:
+        raise ValueError("max_size must be positive")
+
+    # Return the text as a single chunk if it already fits
+    if measure(text) <= max_size:
+        return [text] if text.strip() else []
+
+    # Initialize the list of chunks and the chunk being built
+    chunks: List[str] = []
+    current = ''
+
+    # Loop through each sentence, keeping the whitespace that precedes it
+    for sentence in SENTENCE_BOUNDARY.split(text):
+
+        # Add the sentence to the current chunk if it still fits
+        if measure(current + sentence) <= max_size:
+            current += sentence
+            continue
+
+        # Close the current chunk before starting a new one
+        if current:
+            chunks.append(current)
+            current = ''
+
+        # Keep the sentence whole if it fits in a chunk of its own
+        if measure(sentence) <= max_size:
+            current = sentence
+            continue
+
+        # Split an oversized sentence and keep its last piece open for the next sentence
+        pieces = split_oversized(sentence, max_size, measure)
+        chunks.extend(pieces[:-1])
+        current = pieces[-1] if pieces else ''
+
+    # Add the last chunk, if any
+    if current:
+        chunks.append(current)
+
+    # Return the chunks, without those of whitespace only
+    return [chunk for chunk in chunks if chunk.strip()]
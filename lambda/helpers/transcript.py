@@ -0,0 +1,129 @@
+from typing import Any, Optional
+from botocore.exceptions import ClientError
+from helpers.cache import get_object_cache
+from helpers.json_stream import JsonStreamError, JsonStreamReader
+from helpers.logger import logger
+from helpers.metrics import timed
+from helpers.s3_stream import upload_stream
+
+# Path of the transcribed text in the Amazon Transcribe JSON output
+TRANSCRIPT_TEXT_PATH = ['results', 'transcripts', 0, 'transcript']
+
+# Size of the chunks the Amazon Transcribe JSON output is read in (64 KiB)
+TRANSCRIPT_READ_CHUNK_SIZE = 64 * 1024
+
+@timed('save_transcript')
+def save_transcript_text(s3: Any, bucket: str, transcript_key: str) -> int:
+    """Replace the Amazon Transcribe JSON output with just the transcribed text.
+
+    The JSON is streamed and only 'results.transcripts[0].transcript' is decoded, so the per-word
+    items are never loaded and reading stops once the text has been found. The text is streamed
+    back to the same key; the old object is replaced only after the text has been read in full.
+
+    Args:
+        s3 (Any): The Boto3 S3 client.
+        bucket (str): The bucket holding the transcript.
+        transcript_key (str): The key Amazon Transcribe wrote its JSON output to.
+
+    Returns:
+        int: The size of the saved text in bytes.
+    """
+
+    # Stream the transcript directly from the S3 bucket
+    transcript_response = s3.get_object(Bucket=bucket, Key=transcript_key)
+    transcript_body = transcript_response['Body']
+    reader = JsonStreamReader(transcript_body.iter_chunks(TRANSCRIPT_READ_CHUNK_SIZE))
+
+    # Try to save the transcribed text
+    try:
+
+        # Handle transcripts that were already reduced to plain text
+        if reader.peek() != '{':
+
+            # Log that the transcript was already processed and leave it unchanged
+            logger.info("Transcript already saved as text: s3://%s/%s", bucket, transcript_key)
+            return transcript_response.get('ContentLength', 0)
+
+        # Stream only the transcribed text over the JSON output
+        text_parts = (part.encode('utf-8') for part in reader.iter_string(TRANSCRIPT_TEXT_PATH))
+        text_bytes = upload_stream(s3, bucket, transcript_key, text_parts, content_type='text/plain; charset=utf-8')
+
+    # Handle text that only looks like JSON; nothing was written, as the upload aborts on the error
+    except JsonStreamError as e:
+
+        # Log a warning and leave the transcript unchanged
+        logger.warning("Transcript is not Amazon Transcribe JSON, leaving it as is: s3://%s/%s (%s)", bucket, transcript_key, e)
+        return transcript_response.get('ContentLength', 0)
+
+    # Stop reading the rest of the JSON output
+    finally:
+        transcript_body.close()
+
+    # Log the successful saving of the transcript
+    logger.info("Transcript saved to: s3://%s/%s (%d bytes of text from %d bytes read)", bucket, transcript_key,
+                text_bytes, reader.bytes_read)
+
+    # Return the size of the text
+    return text_bytes
+
+def finalize_transcript(s3: Any, bucket: str, transcript_key: str, cache_key: Optional[str] = None) -> int:
+    """Save the transcribed text of a completed job and add it to the transcript cache.
+
+    Args:
+        s3 (Any): The Boto3 S3 client.
+        bucket (str): The bucket holding the transcript.
+        transcript_key (str): The key Amazon Transcribe wrote its JSON output to.
+        cache_key (Optional[str]): The transcript cache key computed when the job was submitted, if any.
+
+    Returns:
+        int: The size of the saved text in bytes.
+    """
+
+    # Replace the JSON output with the transcribed text
+    text_bytes = save_transcript_text(s3, bucket, transcript_key)
+
+    # Add the transcript to the cache under the key computed at submission
+    cache = get_object_cache(s3, bucket, 'transcript') if cache_key else None
+    if cache is not None:
+
+        # Try to store the transcript in the cache
+        try:
+
+            # Copy the transcript into the cache
+            cache.store_from(cache_key, bucket, transcript_key)
+
+        # Handle ClientError exceptions
+        except ClientError as e:
+
+            # Log a warning; a cache failure does not fail the transcription
+            logger.warning("Failed to cache transcript: %s", e)
+
+    # Return the size of the text
+    return text_bytes
+
+def is_transcript_saved(s3: Any, bucket: str, transcript_key: str) -> bool:
+    """Check whether the transcribed text of a job has already been saved.
+
+    Args:
+        s3 (Any): The Boto3 S3 client.
+        bucket (str): The bucket holding the transcript.
+        transcript_key (str): The key of the transcript.
+
+    Returns:
+        bool: True if the key holds the text, False if it is missing or still holds the JSON output.
+    """
+
+    # Try to head the transcript
+    try:
+
+        # The text is saved as plain text, replacing the JSON output
+        response = s3.head_object(Bucket=bucket, Key=transcript_key)
+        return response.get('ContentType', '').startswith('text/plain')
+
+    # Handle ClientError exceptions
+    except ClientError as e:
+
+        # A 404 means the transcript has not been written
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            return False
+        raise
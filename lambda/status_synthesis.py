@@ -1,35 +1,49 @@
-import boto3
-import json
+import os
 from botocore.exceptions import ClientError
 from typing import Dict, Any
-from helpers.logger import set_log_level, logger
+from helpers.logger import DEFAULT_LOG_LEVEL, LazyJson, set_log_level, logger
+from helpers.backoff import DEFAULT_STATUS_CHECK_SCHEDULE, get_adaptive_wait_seconds, get_poll_schedule
+from helpers.clients import LazyClient
+from helpers.metrics import instrumented
+from helpers.results import COMPLETED, FAILED, IN_PROGRESS, SynthesisStatus, error_result, load_payload, store_payload
+from helpers.s3_exists import EXISTS, NOT_FOUND, check_objects_exist
+from helpers.s3_uri import to_object_key
 
-# Initialize Boto3 clients
-s3 = boto3.client('s3')
+# Initialize Boto3 clients, created on first use
+s3 = LazyClient('s3')
+
+# Default number of status checks after which missing audio files are reported as failed
+DEFAULT_MAX_CHECKS = 5
 
 # Function to handle the AWS Lambda invocation and check audio file existence in S3
-def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+@instrumented('status_synthesis')
+def lambda_handler(event: Dict[str, Any], context: Any) -> SynthesisStatus:
     
     """Check the existence of audio files in S3 based on the synthesis results provided.
 
+    Besides the per-language statuses, the result carries an overall status for whatever languages
+    were synthesized: COMPLETED once every audio file exists, FAILED on an error, when nothing was
+    synthesized, or after SYNTHESIS_MAX_CHECKS checks, and IN_PROGRESS otherwise. While in progress,
+    the result carries the seconds to wait before the next check, backing off with jitter.
+
     Args:
         event (Dict[str, Any]): The input event containing results and bucket information.
         context (Any): The context object provided by AWS Lambda.
 
     Returns:
-        Dict[str, Any]: A response dict containing status code and audio file statuses.
+        SynthesisStatus: The flat result with the overall status and the status of each audio file.
     """
     
-    # Set log level from the event, default to DEBUG if not specified
+    # Set log level from the event, default to the LOG_LEVEL environment variable (DEBUG if unset)
     # Expecting logLevel to be one of 'DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'
-    log_level = event.get('logLevel', 'DEBUG')
+    log_level = event.get('logLevel', DEFAULT_LOG_LEVEL)
     set_log_level(log_level)
 
     # Log the invocation of the Lambda function
     logger.info("Check Audio File Existence function invoked.")
 
     # Log the received event
-    logger.debug("Received event: %s", json.dumps(event))
+    logger.debug("Received event: %s", LazyJson(event))
 
     # Initialize the bucket variable
     bucket = None
@@ -48,61 +62,31 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             logger.error("No bucket name provided in the event.")
 
             # Return a response indicating failure
-            return {
-                'statusCode': 400,
-                'body': json.dumps({'error': 'No bucket name provided'})
-            }
+            return error_result(400, 'No bucket name provided')
 
-        # Extract synthesis results from the event body
-        synthesis_result = event.get('synthesisResult', {})
+        # Extract the synthesis result from the event
+        synthesis_result = event.get('synthesisResult') or {}
 
         # Log the synthesis result
-        logger.debug("Extracted synthesis result: %s", synthesis_result)
+        logger.debug("Extracted synthesis result: %s", LazyJson(synthesis_result))
 
-        # Ensure synthesis_result is a dictionary and has a body key
-        if isinstance(synthesis_result, dict) and 'body' in synthesis_result:
+        # Check if the synthesize function failed
+        if synthesis_result.get('status') == FAILED:
 
-            # Extract the body from the synthesis result
-            body = synthesis_result['body']
-            
-            # Log the body of the synthesis result
-            logger.debug("Synthesis result body: %s", body)
-
-            # Parse the body to get the results
-            try:
-                
-                # Ensure body is a string and parse it as JSON and log it
-                synthesis_results = json.loads(body).get('results', {})
-                logger.debug("Parsed synthesis results: %s", synthesis_results)
-
-            # Handle JSON decoding errors
-            except json.JSONDecodeError as e:
-                
-                # Log the error and return a 400 response
-                logger.error("Failed to decode JSON from synthesisResult body: %s", e)
-
-
-                # Return a response indicating invalid JSON format
-                return {
-                    'statusCode': 400,
-                    'body': json.dumps({'error': 'Invalid JSON in synthesisResult body'})
-                }
-            
-        else:
-            
-            # Log an error if synthesis_result is not a valid dictionary or missing body
-            logger.error("Invalid synthesisResult format.")
+            # Log the error and return a failure response
+            logger.error("Synthesis failed: %s", synthesis_result.get('error'))
+
+            # Return a response indicating the failure
+            return error_result(synthesis_result.get('statusCode', 500), synthesis_result.get('error', 'Synthesis failed'),
+                                synthesis_result.get('message'))
 
-            # Return a response indicating invalid synthesisResult format
-            return {
-                'statusCode': 400,
-                'body': json.dumps({'error': 'Invalid synthesisResult format'})
-            }
+        # Load the audio keys, which may have been stored in S3
+        synthesis_results = load_payload(s3, synthesis_result.get('audio_keys', {}))
 
-        # Initialize a dictionary to hold audio file statuses
-        audio_statuses = {}
+        # Initialize a dictionary to hold the audio key of each language
+        audio_keys = {}
 
-        # Check the existence of each audio file in S3
+        # Find the audio key of each language
         for language, audio_key in synthesis_results.items():
 
             # Log the language and audio key being processed
@@ -111,69 +95,72 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             # Log the original audio key
             logger.debug("Original audio key: %s", audio_key)
 
-            # Ensure audio_key is a valid S3 key
-            if audio_key.startswith("s3://"):
+            # Ensure audio_key is a valid S3 key, not an S3 URI
+            audio_key = to_object_key(audio_key)
 
-                # Remove the "s3://" prefix and get the actual key after the bucket name & log it
-                audio_key = audio_key[5:]
-                audio_key = audio_key.split('/', 1)[1]
-                logger.info("Checking existence of audio file: %s", audio_key)
+            # Log the audio key being checked and queue it
+            logger.info("Checking existence of audio file: %s", audio_key)
+            audio_keys[language] = audio_key
 
-            # If audio_key is not a valid S3 key, log an error and skip
-            try:
+        # Check all audio files at once
+        key_statuses = check_objects_exist(s3, bucket, list(audio_keys.values()))
 
-                # Check if the audio file exists in the specified S3 bucket & log it
-                response = s3.head_object(Bucket=bucket, Key=audio_key)
-                logger.debug("S3 head_object response: %s", response)
+        # Map the status of each audio file back to its language
+        audio_statuses = {language: key_statuses[audio_key] for language, audio_key in audio_keys.items()}
 
-                # If the file exists, update the audio_statuses dictionary
-                audio_statuses[language] = 'EXISTS'
+        # Log the languages whose audio file is missing
+        for language, audio_status in audio_statuses.items():
+            if audio_status == NOT_FOUND:
+                logger.warning("Audio file not found: %s", audio_keys[language])
 
-                # Log the successful existence check
-                logger.info("Audio file exists: %s", audio_key)
+        # Work out the check attempt number from the previous status check, if any
+        previous_status = event.get('synthesisStatus') or {}
+        check_attempt = previous_status.get('check_attempt', 0) + 1
+        max_checks = int(os.environ.get('SYNTHESIS_MAX_CHECKS', DEFAULT_MAX_CHECKS))
 
-            # Handle ClientError exceptions
-            except ClientError as e:
-
-                # Log the error and check if it's a 404 Not Found error
-                if e.response['Error']['Code'] == '404':
-
-                    # If the audio file does not exist, update the status
-                    audio_statuses[language] = 'NOT_FOUND'
-
-                    # Log the absence of the audio file
-                    logger.warning("Audio file not found: %s", audio_key)
-
-                else:
+        # Determine the overall status across all languages
+        if audio_statuses and all(audio_status == EXISTS for audio_status in audio_statuses.values()):
+            status = COMPLETED
+        elif not audio_statuses or any(audio_status.startswith('ERROR') for audio_status in audio_statuses.values()):
+            status = FAILED
+        elif check_attempt >= max_checks:
+            status = FAILED
+        else:
+            status = IN_PROGRESS
 
-                    # If it's another error, log it and update the status
-                    audio_statuses[language] = f'ERROR: {str(e)}'
+        # Get the seconds to wait before the next status check
+        schedule = get_poll_schedule('STATUS_CHECK_SCHEDULE', DEFAULT_STATUS_CHECK_SCHEDULE)
+        next_wait_seconds = get_adaptive_wait_seconds(check_attempt - 1, schedule=schedule)
 
-                    # Log the error encountered while checking the audio file
-                    logger.error("Error checking audio file: %s, Error: %s", audio_key, e)
+        # Log the overall status
+        logger.info("Overall synthesis status: %s (check %d of %d)", status, check_attempt, max_checks)
 
-        # Prepare the synthesis status result as a simple dictionary
+        # Prepare the flat synthesis status result, storing the statuses in S3 if too large
         synthesis_status_result = {
             'statusCode': 200,
-            'audio_statuses': audio_statuses
+            'status': status,
+            'audio_statuses': store_payload(s3, bucket, 'audio-statuses', audio_statuses),
+            'check_attempt': check_attempt,
+            'next_wait_seconds': next_wait_seconds
         }
 
         # Log audio file existence checks completion
         logger.info("Audio file existence checks completed.")
 
         # Log the synthesis status result before returning
-        logger.debug("Synthesis status result before return: %s", json.dumps(synthesis_status_result))
+        logger.debug("Synthesis status result before return: %s", LazyJson(synthesis_status_result))
 
-        # Return the synthesis status result directly, ensuring it's a flat structure
-        output = {
-            'synthesisComplete': synthesis_status_result
-        }
+        # Return the synthesis status result
+        return synthesis_status_result
+
+    # Handle ClientError exceptions
+    except ClientError as e:
 
-        # Log the final output before returning
-        logger.debug("Final output before returning: %s", json.dumps(output))
+        # Log the error and return a structured error response
+        logger.error("Error checking audio files: %s", e)
 
-        # Return the output with audio file statuses
-        return output
+        # Return an error response if the audio keys could not be loaded or stored
+        return error_result(500, 'S3 ClientError', str(e))
 
     # Handle the finalization of the function
     finally:
@@ -1,35 +1,48 @@
-import boto3
-import json
 from botocore.exceptions import ClientError
-from typing import Dict, Any, Optional
-from helpers.logger import set_log_level, logger
-
-# Initialize Boto3 clients
-transcribe = boto3.client('transcribe')
+from typing import Dict, Any
+from datetime import datetime, timezone
+from helpers.logger import DEFAULT_LOG_LEVEL, LazyJson, set_log_level, logger
+from helpers.backoff import estimate_transcription_seconds, get_adaptive_wait_seconds
+from helpers.clients import LazyClient
+from helpers.metrics import instrumented
+from helpers.results import COMPLETED, FAILED, TranscriptionStatus, error_result
+from helpers.s3_uri import S3Location
+from helpers.transcript import finalize_transcript
+
+# Initialize Boto3 clients, created on first use
+s3 = LazyClient('s3')
+transcribe = LazyClient('transcribe')
 
 # Function to handle the AWS Lambda invocation and check transcription job status
-def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Optional[str]]:
+@instrumented('status_transcription')
+def lambda_handler(event: Dict[str, Any], context: Any) -> TranscriptionStatus:
 
     """Check the status of transcription jobs in AWS Transcribe.
 
+    Once the job has completed, the Amazon Transcribe JSON output is replaced with the transcribed text
+    and added to the transcript cache. Transcripts served from the cache are reported as completed
+    without looking up a transcription job.
+    While the job is still running, the response carries the seconds to wait before the next check,
+    aimed at the completion expected from the audio duration and backing off with jitter after that.
+
     Args:
         event (Dict[str, Any]): The input event containing transcription result information.
         context (Any): The context object provided by AWS Lambda.
 
     Returns:
-        Dict[str, Optional[str]]: A response dict containing job status and transcript URI if completed.
+        TranscriptionStatus: The flat result with the job status, and the transcript key and URI if completed.
     """
 
-    # Set log level from the event, default to DEBUG if not specified
+    # Set log level from the event, default to the LOG_LEVEL environment variable (DEBUG if unset)
     # Expecting logLevel to be one of 'DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'
-    log_level = event.get('logLevel', 'DEBUG')
+    log_level = event.get('logLevel', DEFAULT_LOG_LEVEL)
     set_log_level(log_level)
 
     # Log the invocation of the Lambda function
     logger.info("Check Transcription Status function invoked")
 
     # Log the received event
-    logger.info("Received event: %s", json.dumps(event))
+    logger.info("Received event: %s", LazyJson(event))
 
     # Extract job name from transcriptionResult
     transcription_result = event.get('transcriptionResult', {})
@@ -42,23 +55,50 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Optional[st
         logger.error("No job name provided in the event.")
 
         # Return a response indicating failure
-        return {'status': 'FAILED', 'message': 'Job name is required.'}
-
-    # Check the body for errors
-    body = json.loads(transcription_result.get('body', '{}'))
+        return error_result(400, 'Job name is required.')
 
-    # Check if the body contains an error
-    if 'error' in body:
+    # Check if the transcription result reports an error
+    if transcription_result.get('status') == FAILED:
 
         # Log the error and return a failure response
-        logger.error("Error in transcription result: %s", body['error'])
+        logger.error("Error in transcription result: %s", transcription_result.get('error'))
 
         # Return a response indicating failure
-        return {'status': 'FAILED', 'message': body['message']}
+        return error_result(500, transcription_result.get('error', 'Transcription failed'), transcription_result.get('message'),
+                            job_name=job_name)
+
+    # Extract the bucket and key from the event
+    bucket = event.get('bucket')
+    key = event.get('key')
+
+    # If key is provided, extract the original filename from it
+    original_filename = key.split('/')[-1] if key else None
+
+    # Extract the transcript key recorded when the job was submitted
+    transcript_key = transcription_result.get('transcript_key')
 
     # Try to check the transcription job status
     try:
 
+        # Report transcripts served from the cache as completed right away
+        if transcription_result.get('cached'):
+
+            # Log the cached transcript
+            logger.info("Transcript served from cache: s3://%s/%s", bucket, transcript_key)
+
+            # Return the response in the same shape as a completed job
+            return {
+                'statusCode': 200,
+                'status': COMPLETED,
+                'transcript_key': transcript_key,
+                'transcript_uri': S3Location(bucket, transcript_key).url(s3.meta.region_name),
+                'bucket': bucket,
+                'original_filename': original_filename,
+                'job_name': job_name,
+                'poll_attempt': 0,
+                'next_wait_seconds': 0
+            }
+
         # Log the start of the transcription job status check
         logger.info("Checking status of transcription job: %s", job_name)
 
@@ -74,23 +114,40 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Optional[st
         # Prepare the response
         transcript_uri = response['TranscriptionJob']['Transcript']['TranscriptFileUri'] if job_status == 'COMPLETED' else None
 
-        # Extract the bucket and key from the event
-        bucket = event.get('bucket')
-        key = event.get('key')
+        # Save the transcribed text once the job has completed
+        if job_status == 'COMPLETED' and bucket and transcript_key:
+
+            # Replace the JSON output with the transcribed text and add it to the transcript cache
+            finalize_transcript(s3, bucket, transcript_key, transcription_result.get('cache_key'))
+
+        # Work out the poll attempt number from the previous status check, if any
+        previous_result = event.get('statusTranscriptionResult') or {}
+        poll_attempt = previous_result.get('poll_attempt', 0) + 1
+
+        # Work out how long the job has been running
+        start_time = response['TranscriptionJob'].get('StartTime') or response['TranscriptionJob'].get('CreationTime')
+        elapsed_seconds = (datetime.now(timezone.utc) - start_time).total_seconds() if isinstance(start_time, datetime) else None
 
-        # If key is provided, extract the original filename from it
-        original_filename = key.split('/')[-1] if key else None
+        # Get the seconds to wait before the next status check & log it
+        expected_seconds = estimate_transcription_seconds(transcription_result.get('media_seconds'))
+        next_wait_seconds = get_adaptive_wait_seconds(poll_attempt, elapsed_seconds, expected_seconds)
+        logger.debug("Poll attempt: %s, elapsed seconds: %s, expected seconds: %s, next wait seconds: %s",
+                     poll_attempt, elapsed_seconds, expected_seconds, next_wait_seconds)
 
         # Log the prepared response details
         logger.debug("Preparing response with job status: %s, transcript URI: %s", job_status, transcript_uri)
 
         # Return the response with job status and transcript URI
         return {
+            'statusCode': 200,
             'status': job_status,
+            'transcript_key': transcript_key if job_status == COMPLETED else None,
             'transcript_uri': transcript_uri,
             'bucket': bucket,
             'original_filename': original_filename,
-            'job_name': job_name
+            'job_name': job_name,
+            'poll_attempt': poll_attempt,
+            'next_wait_seconds': next_wait_seconds
         }
 
     # Handle ClientError exceptions
@@ -100,7 +157,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Optional[st
         logger.error("Error checking transcription job: %s", e)
 
         # Return an error response if the transcription job is not found or another error occurs
-        return {'status': 'FAILED', 'message': 'An error occurred while checking the transcription job.'}
+        return error_result(500, 'An error occurred while checking the transcription job.', str(e), job_name=job_name)
 
     # Handle unexpected exceptions
     except Exception as e:
@@ -109,7 +166,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Optional[st
         logger.error("Unexpected error: %s", e)
 
         # Return an error response for unexpected errors
-        return {'status': 'FAILED', 'message': 'An unexpected error occurred.'}
+        return error_result(500, 'An unexpected error occurred.', str(e), job_name=job_name)
 
     # Handle the finalization of the function
     finally:
@@ -1,173 +1,136 @@
-import boto3
-import json
+import os
 from botocore.exceptions import ClientError
 from typing import Dict, Any
-from helpers.logger import set_log_level, logger
+from helpers.logger import DEFAULT_LOG_LEVEL, LazyJson, set_log_level, logger
+from helpers.backoff import DEFAULT_STATUS_CHECK_SCHEDULE, get_adaptive_wait_seconds, get_poll_schedule
+from helpers.clients import LazyClient
+from helpers.metrics import instrumented
+from helpers.results import COMPLETED, FAILED, IN_PROGRESS, TranslationStatus, error_result, load_payload, store_payload
+from helpers.s3_exists import EXISTS, NOT_FOUND, check_objects_exist
+from helpers.s3_uri import to_object_key
 
-# Initialize Boto3 clients
-s3 = boto3.client('s3')
+# Initialize Boto3 clients, created on first use
+s3 = LazyClient('s3')
+
+# Default number of status checks after which missing translation files are reported as failed
+DEFAULT_MAX_CHECKS = 5
 
 # Function to handle the AWS Lambda invocation and check translation status in S3
-def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+@instrumented('status_translation')
+def lambda_handler(event: Dict[str, Any], context: Any) -> TranslationStatus:
 
     """Check the status of translations in S3.
 
+    The event is the result of the translate function. The status is COMPLETED once the translation
+    of every language that did not fail exists, IN_PROGRESS while some are missing, and FAILED when
+    no translation succeeded, on an error, or after TRANSLATION_MAX_CHECKS checks. While in progress,
+    the result carries the seconds to wait before the next check, backing off with jitter.
+
     Args:
-        event (Dict[str, Any]): The input event containing results and bucket information.
+        event (Dict[str, Any]): The result of the translate function.
         context (Any): The context object provided by AWS Lambda.
 
     Returns:
-        Dict[str, Any]: A response dict containing status code and translation statuses.
+        TranslationStatus: The flat result with the overall status and the status of each language.
     """
 
-    # Set log level from the event, default to DEBUG if not specified
+    # Set log level from the event, default to the LOG_LEVEL environment variable (DEBUG if unset)
     # Expecting logLevel to be one of 'DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'
-    log_level = event.get('logLevel', 'DEBUG')
+    log_level = event.get('logLevel', DEFAULT_LOG_LEVEL)
     set_log_level(log_level)
 
     # Log the invocation of the Lambda function
     logger.info("Check Translation Status function invoked")
 
     # Log the received event
-    logger.info("Received event: %s", json.dumps(event))
+    logger.info("Received event: %s", LazyJson(event))
 
     # Extract data from the event
     bucket = event.get('bucket')
+    original_filename = event.get('original_filename')
 
-    # Initialize target languages from the event or use an empty list
-    target_languages = event.get('target_languages', [])
-
-    # Extract original filename and results from the event body
-    body = event.get('body', '{}')
-
-    # Try to parse the body as JSON
-    try:
-
-        # Parse the body to extract original filename and results
-        body = json.loads(body)
-        original_filename = body.get('original_filename')
-        results = body.get('results', {})
+    # Check if the translate function failed
+    if event.get('status') == FAILED:
 
-        # If target_languages are provided in the body, update the list
-        if 'target_languages' in body:
-            target_languages = body.get('target_languages', target_languages)
+        # Log the error and return a failure response
+        logger.error("Translation failed: %s", event.get('error', 'no translation succeeded'))
 
-    # Handle JSON decoding errors
-    except json.JSONDecodeError as e:
-        # Log the error and return a 400 response
-        logger.error("Error decoding JSON from body: %s", e)
-
-        # Return a response indicating invalid body format
-        return {
-            'statusCode': 400,
-            'body': json.dumps({'error': 'Invalid body format.'})
-        }
+        # Return a response indicating the failure
+        return error_result(event.get('statusCode', 500), event.get('error', 'Translation failed'), event.get('message'),
+                            bucket=bucket, original_filename=original_filename)
 
     # Check for required parameters
-    if not bucket or not original_filename or not target_languages:
+    if not bucket or not original_filename:
 
         # Log an error and return a 400 response
         logger.error("Missing required parameters in the event.")
 
         # Return a response indicating missing parameters
-        return {
-            'statusCode': 400,
-            'body': json.dumps({'error': 'Bucket, original filename, and target languages are required.'})
-        }
-
-    # Initialize a flag to track if all translations exist
-    all_translations_exist = True
-
-    # Initialize a dictionary to hold translation results
-    translation_results = {}
+        return error_result(400, 'Bucket and original filename are required.')
 
     # Try to check the existence of translation files in S3
     try:
 
-        # Loop through each target language to check for translation files
-        for target_language in target_languages:
-
-            # Get the expected translation file URL from the results
-            translation_file_url = results.get(target_language)
-
-            # If the translation file URL is provided, check its existence
-            if translation_file_url:
+        # Load the translation URIs and errors, which may have been stored in S3
+        translations: Dict[str, str] = load_payload(s3, event.get('translations', {}))
+        errors: Dict[str, str] = load_payload(s3, event.get('errors', {}))
 
-                # Log the translation file URL being checked
-                translation_key = translation_file_url.replace(f"s3://{bucket}/", "")
-                logger.info("Checking for translation file: %s", translation_key)
+        # Log the languages whose translation failed; they are left out of the check
+        for target_language, error in errors.items():
+            logger.warning("Skipping failed translation for %s: %s", target_language, error)
 
-                # Try to check if the translation file exists in S3
-                try:
+        # Map each target language to the translation key to check
+        translation_keys: Dict[str, str] = {}
+        for target_language, translation_uri in translations.items():
 
-                    # Attempt to head the object to check its existence
-                    s3.head_object(Bucket=bucket, Key=translation_key)
+            # Log the translation file being checked
+            translation_key = to_object_key(translation_uri)
+            logger.info("Checking for translation file: %s", translation_key)
+            translation_keys[target_language] = translation_key
 
-                    # If successful, mark the translation as existing
-                    translation_results[target_language] = f'Translation exists for {target_language}.'
+        # Check all translation files at once
+        key_statuses = check_objects_exist(s3, bucket, list(translation_keys.values()))
 
-                    # Log the successful existence check
-                    logger.info("Translation file found for %s: %s", target_language, translation_file_url)
+        # Map the status of each translation file back to its language
+        translation_statuses = {target_language: key_statuses[translation_key]
+                                for target_language, translation_key in translation_keys.items()}
 
-                # Handle ClientError exceptions
-                except ClientError as e:
+        # Log the languages whose translation file is missing
+        for target_language, translation_status in translation_statuses.items():
+            if translation_status == NOT_FOUND:
+                logger.warning("Translation file not found for %s: %s", target_language, translation_keys[target_language])
 
-                    # If the error is a 404, the translation file does not exist
-                    if e.response['Error']['Code'] == '404':
-
-                        # Store the result indicating the translation does not exist
-                        translation_results[target_language] = f'Translation not found for {target_language}.'
-
-                        # Mark as not existing if a 404 error occurs
-                        all_translations_exist = False
-
-                        # Log the warning for missing translation file
-                        logger.warning("Translation file not found for %s: %s", target_language, translation_key)
-
-                    else:
-
-                        # Log the error for other types of ClientError
-                        logger.error("Error checking translation file: %s", e)
-
-                        # Store the error message in the results
-                        translation_results[target_language] = f'Error checking status for {target_language}.'
-
-                        # Mark as not existing if an error occurs
-                        all_translations_exist = False
-
-            else:
-
-                # If no translation file URL is provided, store a message indicating it
-                translation_results[target_language] = f'Translation not found for {target_language}.'
-
-                # Mark as not existing if no URL is provided
-                all_translations_exist = False
-
-                # Log the warning for missing translation file URL
-                logger.warning("No translation file URL provided for %s.", target_language)
+        # Work out the check attempt number from the previous status check, if any
+        previous_status = event.get('statusTranslationResult') or {}
+        check_attempt = previous_status.get('check_attempt', 0) + 1
+        max_checks = int(os.environ.get('TRANSLATION_MAX_CHECKS', DEFAULT_MAX_CHECKS))
 
         # Determine the overall status
-        status = "COMPLETED" if all_translations_exist else "IN_PROGRESS"
-        status_code = 200
+        if translation_statuses and all(translation_status == EXISTS for translation_status in translation_statuses.values()):
+            status = COMPLETED
+        elif not translation_statuses or any(translation_status.startswith('ERROR') for translation_status in translation_statuses.values()):
+            status = FAILED
+        elif check_attempt >= max_checks:
+            status = FAILED
+        else:
+            status = IN_PROGRESS
+
+        # Get the seconds to wait before the next status check
+        schedule = get_poll_schedule('STATUS_CHECK_SCHEDULE', DEFAULT_STATUS_CHECK_SCHEDULE)
+        next_wait_seconds = get_adaptive_wait_seconds(check_attempt - 1, schedule=schedule)
 
         # Log the overall status of the translation check
-        logger.info("Translation status check completed. Overall status: %s", status)
+        logger.info("Translation status check completed. Overall status: %s (check %d of %d)", status, check_attempt, max_checks)
 
-        # Return the response with the status code, bucket, key, target languages, and results
+        # Return the status and the status of each language, stored in S3 if too large
         return {
-            'statusCode': status_code,
+            'statusCode': 200,
+            'status': status,
             'bucket': bucket,
-            'key': f'audio_inputs/{original_filename}',
-            'target_languages': target_languages,
-            'body': json.dumps({
-                'results': translation_results,
-                'original_filename': original_filename
-            }),
-            'statusTranslationResult': {
-                'statusCode': status_code,
-                'body': json.dumps({'status': status})
-            },
-            'status': status
+            'original_filename': original_filename,
+            'translation_statuses': store_payload(s3, bucket, 'translation-statuses', translation_statuses),
+            'check_attempt': check_attempt,
+            'next_wait_seconds': next_wait_seconds
         }
 
     # Handle ClientError exceptions
@@ -177,10 +140,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         logger.error("Error checking translation status: %s", e)
 
         # Return an error response if the S3 ClientError occurs
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': str(e)})
-        }
+        return error_result(500, 'S3 ClientError', str(e), bucket=bucket, original_filename=original_filename)
 
     # Handle unexpected exceptions
     except Exception as e:
@@ -189,10 +149,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         logger.error("An unexpected error occurred: %s", e)
 
         # Return an error response for unexpected errors
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': 'An unexpected error occurred.'})
-        }
+        return error_result(500, 'An unexpected error occurred.', str(e), bucket=bucket, original_filename=original_filename)
 
     # Handle the finalization of the function
     finally:
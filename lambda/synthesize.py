@@ -1,71 +1,210 @@
-import boto3
-import json
+import os
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
-from typing import Dict, Any
-from datetime import datetime
-from helpers.logger import set_log_level, logger
+from typing import Dict, Any, Iterator, List, Optional, Union
+from helpers.logger import DEFAULT_LOG_LEVEL, LazyJson, set_log_level, logger
+from helpers.cache import LRUIndex, get_object_cache, make_cache_key
+from helpers.clients import LazyClient
+from helpers.concurrency import in_current_context, ordered_map
+from helpers.languages import get_voice
+from helpers.metrics import get_metrics, instrumented, timed
+from helpers.output_keys import AUDIO_FORMAT, get_audio_key, get_base_name, get_synthesis_output_id
+from helpers.results import COMPLETED, FAILED, BatchResult, SynthesisResult, batch_result, error_result, load_payload, store_payload
+from helpers.s3_exists import EXISTS, head_object_status
+from helpers.s3_stream import upload_stream
+from helpers.s3_uri import parse_s3_uri
+from helpers.text_chunker import chunk_text
 
-# Initialize Boto3 clients
-s3 = boto3.client('s3')
-polly = boto3.client('polly')
+# Initialize Boto3 clients, created on first use
+s3 = LazyClient('s3')
+polly = LazyClient('polly')
 
-# Map of target languages to their respective Polly voices
-language_voice_map = {
-    "es": "Lucia",  # Spanish
-    "fr": "Celine",  # French
-    "de": "Marlene"  # German
-}
+# Default maximum number of languages synthesized concurrently
+DEFAULT_MAX_WORKERS = 3
 
-# Function to handle the AWS Lambda invocation and synthesize speech from translated texts
-def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+# Default maximum number of chunks synthesized concurrently for each language
+DEFAULT_CHUNK_MAX_WORKERS = 4
+
+# Default maximum number of items of a batch synthesized concurrently
+DEFAULT_BATCH_MAX_WORKERS = 2
+
+# Maximum number of billed characters in a single SynthesizeSpeech request
+MAX_POLLY_CHARACTERS = 3000
+
+# Polly output format used for every synthesis
+OUTPUT_FORMAT = AUDIO_FORMAT
 
-    """AWS Lambda function to synthesize speech from translated texts.
+# In-memory index of known cached audio, kept across warm invocations
+audio_cache_index = LRUIndex(int(os.environ.get('AUDIO_CACHE_INDEX_SIZE', 1024)))
+
+# Function to load the translated text, following S3 URIs produced by the translate function
+@timed('load_translation')
+def load_translated_text(bucket: str, translation: str) -> str:
+
+    """Load the translated text for a language.
 
     Args:
-        event (Dict[str, Any]): The input event containing bucket and original filename.
-        context (Any): The context object provided by AWS Lambda.
+        bucket (str): The bucket holding the translations.
+        translation (str): The translated text, or the S3 URI of the translation.
 
     Returns:
-        Dict[str, Any]: A response dict containing status code and results.
+        str: The translated text.
     """
 
-    # Set log level from the event, default to DEBUG if not specified
-    # Expecting logLevel to be one of 'DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'
-    log_level = event.get('logLevel', 'DEBUG')
-    set_log_level(log_level)
+    # Return the text as is unless it points to a translation in S3
+    if not translation.startswith('s3://'):
+        return translation
 
-    # Log the invocation of the Lambda function
-    logger.info("Synthesize function invoked")
+    # Get the key after the bucket name
+    translation_key = parse_s3_uri(translation).key
 
-    # Log the received event
-    logger.info("Received event: %s", json.dumps(event))
+    # Retrieve the translated text from S3
+    translation_object = s3.get_object(Bucket=bucket, Key=translation_key)
+    return translation_object['Body'].read().decode('utf-8')
 
-    # Extract bucket from the event
-    bucket: str = event.get('bucket')
+# Function to synthesize text chunks with Amazon Polly, in order
+def synthesize_chunks(chunks: List[str], voice_id: str, engine: str) -> Iterator[bytes]:
 
-    # Extract original_filename from the body
-    original_filename: str = None
+    """Synthesize text chunks concurrently and yield the MP3 audio of each chunk in order.
 
-    # Try to parse the body from the event
-    try:
+    Args:
+        chunks (List[str]): The text chunks to synthesize.
+        voice_id (str): The Polly voice to use.
+        engine (str): The Polly engine to use.
+
+    Returns:
+        Iterator[bytes]: The MP3 audio of each chunk, in order.
+    """
+
+    # Get the maximum number of concurrent chunk syntheses from the environment
+    max_workers = max(1, int(os.environ.get('SYNTHESIZE_CHUNK_MAX_WORKERS', DEFAULT_CHUNK_MAX_WORKERS)))
+
+    # Synthesize a single chunk using Amazon Polly
+    def synthesize_chunk(chunk: str) -> bytes:
+        response = polly.synthesize_speech(
+            Text=chunk,
+            OutputFormat=OUTPUT_FORMAT,
+            VoiceId=voice_id,
+            Engine=engine
+        )
+        audio = response['AudioStream'].read()
+        metrics = get_metrics()
+        metrics.add_count('polly_characters', len(chunk))
+        metrics.add_bytes('polly_audio', len(audio))
+        return audio
+
+    # Yield the audio of each chunk as soon as it and all chunks before it are done
+    yield from ordered_map(synthesize_chunk, chunks, max_workers)
+
+# Function to synthesize speech for one language and stream the audio to S3
+@timed('synthesize_language')
+def synthesize_language(bucket: str, translation: str, voice: Dict[str, str], audio_key: str, cache: Optional[Any] = None) -> str:
+
+    """Synthesize speech for a single language and stream the MP3 audio to S3.
+
+    MP3 frames can be concatenated, so the audio of each chunk is appended to one multipart
+    upload as it is produced and memory stays flat regardless of the length of the output.
+    When a cache is given, audio previously rendered from the same text, voice, format, and
+    engine is copied server-side instead of calling Polly again. Audio an earlier attempt already
+    saved to the audio key is kept as it is, without reading the translation.
 
-        # Ensure body is a string and parse it
-        body = json.loads(event.get('body', '{}'))
+    Args:
+        bucket (str): The bucket holding the translations and the audio outputs.
+        translation (str): The translated text, or the S3 URI of the translation.
+        voice (Dict[str, str]): The Polly 'voice_id' and 'engine' to use.
+        audio_key (str): The key to save the audio to.
+        cache (Optional[Any]): The audio cache, or None to always synthesize.
+
+    Returns:
+        str: The audio key.
 
-        # Extract original filename from the body
-        original_filename = body.get('original_filename')
+    Raises:
+        ValueError: If the translation is empty or whitespace only.
+    """
 
-    # Handle JSON decoding errors
-    except json.JSONDecodeError as e:
+    # Keep the audio an earlier attempt saved
+    if head_object_status(s3, bucket, audio_key) == EXISTS:
+        logger.info("Audio already saved, skipping synthesis: s3://%s/%s", bucket, audio_key)
+        return audio_key
 
-        # Log the error and return a 400 response
-        logger.error("Failed to decode JSON from body: %s", e)
+    # Load the translated text
+    translated_text = load_translated_text(bucket, translation)
 
-        # Return a response indicating invalid body format
-        return {
-            'statusCode': 400,
-            'body': json.dumps({'error': 'Invalid JSON in body'})
-        }
+    # Split the text at sentence boundaries into chunks that fit a SynthesizeSpeech request
+    chunks = chunk_text(translated_text, MAX_POLLY_CHARACTERS, measure=len)
+
+    # Fail instead of saving empty audio when the translation has no text
+    if not chunks:
+        raise ValueError(f'The translation is empty: {translation}')
+
+    # Build the cache key from the text and the synthesis parameters
+    cache_key = make_cache_key(translated_text, voice['voice_id'], OUTPUT_FORMAT, voice['engine'])
+
+    # Reuse the cached audio if there is one
+    if cache is not None and cache.contains(cache_key):
+
+        # Try to copy the cached audio to the audio key
+        try:
+
+            # Copy the cached audio server-side
+            cache.copy_to(cache_key, bucket, audio_key)
+
+            # Log the cache hit
+            logger.info("Audio cache hit, copied to: s3://%s/%s", bucket, audio_key)
+
+            # Return the audio key
+            return audio_key
+
+        # Handle ClientError exceptions
+        except ClientError as e:
+
+            # Log a warning and fall back to synthesizing the audio
+            logger.warning("Failed to copy cached audio, synthesizing instead: %s", e)
+
+    # Log the number of chunks to synthesize
+    logger.info("Synthesizing %d chunk(s) to: s3://%s/%s", len(chunks), bucket, audio_key)
+
+    # Synthesize the chunks and stream the audio into a single S3 object
+    upload_stream(s3, bucket, audio_key, synthesize_chunks(chunks, voice['voice_id'], voice['engine']), content_type='audio/mpeg')
+
+    # Add the audio to the cache
+    if cache is not None:
+
+        # Try to store the audio in the cache
+        try:
+
+            # Copy the audio into the cache
+            cache.store_from(cache_key, bucket, audio_key)
+
+        # Handle ClientError exceptions
+        except ClientError as e:
+
+            # Log a warning; a cache failure does not fail the synthesis
+            logger.warning("Failed to cache audio for s3://%s/%s: %s", bucket, audio_key, e)
+
+    # Return the audio key
+    return audio_key
+
+# Function to synthesize speech for the translations of one transcript
+@timed('synthesize_item')
+def synthesize_item(event: Dict[str, Any]) -> SynthesisResult:
+
+    """Synthesize speech from the translations of one transcript.
+
+    Languages are synthesized concurrently. Each translation is split at sentence boundaries into
+    chunks that fit a single Polly request, and the MP3 audio of the chunks is streamed into one
+    S3 object per language.
+
+    Args:
+        event (Dict[str, Any]): The result of the translate function, with the bucket, original filename, and translations.
+
+    Returns:
+        SynthesisResult: The flat result with the audio key of each language.
+    """
+
+    # Extract bucket and original filename from the event
+    bucket: str = event.get('bucket')
+    original_filename: str = event.get('original_filename')
 
     # Check if bucket is provided
     if not bucket:
@@ -74,10 +213,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         logger.error("Bucket name is missing in the event.")
 
         # Return a response indicating missing bucket name
-        return {
-            'statusCode': 400,
-            'body': json.dumps({'error': 'Bucket name is required.'})
-        }
+        return error_result(400, 'Bucket name is required.')
 
     # Check if original_filename is provided
     if not original_filename:
@@ -86,22 +222,26 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         logger.error("Original filename is missing in the event.")
 
         # Return a response indicating missing original filename
-        return {
-            'statusCode': 400,
-            'body': json.dumps({'error': 'Original filename is required.'})
-        }
+        return error_result(400, 'Original filename is required.', bucket=bucket)
+
+    # Try to load the translation URIs, which may have been stored in S3
+    try:
 
-    # Parse the body to get translated texts
-    translated_texts: Dict[str, str] = {}
+        # Load the translation of each target language
+        translated_texts: Dict[str, str] = {lang: translation or '' for lang, translation in
+                                            load_payload(s3, event.get('translations', {})).items()}
 
-    # Extract translated texts for each target language
-    for lang in ['es', 'fr', 'de']:
+    # Handle ClientError exceptions
+    except ClientError as e:
 
-        # Get the translated text for the language from the body
-        translated_texts[lang] = body.get('results', {}).get(lang, '')
+        # Log the error and return a 500 response
+        logger.error("Failed to load the translations: %s", e)
 
-    # Initialize a dictionary to hold synthesis results
-    results: Dict[str, str] = {}
+        # Return a response indicating the translations could not be loaded
+        return error_result(500, 'Failed to load the translations', str(e), bucket=bucket, original_filename=original_filename)
+
+    # Initialize a dictionary to hold the audio key of each language
+    audio_keys: Dict[str, str] = {}
 
     # Check if any translated texts are provided
     if not any(translated_texts.values()):
@@ -110,19 +250,15 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         logger.error("No translated texts provided for synthesis.")
 
         # Return a response indicating no translations available
-        return {
-            'statusCode': 400,
-            'body': json.dumps({'error': 'No translations available'})
-        }
+        return error_result(400, 'No translations available', bucket=bucket, original_filename=original_filename)
 
     # Try to synthesize speech for each target language
     try:
 
-        # Get the current timestamp for file naming & log it
-        current_time = datetime.now().strftime('%Y%m%d_%H%M%S.%f')[:-3]
-        logger.info("Current timestamp for file naming: %s", current_time)
+        # Initialize a dictionary to hold the languages to synthesize and their voices
+        voices: Dict[str, Dict[str, str]] = {}
 
-        # Loop through each target language and synthesize speech
+        # Loop through each target language and pick its voice
         for target_language, translated_text in translated_texts.items():
 
             # Log the target language being processed
@@ -134,73 +270,91 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 # Skip to the next language if no text is available
                 continue
 
-            # Log the synthesis process for the target language
-            logger.info("Synthesizing speech for language: %s", target_language)
-
-            # Get the corresponding voice ID for the target language
-            voice_id = language_voice_map.get(target_language)
+            # Get the corresponding voice and engine for the target language
+            voice = get_voice(target_language)
 
             # Check if a voice is available for the target language
-            if not voice_id:
+            if not voice:
 
                 # Log an error if no voice is available for the language
                 logger.error("No voice available for language: %s", target_language)
 
                 # Return a response indicating no voice available
-                return {
-                    'statusCode': 400,
-                    'body': json.dumps({'error': f'No voice available for language: {target_language}'})
-                }
-
-            # Log the voice ID being used
-            audio_key: str = f'audio_outputs/{original_filename.split(".")[0]}_{target_language}-{current_time}.mp3'
-            logger.info("Generated audio key: %s", audio_key)
-
-            # Try to synthesize speech using Amazon Polly
-            try:
-
-                # Call the Polly synthesize_speech API
-                response = polly.synthesize_speech(
-                    Text=translated_text,
-                    OutputFormat='mp3',
-                    VoiceId=voice_id
+                return error_result(400, f'No voice available for language: {target_language}', bucket=bucket,
+                                    original_filename=original_filename)
+
+            # Store the voice for the target language
+            voices[target_language] = voice
+
+        # Get the maximum number of concurrent language syntheses from the environment
+        max_workers = max(1, int(os.environ.get('SYNTHESIZE_MAX_WORKERS', DEFAULT_MAX_WORKERS)))
+
+        # Build the audio cache configured for this function
+        cache = get_object_cache(s3, bucket, 'audio', prefix='cache/audio/', index=audio_cache_index)
+
+        # Synthesize speech for each target language concurrently
+        with ThreadPoolExecutor(max_workers=min(max_workers, max(len(voices), 1))) as executor:
+
+            # Submit the synthesis of each target language
+            futures = {}
+            for target_language, voice in voices.items():
+
+                # Log the synthesis process for the target language
+                logger.info("Synthesizing speech for language: %s", target_language)
+
+                # Derive the audio key from the translation and the synthesis parameters & log it
+                output_id = get_synthesis_output_id(translated_texts[target_language], voice)
+                audio_key: str = get_audio_key(get_base_name(original_filename), target_language, output_id)
+                logger.info("Generated audio key: %s", audio_key)
+
+                # Submit the synthesis for the target language
+                futures[target_language] = executor.submit(
+                    in_current_context(synthesize_language), bucket, translated_texts[target_language], voice, audio_key, cache
                 )
 
-                # Log the successful synthesis response
-                logger.info("Synthesis response received for language: %s", target_language)
+            # Collect the result of each target language
+            for target_language, future in futures.items():
+
+                # Try to get the synthesis result
+                try:
+
+                    # Store the audio key for future reference
+                    audio_keys[target_language] = future.result()
+
+                    # Log the successful storage of synthesized speech
+                    logger.info("Synthesized speech saved to: s3://%s/%s", bucket, audio_keys[target_language])
 
-                # Save the audio to S3
-                s3.put_object(Bucket=bucket, Key=audio_key, Body=response['AudioStream'].read())
+                # Handle ClientError exceptions
+                except ClientError as e:
 
-                # Log the successful storage of synthesized speech
-                logger.info("Synthesized speech saved to: s3://%s/%s", bucket, audio_key)
+                    # Log the error and return a 500 response
+                    logger.error("Client error while synthesizing speech for %s: %s", target_language, e)
 
-                # Store the audio key for future reference
-                results[target_language] = audio_key
+                    # Return a response indicating client error
+                    return error_result(500, f'Client error occurred while synthesizing for {target_language}', str(e),
+                                        bucket=bucket, original_filename=original_filename)
 
-            # Handle ClientError exceptions
-            except ClientError as e:
+                # Handle ValueError exceptions
+                except ValueError as e:
 
-                # Log the error and return a 500 response
-                logger.error("Client error while synthesizing speech for %s: %s", target_language, e)
+                    # Log the error and return a 400 response
+                    logger.error("Nothing to synthesize for %s: %s", target_language, e)
 
-                # Return a response indicating client error
-                return {
-                    'statusCode': 500,
-                    'body': json.dumps({'error': f'Client error occurred while synthesizing for {target_language}'})
-                }
+                    # Return a response indicating the empty translation
+                    return error_result(400, f'Nothing to synthesize for {target_language}', str(e),
+                                        bucket=bucket, original_filename=original_filename)
 
         # Log the successful completion of all syntheses
         logger.info("All syntheses completed successfully.")
 
-        # Return the response with the synthesis results
+        # Return the response with the audio keys, stored in S3 if too large
         return {
             'statusCode': 200,
-            'body': json.dumps({
-                'results': results,
-                'original_filename': original_filename,
-                'bucket': bucket
-            })
+            'status': COMPLETED,
+            'bucket': bucket,
+            'original_filename': original_filename,
+            'audio_keys': store_payload(s3, bucket, 'audio-keys', audio_keys),
+            'cache': cache.stats.to_dict() if cache is not None else {'hits': 0, 'misses': 0}
         }
 
     # Handle unexpected exceptions
@@ -210,13 +364,58 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         logger.error("An unexpected error occurred in synthesis: %s", e)
 
         # Return a structured error response
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': 'An unexpected error occurred'})
-        }
+        return error_result(500, 'An unexpected error occurred', str(e), bucket=bucket, original_filename=original_filename)
 
     # Handle the finalization of the function
     finally:
 
         # Log the completion of the synthesis process
         logger.debug("Finished processing synthesis for original filename: %s", original_filename)
+
+# Function to handle the AWS Lambda invocation and synthesize speech from translated texts
+@instrumented('synthesize')
+def lambda_handler(event: Dict[str, Any], context: Any) -> Union[SynthesisResult, BatchResult]:
+
+    """AWS Lambda function to synthesize speech from translated texts, or from a batch of them.
+
+    The translations of a single transcript are synthesized as synthesize_item describes. An event
+    with 'items', the batch result of the translate function, synthesizes every item of a batch
+    execution in one invocation: up to SYNTHESIZE_BATCH_MAX_WORKERS items are synthesized at once
+    with the shared clients, and items whose translation failed are passed through as failed.
+
+    Args:
+        event (Dict[str, Any]): The result of the translate function, with the bucket, original filename, and translations.
+        context (Any): The context object provided by AWS Lambda.
+
+    Returns:
+        Union[SynthesisResult, BatchResult]: The result of the translations, or the result of each item of the batch.
+    """
+
+    # Set log level from the event, default to the LOG_LEVEL environment variable (DEBUG if unset)
+    # Expecting logLevel to be one of 'DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'
+    log_level = event.get('logLevel', DEFAULT_LOG_LEVEL)
+    set_log_level(log_level)
+
+    # Log the invocation of the Lambda function
+    logger.info("Synthesize function invoked")
+
+    # Log the received event
+    logger.info("Received event: %s", LazyJson(event))
+
+    # Synthesize the translations of a single transcript
+    if 'items' not in event:
+        return synthesize_item(event)
+
+    # Get the maximum number of items synthesized concurrently from the environment
+    items: List[Dict[str, Any]] = event['items']
+    max_workers = max(1, int(os.environ.get('SYNTHESIZE_BATCH_MAX_WORKERS', DEFAULT_BATCH_MAX_WORKERS)))
+    logger.info("Synthesizing a batch of %d item(s) with up to %d worker(s).", len(items), max_workers)
+
+    # Synthesize each item, passing the failed translations through
+    def synthesize_batch_item(item: Dict[str, Any]) -> Dict[str, Any]:
+        if item.get('status') == FAILED:
+            return item
+        return synthesize_item(item)
+
+    # Return the result of each item, in order
+    return batch_result(list(ordered_map(synthesize_batch_item, items, max_workers)))
@@ -1,38 +1,190 @@
-import boto3
-import json
+import os
 import time
 from botocore.exceptions import ClientError
-from typing import Dict, Any
-from datetime import datetime
-from helpers.logger import set_log_level, logger
+from typing import Dict, Any, Optional
+from helpers.logger import DEFAULT_LOG_LEVEL, LazyJson, set_log_level, logger
+from helpers.backoff import estimate_media_seconds, estimate_transcription_seconds, get_adaptive_wait_seconds, get_poll_schedule
+from helpers.cache import get_object_cache, make_cache_key
+from helpers.clients import LazyClient
+from helpers.fingerprint import get_object_fingerprint
+from helpers.media_format import UnsupportedMediaError, get_object_media_format
+from helpers.metrics import instrumented
+from helpers.output_keys import TRANSCRIPT_LANGUAGE_CODE, get_base_name, get_transcript_key, get_transcription_job_name, get_transcription_output_id
+from helpers.results import COMPLETED, FAILED, IN_PROGRESS, SUBMITTED, TranscriptionResult, error_result
+from helpers.s3_uri import S3Location
+from helpers.task_tokens import delete_task_token, save_task_token, send_task_result
+from helpers.transcript import finalize_transcript, is_transcript_saved
+
+# Initialize Boto3 clients, created on first use
+s3 = LazyClient('s3')
+transcribe = LazyClient('transcribe')
+stepfunctions = LazyClient('stepfunctions')
+
+# Safety margin (in milliseconds) kept free before the Lambda timeout when polling synchronously
+SYNC_POLL_MARGIN_MS = 5000
+
+# Function to start a transcription job unless an earlier attempt already started it
+def submit_transcription_job(job_name: str, bucket: str, key: str, media_format: str, language_code: str,
+                             transcript_key: str) -> Optional[Dict[str, Any]]:
+
+    """Start a transcription job, or pick up the job an earlier attempt started under the same name.
+
+    Job names are derived from the version of the audio, so a Step Functions retry or a redelivered
+    event finds the job it started before instead of paying for another one. A job that failed is
+    deleted and started again; a queued, running or completed job is left as it is.
 
-# Initialize Boto3 clients
-s3 = boto3.client('s3')
-transcribe = boto3.client('transcribe')
+    Args:
+        job_name (str): The job name.
+        bucket (str): The bucket holding the audio, which also receives the transcript.
+        key (str): The key of the audio.
+        media_format (str): The format of the audio, e.g. 'mp3' or 'wav'.
+        language_code (str): The language of the audio.
+        transcript_key (str): The key Amazon Transcribe writes its output to.
+
+    Returns:
+        Optional[Dict[str, Any]]: The existing job, or None if a new job was started.
+    """
+
+    # Define the job parameters
+    job_parameters = {
+        'TranscriptionJobName': job_name,
+        'Media': {'MediaFileUri': S3Location(bucket, key).uri},
+        'MediaFormat': media_format,
+        'LanguageCode': language_code,
+        'OutputBucketName': bucket,
+        'OutputKey': transcript_key
+    }
+
+    # Try to start the transcription job with output specified
+    try:
+        transcribe.start_transcription_job(**job_parameters)
+        return None
+
+    # Handle ClientError exceptions
+    except ClientError as e:
+
+        # Raise anything but a job that already exists
+        if e.response['Error']['Code'] != 'ConflictException':
+            raise
+
+    # Look up the existing job & log it
+    existing_job = transcribe.get_transcription_job(TranscriptionJobName=job_name)['TranscriptionJob']
+    logger.info("Transcription job %s already exists with status: %s", job_name, existing_job['TranscriptionJobStatus'])
+
+    # Reuse the job unless it failed
+    if existing_job['TranscriptionJobStatus'] != FAILED:
+        return existing_job
+
+    # Delete the failed job and start it again
+    logger.warning("Restarting failed transcription job %s: %s", job_name, existing_job.get('FailureReason', 'Unknown error'))
+    transcribe.delete_transcription_job(TranscriptionJobName=job_name)
+    transcribe.start_transcription_job(**job_parameters)
+    return None
+
+# Function to build the result of a transcription whose transcript is saved
+def completed_result(job_name: str, bucket: str, key: str, original_filename: str, transcript_key: str,
+                     cached: bool) -> TranscriptionResult:
+
+    """Build the COMPLETED result of a transcription, whether reused, cached, or just transcribed.
+
+    Args:
+        job_name (str): The transcription job name.
+        bucket (str): The bucket holding the audio and the transcript.
+        key (str): The key of the audio.
+        original_filename (str): The filename of the audio.
+        transcript_key (str): The key of the saved transcript.
+        cached (bool): Whether the transcript was reused instead of coming from a job this invocation waited for.
+
+    Returns:
+        TranscriptionResult: The flat result with the transcript key and URL.
+    """
+
+    # Return the result in the same shape as the transcription status function
+    return {
+        'statusCode': 200,
+        'status': COMPLETED,
+        'job_name': job_name,
+        'bucket': bucket,
+        'key': key,
+        'original_filename': original_filename,
+        'transcript_key': transcript_key,
+        'transcript_uri': S3Location(bucket, transcript_key).url(s3.meta.region_name),
+        'cached': cached,
+        'next_wait_seconds': 0
+    }
 
 # Function to handle the AWS Lambda invocation and start a transcription job
-def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+@instrumented('transcribe')
+def lambda_handler(event: Dict[str, Any], context: Any) -> TranscriptionResult:
 
     """AWS Lambda function to handle audio transcription using Amazon Transcribe.
 
+    By default the function only submits the transcription job and returns the job name right away,
+    leaving the polling to the state machine and the transcription status function. Setting the mode
+    to 'sync' (via the event or the TRANSCRIBE_MODE environment variable) waits for the job here instead.
+    In 'callback' mode the event carries a Step Functions task token, which is stored for the
+    transcription callback function to resume the execution once Amazon Transcribe reports the job
+    as done; results that are already final (a cache hit or a failure) resume it right away.
+    Audio that was transcribed before, identified by its content fingerprint, is not sent to
+    Amazon Transcribe again; the cached transcript is copied and returned right away.
+    The media format of the job (mp3, wav, flac, ogg, m4a, mp4, amr or webm) is detected from the
+    first bytes of the audio, read with a small ranged request, and from its extension otherwise.
+    The job name and transcript key are derived from the version of the audio, so retries and
+    redelivered events reuse the transcript or the job of an earlier attempt.
+
     Args:
         event (Dict[str, Any]): The event data containing the S3 bucket and key.
         context (Any): The context object provided by AWS Lambda.
 
     Returns:
-        Dict[str, Any]: A response object containing the status code and body.
+        TranscriptionResult: The flat result with the job name, status, and transcript key.
     """
 
-    # Set log level from the event, default to DEBUG if not specified
+    # Set log level from the event, default to the LOG_LEVEL environment variable (DEBUG if unset)
     # Expecting logLevel to be one of 'DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'
-    log_level = event.get('logLevel', 'DEBUG')
+    log_level = event.get('logLevel', DEFAULT_LOG_LEVEL)
     set_log_level(log_level)
 
     # Log the invocation of the Lambda function
     logger.info("Transcribe function invoked")
 
     # Log the received event
-    logger.info("Received event: %s", json.dumps(event))
+    logger.info("Received event: %s", LazyJson(event))
+
+    # Start the transcription
+    result = start_transcription(event, context)
+
+    # Resume the waiting execution if the result is already final
+    task_token = event.get('task_token')
+    if task_token and result.get('status') in (COMPLETED, FAILED):
+
+        # Try to send the result to Step Functions
+        try:
+
+            # Send the result as the task output, or fail the task
+            send_task_result(stepfunctions, task_token, result)
+
+        # Handle ClientError exceptions
+        except ClientError as e:
+
+            # Log the error; the task times out if it cannot be resumed
+            logger.error("Failed to resume the execution: %s", e)
+
+    # Return the result
+    return result
+
+# Function to start a transcription job, or reuse a cached transcript
+def start_transcription(event: Dict[str, Any], context: Any) -> TranscriptionResult:
+
+    """Start the transcription of the audio file named in the event.
+
+    Args:
+        event (Dict[str, Any]): The event data containing the S3 bucket and key.
+        context (Any): The context object provided by AWS Lambda.
+
+    Returns:
+        TranscriptionResult: The flat result with the job name, status, and transcript key.
+    """
 
     # Try to extract data from the event
     try:
@@ -42,6 +194,15 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         key = event['key']
         original_filename = key.split('/')[-1]
 
+        # Extract the transcription mode from the event, falling back to the environment
+        mode = event.get('mode', os.environ.get('TRANSCRIBE_MODE', 'async')).lower()
+        task_token = event.get('task_token')
+
+        # Fall back to polling when callback mode was requested without a task token
+        if mode == 'callback' and not task_token:
+            logger.warning("Callback mode requested without a task token, falling back to async mode")
+            mode = 'async'
+
     # Handle KeyError
     except KeyError as e:
 
@@ -49,41 +210,152 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         logger.error("Missing key in event data: %s", e)
 
         # Return an error response if the bucket or key is not found
-        return {'statusCode': 400, 'body': json.dumps({'error': 'Missing required key in event data.'})}
+        return error_result(400, 'Missing required key in event data.', str(e))
 
     # Log the extracted bucket and key
     logger.info("Checking existence of object in bucket: %s, key: %s", bucket, key)
 
-    # Generate a unique job name based on the original filename and current timestamp
-    base_name = original_filename.split('.')[0]
-    job_name = f"{base_name}-{int(time.time())}"
+    # Get the base name of the audio file, keeping any dots before its extension
+    base_name = get_base_name(original_filename)
 
     # Try to check if the S3 object exists and start the transcription job
     try:
 
-        # Check if the S3 object exists
-        s3.head_object(Bucket=bucket, Key=key)
+        # Check if the S3 object exists, asking for its checksum to fingerprint the audio
+        head_response = s3.head_object(Bucket=bucket, Key=key, ChecksumMode='ENABLED')
         logger.info("Object exists: s3://%s/%s", bucket, key)
 
-        # Log the start of the transcription job
-        logger.info("Starting transcription job: %s", job_name)
-
         # Define the LanguageCode variable
-        languagecode = 'en-US'
-
-        # Get the current timestamp in the desired format & log it
-        current_time = datetime.now().strftime('%Y%m%d_%H%M%S.%f')[:-3]
-        logger.info("Current timestamp: %s", current_time)
-
-        # Start the transcription job with output specified
-        transcribe.start_transcription_job(
-            TranscriptionJobName=job_name,
-            Media={'MediaFileUri': f's3://{bucket}/{key}'},
-            MediaFormat='mp3',
-            LanguageCode=languagecode,
-            OutputBucketName=bucket,
-            OutputKey=f'transcripts/{base_name}_transcript_{languagecode}-{current_time}.txt'
-        )
+        languagecode = TRANSCRIPT_LANGUAGE_CODE
+
+        # Derive the job name and the key Amazon Transcribe writes its output to from the audio version & log them
+        output_id = get_transcription_output_id(bucket, key, head_response, languagecode)
+        job_name = get_transcription_job_name(base_name, output_id)
+        transcript_key = get_transcript_key(base_name, languagecode, output_id)
+        logger.info("Transcription job: %s, transcript key: %s", job_name, transcript_key)
+
+        # Return the transcript an earlier attempt saved for the same audio
+        if is_transcript_saved(s3, bucket, transcript_key):
+
+            # Log the reused transcript
+            logger.info("Transcript already saved, skipping transcription: s3://%s/%s", bucket, transcript_key)
+
+            # Return the transcript without starting a transcription job
+            return completed_result(job_name, bucket, key, original_filename, transcript_key, cached=True)
+
+        # Build the transcript cache configured for this function
+        cache = get_object_cache(s3, bucket, 'transcript')
+        cache_key = None
+
+        # Look for a transcript of the same audio
+        if cache is not None:
+
+            # Fingerprint the audio & log it
+            fingerprint = get_object_fingerprint(s3, bucket, key, head_response)
+            logger.info("Audio fingerprint: %s", fingerprint)
+
+            # Build the cache key from the fingerprint and the transcription parameters
+            cache_key = make_cache_key(fingerprint, languagecode)
+
+            # Reuse the cached transcript if there is one
+            if cache.contains(cache_key):
+
+                # Try to copy the cached transcript to the transcript key
+                try:
+
+                    # Copy the cached transcript server-side
+                    cache.copy_to(cache_key, bucket, transcript_key)
+
+                    # Log the cache hit
+                    logger.info("Transcript cache hit, copied to: s3://%s/%s", bucket, transcript_key)
+
+                    # Return the transcript without starting a transcription job
+                    return completed_result(job_name, bucket, key, original_filename, transcript_key, cached=True)
+
+                # Handle ClientError exceptions
+                except ClientError as e:
+
+                    # Log a warning and fall back to transcribing the audio
+                    logger.warning("Failed to copy cached transcript, transcribing instead: %s", e)
+
+        # Detect the audio format from its first bytes before anything is stored for the job
+        media_format = get_object_media_format(s3, bucket, key, head_response)
+
+        # Store the task token first, so the completion event always finds it
+        if mode == 'callback':
+            save_task_token(s3, bucket, job_name, task_token, {
+                'bucket': bucket,
+                'key': key,
+                'original_filename': original_filename,
+                'transcript_key': transcript_key,
+                'cache_key': cache_key
+            })
+
+        # Try to start the transcription job
+        try:
+
+            # Log the start of the transcription job
+            logger.info("Starting transcription job: %s", job_name)
+
+            # Start the transcription job, or pick up the one an earlier attempt started
+            existing_job = submit_transcription_job(job_name, bucket, key, media_format, languagecode, transcript_key)
+
+        # Handle ClientError exceptions
+        except ClientError:
+
+            # Remove the task token of a job that never started; the failure is reported right away
+            if mode == 'callback':
+                delete_task_token(s3, bucket, job_name, task_token)
+            raise
+
+        # Finish a job an earlier attempt started and that has completed since
+        if existing_job is not None and existing_job['TranscriptionJobStatus'] == COMPLETED:
+
+            # Replace the JSON output with the transcribed text and add it to the transcript cache
+            finalize_transcript(s3, bucket, transcript_key, cache_key)
+
+            # Remove the task token, as no completion event will come for this job again
+            if mode == 'callback':
+                delete_task_token(s3, bucket, job_name, task_token)
+
+            # Log the reused job
+            logger.info("Transcription job %s already completed: s3://%s/%s", job_name, bucket, transcript_key)
+
+            # Return the transcript in the same shape as a cache hit
+            return completed_result(job_name, bucket, key, original_filename, transcript_key, cached=True)
+
+        # Load the backoff schedule used between status checks
+        schedule = get_poll_schedule()
+
+        # Estimate the audio duration from its size and format, and how long the job takes & log it
+        media_seconds = estimate_media_seconds(head_response.get('ContentLength'), media_format)
+        expected_seconds = estimate_transcription_seconds(media_seconds)
+        logger.debug("Estimated media seconds: %s, expected job seconds: %s", media_seconds, expected_seconds)
+
+        # Return right away unless the caller asked to wait for the job
+        if mode != 'sync':
+
+            # Log the submission of the transcription job
+            logger.info("Transcription job submitted, returning without waiting: %s", job_name)
+
+            # Return the job name so the state machine can poll for completion, or wait for the callback
+            return {
+                'statusCode': 200,
+                'status': SUBMITTED,
+                'job_name': job_name,
+                'bucket': bucket,
+                'key': key,
+                'original_filename': original_filename,
+                'transcript_key': transcript_key,
+                'cache_key': cache_key,
+                'cached': False,
+                'media_seconds': media_seconds,
+                'next_wait_seconds': get_adaptive_wait_seconds(0, 0.0, expected_seconds, schedule)
+            }
+
+        # Initialize the poll attempt counter and the start of the wait
+        attempt = 0
+        started_at = time.monotonic()
 
         # Poll for job completion
         while True:
@@ -101,9 +373,37 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 # Break the loop if the job is completed or failed
                 break
 
-            # Log the current job status and wait before checking again
+            # Log the current job status
             logger.info("Transcription job status: %s", job_status)
 
+            # Get the wait before the next status check
+            wait_seconds = get_adaptive_wait_seconds(attempt, time.monotonic() - started_at, expected_seconds, schedule)
+            attempt += 1
+
+            # Check if there is enough time left to wait for another status check
+            if context is not None and context.get_remaining_time_in_millis() < wait_seconds * 1000 + SYNC_POLL_MARGIN_MS:
+
+                # Log that the job is still running and hand it over to the status checks
+                logger.warning("Not enough time left to keep polling transcription job: %s", job_name)
+
+                # Return the job name so the state machine can keep polling
+                return {
+                    'statusCode': 202,
+                    'status': IN_PROGRESS,
+                    'job_name': job_name,
+                    'bucket': bucket,
+                    'key': key,
+                    'original_filename': original_filename,
+                    'transcript_key': transcript_key,
+                    'cache_key': cache_key,
+                    'cached': False,
+                    'media_seconds': media_seconds,
+                    'next_wait_seconds': wait_seconds
+                }
+
+            # Wait before checking again
+            time.sleep(wait_seconds)
+
         # Check the final status of the transcription job
         if job_status == 'COMPLETED':
 
@@ -111,40 +411,17 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             transcript_uri = response['TranscriptionJob']['Transcript']['TranscriptFileUri']
             logger.info("Transcription job completed: %s", transcript_uri)
 
-            # Construct the expected transcript key based on the naming convention & log it
-            transcript_key = f'transcripts/{base_name}_transcript_{languagecode}-{current_time}.txt'
+            # Log the expected transcript key
             logger.info("Expected transcript key: %s", transcript_key)
 
             # Try to fetch the transcript from S3
             try:
 
-                # Fetch the transcript directly from the S3 bucket
-                transcript_response = s3.get_object(Bucket=bucket, Key=transcript_key)
-                transcript_data = json.loads(transcript_response['Body'].read().decode('utf-8'))
-
-                # Extract only the transcribed text
-                transcript_text = transcript_data['results']['transcripts'][0]['transcript']
-
-                # Save the transcript text to a new file
-                s3.put_object(
-                    Bucket=bucket,
-                    Key=transcript_key,
-                    Body=transcript_text
-                )
+                # Replace the JSON output with the transcribed text and add it to the transcript cache
+                finalize_transcript(s3, bucket, transcript_key, cache_key)
 
-                # Log the successful saving of the transcript
-                logger.info("Transcript saved to: s3://%s/%s", bucket, transcript_key)
-
-                # Return a structured response with the job name, status code, and transcript URI
-                return {
-                    'job_name': job_name,
-                    'statusCode': 200,
-                    'body': json.dumps({
-                        'transcript_uri': f's3://{bucket}/{transcript_key}',
-                        'bucket': bucket,
-                        'original_filename': original_filename
-                    })
-                }
+                # Return a structured response with the job name, status code, and transcript key
+                return completed_result(job_name, bucket, key, original_filename, transcript_key, cached=False)
 
             # Handle ClientError exceptions
             except ClientError as e:
@@ -153,7 +430,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 logger.error("Error fetching transcript from S3: %s", e)
 
                 # Return an error response if the transcript file is not found
-                return {'statusCode': 500, 'body': json.dumps({'error': 'S3 ClientError', 'message': str(e)})}
+                return error_result(500, 'S3 ClientError', str(e), job_name=job_name)
 
         else:
 
@@ -162,8 +439,16 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             logger.error("Transcription job failed: %s", failure_reason)
 
             # Return an error response with the failure reason
-            return {'statusCode': 500,
-                    'body': json.dumps({'error': 'Transcription job failed', 'reason': failure_reason})}
+            return error_result(500, 'Transcription job failed', failure_reason, job_name=job_name)
+
+    # Handle audio in a format Amazon Transcribe cannot read
+    except UnsupportedMediaError as e:
+
+        # Log the error and return a structured error response
+        logger.error("Cannot transcribe the audio: %s", e)
+
+        # Return an error response naming the file
+        return error_result(400, 'Unsupported media format', str(e), bucket=bucket, key=key)
 
     # Handle ClientError exceptions
     except ClientError as e:
@@ -172,7 +457,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         logger.error("Error checking object existence: %s", e)
 
         # Return an error response if the object does not exist
-        return {'statusCode': 500, 'body': json.dumps({'error': 'S3 ClientError', 'message': str(e)})}
+        return error_result(500, 'S3 ClientError', str(e))
 
     # Handle unexpected exceptions
     except Exception as e:
@@ -181,7 +466,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         logger.critical("An unexpected error occurred: %s", e)
 
         # Return an error response for unexpected errors
-        return {'statusCode': 500, 'body': json.dumps({'error': 'Internal Server Error', 'message': str(e)})}
+        return error_result(500, 'Internal Server Error', str(e))
 
     # Handle the finalization of the function
     finally:
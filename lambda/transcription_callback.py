@@ -0,0 +1,169 @@
+import os
+from botocore.exceptions import ClientError
+from typing import Dict, Any
+from helpers.logger import DEFAULT_LOG_LEVEL, LazyJson, set_log_level, logger
+from helpers.clients import LazyClient
+from helpers.metrics import instrumented
+from helpers.results import COMPLETED, FAILED, TranscriptionStatus, error_result
+from helpers.s3_uri import S3Location
+from helpers.task_tokens import delete_task_token, load_task_tokens, send_task_result
+from helpers.transcript import finalize_transcript
+
+# Initialize Boto3 clients, created on first use
+s3 = LazyClient('s3')
+transcribe = LazyClient('transcribe')
+stepfunctions = LazyClient('stepfunctions')
+
+# Errors returned by Step Functions for task tokens whose execution has timed out or ended
+STALE_TOKEN_ERRORS = ('TaskTimedOut', 'TaskDoesNotExist', 'InvalidToken')
+
+# Function to handle Amazon Transcribe job state changes and resume the waiting execution
+@instrumented('transcription_callback')
+def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+
+    """Resume the Step Functions execution waiting for a transcription job.
+
+    The function is invoked by an EventBridge rule for 'Transcribe Job State Change' events. When
+    the job was started in callback mode, the task tokens of the executions waiting for it are
+    loaded from the bucket, the transcript is saved as text and cached, and each execution is
+    resumed with the same result the transcription status function returns, or failed if the job
+    failed. Events for jobs no execution is waiting for, including repeated deliveries of the same
+    event, are ignored.
+
+    Args:
+        event (Dict[str, Any]): The EventBridge event with the job name and status in its detail.
+        context (Any): The context object provided by AWS Lambda.
+
+    Returns:
+        Dict[str, Any]: A response dict with the job name, the number of executions resumed and the
+            result sent to Step Functions, if any.
+    """
+
+    # Set log level from the event, default to the LOG_LEVEL environment variable (DEBUG if unset)
+    # Expecting logLevel to be one of 'DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'
+    log_level = event.get('logLevel', DEFAULT_LOG_LEVEL)
+    set_log_level(log_level)
+
+    # Log the invocation of the Lambda function
+    logger.info("Transcription Callback function invoked")
+
+    # Log the received event
+    logger.info("Received event: %s", LazyJson(event))
+
+    # Extract the job name and status from the event
+    detail = event.get('detail', {})
+    job_name = detail.get('TranscriptionJobName')
+    job_status = detail.get('TranscriptionJobStatus')
+
+    # Get the bucket holding the task tokens from the environment
+    bucket = os.environ.get('S3_BUCKET')
+
+    # Check for required parameters
+    if not job_name or not bucket:
+
+        # Log an error and return a 400 response
+        logger.error("Missing job name in the event or S3_BUCKET in the environment.")
+
+        # Return a response indicating missing parameters
+        return {'statusCode': 400, 'job_name': job_name, 'handled': False}
+
+    # Ignore job states other than the final ones
+    if job_status not in (COMPLETED, FAILED):
+
+        # Log the ignored state
+        logger.info("Ignoring transcription job %s in state: %s", job_name, job_status)
+
+        # Return without resuming anything
+        return {'statusCode': 200, 'job_name': job_name, 'handled': False}
+
+    # Try to resume the waiting executions
+    try:
+
+        # Load the task tokens stored when the job was submitted, one per waiting execution
+        callbacks = load_task_tokens(s3, bucket, job_name)
+
+        # Ignore jobs no execution is waiting for
+        if not callbacks:
+
+            # Log the ignored job
+            logger.info("No execution is waiting for transcription job: %s", job_name)
+
+            # Return without resuming anything
+            return {'statusCode': 200, 'job_name': job_name, 'handled': False}
+
+        # Finish the completed job once; every execution waiting for it shares the same transcript
+        if job_status == COMPLETED:
+
+            # Replace the JSON output with the transcribed text and add it to the transcript cache
+            finalize_transcript(s3, callbacks[0]['bucket'], callbacks[0]['transcript_key'], callbacks[0].get('cache_key'))
+            failure_reason = None
+
+        else:
+
+            # Look up the failure reason & log it
+            response = transcribe.get_transcription_job(TranscriptionJobName=job_name)
+            failure_reason = response['TranscriptionJob'].get('FailureReason', 'Unknown error')
+            logger.error("Transcription job failed: %s", failure_reason)
+
+        # Loop through each waiting execution
+        for callback in callbacks:
+
+            # Build the result of the completed job
+            if failure_reason is None:
+
+                # Build the result in the same shape as the transcription status function
+                transcript_key = callback['transcript_key']
+                result: TranscriptionStatus = {
+                    'statusCode': 200,
+                    'status': COMPLETED,
+                    'job_name': job_name,
+                    'bucket': callback['bucket'],
+                    'original_filename': callback['original_filename'],
+                    'transcript_key': transcript_key,
+                    'transcript_uri': S3Location(callback['bucket'], transcript_key).url(s3.meta.region_name),
+                    'poll_attempt': 0,
+                    'next_wait_seconds': 0
+                }
+
+            else:
+
+                # Build the failed result
+                result = error_result(500, 'Transcription job failed', failure_reason, job_name=job_name)
+
+            # Try to resume the execution with the result
+            try:
+
+                # Send the result to Step Functions
+                send_task_result(stepfunctions, callback['task_token'], result)
+
+            # Handle ClientError exceptions
+            except ClientError as e:
+
+                # Raise anything but a task that can no longer be resumed
+                if e.response['Error']['Code'] not in STALE_TOKEN_ERRORS:
+                    raise
+
+                # Log a warning; the token is removed below, as the execution has timed out or ended
+                logger.warning("Execution waiting for transcription job %s can no longer be resumed: %s", job_name, e)
+
+            # Remove the task token, so a repeated event does not resume the execution again
+            delete_task_token(s3, bucket, job_name, callback['task_token'])
+
+        # Log the resumed executions
+        logger.info("Resumed %d execution(s) waiting for transcription job %s with status: %s", len(callbacks), job_name, result['status'])
+
+        # Return the result sent to Step Functions
+        return {'statusCode': 200, 'job_name': job_name, 'handled': True, 'executions': len(callbacks), 'result': result}
+
+    # Handle ClientError exceptions
+    except ClientError as e:
+
+        # Log the error and raise it, so EventBridge retries the delivery
+        logger.error("Error resuming execution for transcription job %s: %s", job_name, e)
+        raise
+
+    # Handle the finalization of the function
+    finally:
+
+        # Log the completion of the Lambda function execution
+        logger.debug("Finished processing transcription job state change for job name: %s", job_name)
@@ -1,50 +1,219 @@
-import boto3
-import json
+import os
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
-from typing import Any, Dict, List
-from datetime import datetime
-from helpers.logger import set_log_level, logger
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+from helpers.logger import DEFAULT_LOG_LEVEL, LazyJson, set_log_level, logger
+from helpers.cache import get_object_cache, make_cache_key
+from helpers.clients import LazyClient
+from helpers.concurrency import in_current_context, ordered_map
+from helpers.languages import get_target_languages, parse_language_list
+from helpers.metrics import get_metrics, instrumented, timed
+from helpers.output_keys import get_base_name, get_translation_key, get_translation_output_id
+from helpers.results import COMPLETED, FAILED, BatchResult, TranslationResult, batch_result, error_result, store_payload
+from helpers.s3_exists import EXISTS, check_objects_exist
+from helpers.s3_stream import upload_stream
+from helpers.s3_uri import S3Location, S3UriError, to_object_key
+from helpers.text_chunker import chunk_text
 
-# Initialize Boto3 clients
-translate = boto3.client('translate')
-s3 = boto3.client('s3')
+# Initialize Boto3 clients, created on first use
+translate = LazyClient('translate')
+s3 = LazyClient('s3')
 
-# Function to handle the AWS Lambda invocation and translate text from a transcript stored in S3
-def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+# Default maximum number of languages translated concurrently
+DEFAULT_MAX_WORKERS = 5
 
-    """AWS Lambda function to translate text from a transcript stored in S3.
+# Default maximum number of chunks translated concurrently for each language
+DEFAULT_CHUNK_MAX_WORKERS = 4
+
+# Default maximum number of transcripts of a batch translated concurrently
+DEFAULT_BATCH_MAX_WORKERS = 2
+
+# Maximum size of the text in a single TranslateText request (in UTF-8 bytes)
+MAX_TRANSLATE_BYTES = 10000
+
+# Function to translate the transcript chunks into one target language, in order
+def translate_chunks(chunks: List[str], target_language: str, terminology_names: List[str]) -> Iterator[bytes]:
+
+    """Translate transcript chunks concurrently and yield the encoded translations in order.
 
     Args:
-        event (Dict[str, Any]): The input event containing parameters for translation.
-        context (Any): The context object provided by AWS Lambda.
+        chunks (List[str]): The transcript chunks to translate.
+        target_language (str): The language code to translate into.
+        terminology_names (List[str]): The custom terminologies to apply, if any.
 
     Returns:
-        Dict[str, Any]: A response dict containing status code and results or error message.
+        Iterator[bytes]: The UTF-8 encoded translated chunks, separated by a space where the transcript had one.
     """
 
-    # Set log level from the event, default to DEBUG if not specified
-    # Expecting logLevel to be one of 'DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'
-    log_level = event.get('logLevel', 'DEBUG')
-    set_log_level(log_level)
+    # Get the maximum number of concurrent chunk translations from the environment
+    max_workers = max(1, int(os.environ.get('TRANSLATE_CHUNK_MAX_WORKERS', DEFAULT_CHUNK_MAX_WORKERS)))
 
-    # Log the invocation of the Lambda function
-    logger.info("Translate function invoked")
+    # Only pass terminologies to Amazon Translate when some are configured
+    extra_args = {'TerminologyNames': terminology_names} if terminology_names else {}
 
-    # Log the received event
-    logger.info("Received event: %s", json.dumps(event))
+    # Translate a single chunk using Amazon Translate
+    def translate_chunk(chunk: str) -> str:
+        get_metrics().add_count('translate_characters', len(chunk))
+        return translate.translate_text(
+            Text=chunk,
+            SourceLanguageCode='en',
+            TargetLanguageCode=target_language,
+            **extra_args
+        )['TranslatedText']
+
+    # Yield each translated chunk as soon as it and all chunks before it are done
+    for index, translated_chunk in enumerate(ordered_map(translate_chunk, chunks, max_workers)):
+
+        # Restore the whitespace between chunks that Amazon Translate trims
+        if index and (chunks[index - 1][-1:].isspace() or chunks[index][:1].isspace()):
+            yield b' '
+
+        # Yield the encoded chunk
+        yield translated_chunk.encode('utf-8')
+
+# Function to translate the transcript into one target language and store it in S3
+@timed('translate_language')
+def translate_language(chunks: List[str], target_language: str, bucket: str, translation_key: str,
+                       terminology_names: List[str], transcript_hash: str, cache: Optional[Any] = None) -> Tuple[Optional[str], Optional[str]]:
+
+    """Translate the transcript into a single target language and stream it to S3.
+
+    When a cache is given, a translation of the same transcript, languages, and terminologies is
+    copied from the cache instead of calling Amazon Translate, and new translations are added to it.
+
+    Args:
+        chunks (List[str]): The transcript, split into chunks that fit a single TranslateText request.
+        target_language (str): The language code to translate into.
+        bucket (str): The bucket to save the translation to.
+        translation_key (str): The key to save the translation to.
+        terminology_names (List[str]): The custom terminologies to apply, if any.
+        transcript_hash (str): The content hash of the transcript text.
+        cache (Optional[Any]): The translation cache, or None to always translate.
+
+    Returns:
+        Tuple[Optional[str], Optional[str]]: The S3 URI of the translation and None, or None and an
+            error message if the translation failed.
+    """
+
+    # Log the target language being processed
+    logger.info("Translating text to: %s", target_language)
+
+    # Fail instead of saving an empty translation when the transcript has no text
+    if not chunks:
+        logger.error("Transcript is empty, nothing to translate to %s: s3://%s/%s", target_language, bucket, translation_key)
+        return None, f'Translation failed for {target_language}. Error: the transcript is empty'
+
+    # Try to translate the text
+    try:
+
+        # Build the cache key from the transcript and the translation parameters
+        cache_key = make_cache_key(transcript_hash, 'en', target_language, sorted(terminology_names))
+
+        # Reuse the cached translation if there is one
+        if cache is not None and cache.contains(cache_key):
+
+            # Try to copy the cached translation to the translation key
+            try:
+
+                # Copy the cached translation server-side
+                cache.copy_to(cache_key, bucket, translation_key)
+
+                # Log the cache hit
+                logger.info("Translation cache hit for %s: s3://%s/%s", target_language, bucket, translation_key)
+
+                # Return the S3 URI of the translation
+                return S3Location(bucket, translation_key).uri, None
+
+            # Handle ClientError exceptions
+            except ClientError as e:
+
+                # Log a warning and fall back to translating the text
+                logger.warning("Failed to copy cached translation for %s, translating instead: %s", target_language, e)
+
+        # Translate the chunks using Amazon Translate and stream the translated text to S3
+        upload_stream(s3, bucket, translation_key, translate_chunks(chunks, target_language, terminology_names), content_type='text/plain; charset=utf-8')
+
+        # Add the translation to the cache
+        if cache is not None:
+
+            # Try to store the translation in the cache
+            try:
+
+                # Copy the translation into the cache
+                cache.store_from(cache_key, bucket, translation_key)
+
+            # Handle ClientError exceptions
+            except ClientError as e:
+
+                # Log a warning; a cache failure does not fail the translation
+                logger.warning("Failed to cache translation for %s: %s", target_language, e)
+
+        # Log the successful translation and storage
+        logger.info("Translation successful for %s: s3://%s/%s", target_language, bucket, translation_key)
+
+        # Return the S3 URI of the translation
+        return S3Location(bucket, translation_key).uri, None
+
+    # Handle ClientError exceptions
+    except ClientError as e:
+
+        # Log the error and return a failure message
+        logger.error("Error during translation for %s: %s", target_language, e)
+
+        # Return the error message
+        return None, f'Translation failed for {target_language}. Error: {str(e)}'
+
+    # Handle unexpected exceptions
+    except Exception as e:
+
+        # Log the unexpected error
+        logger.error("An unexpected error occurred during translation for %s: %s", target_language, e)
+
+        # Return the error message
+        return None, f'Translation not found for {target_language}. Error: {str(e)}'
+
+# Function to translate one transcript into its target languages
+@timed('translate_item')
+def translate_item(event: Dict[str, Any]) -> TranslationResult:
+
+    """Translate one transcript stored in S3 into its target languages.
+
+    Target languages are translated concurrently, with up to 'max_workers' (from the event or the
+    TRANSLATE_MAX_WORKERS environment variable) requests in flight against Amazon Translate.
+    Transcripts larger than a single TranslateText request are split at sentence boundaries,
+    translated in parallel, and streamed back to S3 in order. Translations are cached by the hash of
+    the transcript, source and target languages, and terminologies, and the result reports the
+    cache hits and misses. The S3 URIs of the translations are returned inline, or stored in S3
+    and passed as a pointer when there are too many of them.
+    Translation keys are derived from the transcript key and the translation parameters, and
+    languages whose translation an earlier attempt already saved are not translated again; the
+    transcript is not even read when every language is saved.
+    When the event names a single 'target_language', only that language is translated and the
+    result carries it back.
+
+    Args:
+        event (Dict[str, Any]): The transcript and the parameters of its translation.
+
+    Returns:
+        TranslationResult: The flat result with the translation URIs and errors by language.
+    """
 
     # Extract data from the event
-    transcript_uri: str = event['transcript_uri']
-    target_languages: List[str] = event['target_languages']
+    transcript_uri: str = event.get('transcript_uri')
+    transcript_key: Optional[str] = event.get('transcript_key')
+    target_language: Optional[str] = event.get('target_language')
+    target_languages: List[str] = [target_language] if target_language else (parse_language_list(event.get('target_languages')) or get_target_languages())
     bucket: str = event['bucket']
     original_filename: str = event.get('original_filename')
+    terminology_names: List[str] = event.get('terminology_names', [])
 
     # Log the extracted parameters
     logger.info("Extracted parameters - Bucket: %s, Original Filename: %s, Transcript URI: %s", bucket,
                 original_filename, transcript_uri)
 
-    # Check if the transcript URI is provided
-    results: Dict[str, str] = {}
+    # Initialize the translation URIs and the errors by language
+    translations: Dict[str, str] = {}
+    errors: Dict[str, str] = {}
 
     # Try to process the translation
     try:
@@ -52,8 +221,14 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         # Log the transcript URI being processed
         logger.info("Retrieving transcript text from: %s", transcript_uri)
 
-        # Extract the key from the transcript URI
-        key = transcript_uri.split(f"s3.us-east-1.amazonaws.com/{bucket}/")[-1]
+        # Use the transcript key when given, otherwise extract it from the transcript URI
+        try:
+            key = transcript_key or to_object_key(transcript_uri or '')
+
+        # Treat URLs that do not point to S3 as an empty key
+        except S3UriError as e:
+            logger.error("Could not parse the transcript URI: %s", e)
+            key = ''
 
         # Log the extracted key
         logger.info("Extracted S3 Key: %s", key)
@@ -65,78 +240,83 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             logger.error("Extracted key is empty. Please check the transcript URI.")
 
             # Return an error response if the key is invalid
-            return {
-                'statusCode': 400,
-                'body': json.dumps({'error': 'Invalid transcript URI.'})
-            }
-
-        # Retrieve the transcript text from S3
-        transcript_object = s3.get_object(Bucket=bucket, Key=key)
-        transcript_text: str = transcript_object['Body'].read().decode('utf-8')
-
-        # Log the successful retrieval of transcript text
-        logger.info("Transcript text retrieved successfully.")
-
-        # Check if the transcript text is empty
-        for target_language in target_languages:
-
-            # Log the target language being processed
-            logger.info("Translating text to: %s", target_language)
-
-            # Try to translate the text
-            try:
+            return error_result(400, 'Invalid transcript URI.', bucket=bucket, original_filename=original_filename,
+                                target_language=target_language)
+
+        # Derive the translation key of each target language from the transcript and the translation parameters
+        base_name = get_base_name(original_filename)
+        translation_keys = {
+            language: get_translation_key(base_name, language, get_translation_output_id(bucket, key, language, terminology_names))
+            for language in target_languages
+        }
 
-                # Translate the text using Amazon Translate
-                translated_text = translate.translate_text(
-                    Text=transcript_text,
-                    SourceLanguageCode='en',
-                    TargetLanguageCode=target_language
+        # Reuse the translations an earlier attempt saved
+        key_statuses = check_objects_exist(s3, bucket, list(translation_keys.values()))
+        saved_translations = {language: S3Location(bucket, translation_key).uri for language, translation_key in translation_keys.items()
+                              if key_statuses[translation_key] == EXISTS}
+        pending_languages = [language for language in target_languages if language not in saved_translations]
+        if saved_translations:
+            logger.info("Translation(s) already saved for: %s", ', '.join(saved_translations))
+
+        # Build the translation cache configured for this function
+        cache = get_object_cache(s3, bucket, 'translation')
+
+        # Translate the languages that are not saved yet
+        translated: Dict[str, str] = {}
+        if pending_languages:
+
+            # Retrieve the transcript text from S3
+            transcript_object = s3.get_object(Bucket=bucket, Key=key)
+            transcript_text: str = transcript_object['Body'].read().decode('utf-8')
+
+            # Log the successful retrieval of transcript text
+            logger.info("Transcript text retrieved successfully.")
+
+            # Split the transcript at sentence boundaries into chunks that fit a TranslateText request & log it
+            chunks = chunk_text(transcript_text, MAX_TRANSLATE_BYTES)
+            logger.info("Transcript split into %d chunk(s).", len(chunks))
+
+            # Hash the transcript once for the translation cache keys
+            transcript_hash = make_cache_key(transcript_text)
+
+            # Get the maximum number of concurrent translations from the event or the environment
+            max_workers = max(1, int(event.get('max_workers', os.environ.get('TRANSLATE_MAX_WORKERS', DEFAULT_MAX_WORKERS))))
+            logger.debug("Translating %d language(s) with up to %d worker(s).", len(pending_languages), max_workers)
+
+            # Translate and store each target language concurrently
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(pending_languages))) as executor:
+                translation_results = executor.map(
+                    in_current_context(lambda language: translate_language(chunks, language, bucket, translation_keys[language],
+                                                                           terminology_names, transcript_hash, cache)),
+                    pending_languages
                 )
 
-                # Generate a unique translation file name
-                current_time = datetime.now().strftime('%Y%m%d_%H%M%S.%f')[:-3]
-                translation_key: str = f'translations/{original_filename.split(".")[0]}_translation_{target_language}-{current_time}.txt'
-
-                # Save the translated text to S3
-                s3.put_object(Bucket=bucket, Key=translation_key, Body=translated_text['TranslatedText'])
-
-                # Log the successful translation and storage
-                logger.info("Translation successful for %s: s3://%s/%s", target_language, bucket, translation_key)
-
-                # Store the result in the results dictionary
-                results[target_language] = f's3://{bucket}/{translation_key}'
-
-            # Handle ClientError exceptions
-            except ClientError as e:
-
-                # Log the error and store a failure message
-                logger.error("Error during translation for %s: %s", target_language, e)
-
-                # Store the error message in results
-                results[target_language] = f'Translation failed for {target_language}. Error: {str(e)}'
+                # Store each translation URI or error
+                for language, (translation, error) in zip(pending_languages, translation_results):
+                    if error is None:
+                        translated[language] = translation
+                    else:
+                        errors[language] = error
 
-            # Handle unexpected exceptions
-            except Exception as e:
-
-                # Log the unexpected error
-                logger.error("An unexpected error occurred during translation for %s: %s", target_language, e)
-
-                # Store the error message in results
-                results[target_language] = f'Translation not found for {target_language}. Error: {str(e)}'
+        # Collect the saved and new translations in target language order
+        translations = {language: saved_translations.get(language) or translated[language]
+                        for language in target_languages if language in saved_translations or language in translated}
 
         # Log the completion of the translation process
         logger.info("Translation process completed for all target languages.")
 
-        # Return the response with status code 200 and results
+        # Return the response with status code 200 and the translations, stored in S3 if too large
         return {
             'statusCode': 200,
+            'status': COMPLETED if translations else FAILED,
             'bucket': bucket,
             'key': f'audio_inputs/{original_filename}',
+            'original_filename': original_filename,
+            'target_language': target_language,
             'target_languages': target_languages,
-            'body': json.dumps({
-                'results': results,
-                'original_filename': original_filename
-            })
+            'translations': store_payload(s3, bucket, 'translations', translations),
+            'errors': store_payload(s3, bucket, 'translation-errors', errors),
+            'cache': cache.stats.to_dict() if cache is not None else {'hits': 0, 'misses': 0}
         }
 
     # Handle ClientError exceptions
@@ -146,10 +326,8 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         logger.error("Error retrieving transcript or translating text: %s", e)
 
         # Return an error response if the transcript file is not found or another error occurs
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': str(e)})
-        }
+        return error_result(500, 'S3 ClientError', str(e), bucket=bucket, original_filename=original_filename,
+                                target_language=target_language)
 
     # Handle unexpected exceptions
     except Exception as e:
@@ -158,13 +336,60 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         logger.error("An unexpected error occurred: %s", e)
 
         # Return an error response for unexpected errors
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': 'An unexpected error occurred'})
-        }
+        return error_result(500, 'An unexpected error occurred', str(e), bucket=bucket, original_filename=original_filename,
+                                target_language=target_language)
 
     # Handle the finalization of the function
     finally:
 
         # Log the completion of the Lambda function execution
         logger.debug("Finished processing translation for original filename: %s", original_filename)
+
+# Function to handle the AWS Lambda invocation and translate text from transcripts stored in S3
+@instrumented('translate')
+def lambda_handler(event: Dict[str, Any], context: Any) -> Union[TranslationResult, BatchResult]:
+
+    """AWS Lambda function to translate text from a transcript stored in S3, or from a batch of them.
+
+    A single transcript is translated as translate_item describes, as each iteration of the state
+    machine's language Map does. An event with 'items' translates every transcript of a batch
+    execution in one invocation: up to 'batch_max_workers' (from the event or the
+    TRANSLATE_BATCH_MAX_WORKERS environment variable) transcripts are translated at once with the
+    shared clients, and items whose transcription failed are passed through as failed.
+
+    Args:
+        event (Dict[str, Any]): The input event containing parameters for translation, or a list of them under 'items'.
+        context (Any): The context object provided by AWS Lambda.
+
+    Returns:
+        Union[TranslationResult, BatchResult]: The result of the transcript, or the result of each item of the batch.
+    """
+
+    # Set log level from the event, default to the LOG_LEVEL environment variable (DEBUG if unset)
+    # Expecting logLevel to be one of 'DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'
+    log_level = event.get('logLevel', DEFAULT_LOG_LEVEL)
+    set_log_level(log_level)
+
+    # Log the invocation of the Lambda function
+    logger.info("Translate function invoked")
+
+    # Log the received event
+    logger.info("Received event: %s", LazyJson(event))
+
+    # Translate a single transcript
+    if 'items' not in event:
+        return translate_item(event)
+
+    # Get the maximum number of transcripts translated concurrently from the event or the environment
+    items: List[Dict[str, Any]] = event['items']
+    max_workers = max(1, int(event.get('batch_max_workers', os.environ.get('TRANSLATE_BATCH_MAX_WORKERS', DEFAULT_BATCH_MAX_WORKERS))))
+    logger.info("Translating a batch of %d transcript(s) with up to %d worker(s).", len(items), max_workers)
+
+    # Translate each transcript, passing the failed transcriptions through
+    def translate_batch_item(item: Dict[str, Any]) -> Dict[str, Any]:
+        if item.get('status') == FAILED:
+            return item
+        return translate_item(item)
+
+    # Return the result of each transcript, in order
+    return batch_result(list(ordered_map(translate_batch_item, items, max_workers)))
@@ -1,44 +1,154 @@
-import boto3
 import json
 import os
-from botocore.exceptions import ClientError
-from typing import Any, Dict
-from helpers.logger import set_log_level, logger
-from helpers.datetime_serializer import serialize_datetime
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote_plus
+from typing import Any, Dict, List, Tuple
+from helpers.logger import DEFAULT_LOG_LEVEL, LazyJson, set_log_level, logger
+from helpers.clients import LazyClient
+from helpers.concurrency import in_current_context
+from helpers.executions import FAILED, start_batch_execution
+from helpers.metrics import instrumented
 
-# Initialize Boto3 clients
-stepfunctions = boto3.client('stepfunctions')
+# Initialize Boto3 clients, created on first use
+s3 = LazyClient('s3')
+stepfunctions = LazyClient('stepfunctions')
 
-# Function to handle the AWS Lambda invocation and start a Step Functions execution
+# Default maximum number of Step Functions executions started concurrently
+DEFAULT_MAX_WORKERS = 10
+
+# Default maximum number of uploaded objects processed by one Step Functions execution
+DEFAULT_BATCH_SIZE = 1
+
+# Function to extract the S3 objects carried by a single record
+def extract_record_objects(record: Dict[str, Any]) -> List[Dict[str, Any]]:
+
+    """Extract the uploaded S3 objects of one S3 or SQS record.
+
+    Args:
+        record (Dict[str, Any]): The S3 record, or the SQS record wrapping an S3 notification.
+
+    Returns:
+        List[Dict[str, Any]]: One entry per object with its bucket, key, and SQS message ID (if any).
+
+    Raises:
+        KeyError: If the record is missing the bucket name or object key.
+        json.JSONDecodeError: If the SQS message body is not JSON.
+    """
+
+    # Unwrap S3 notifications delivered through SQS
+    if record.get('eventSource') == 'aws:sqs':
+
+        # Parse the S3 notification from the message body
+        message_id = record.get('messageId')
+        s3_records = json.loads(record['body']).get('Records', [])
+
+    else:
+
+        # Use the S3 record as is
+        message_id = None
+        s3_records = [record]
+
+    # Extract the bucket and key of each S3 record; S3 event notifications URL-encode object keys
+    return [
+        {
+            'bucket': s3_record['s3']['bucket']['name'],
+            'key': unquote_plus(s3_record['s3']['object']['key']),
+            'message_id': message_id
+        }
+        for s3_record in s3_records
+    ]
+
+# Function to extract the uploaded objects from S3, SQS, or EventBridge records
+def extract_s3_objects(event: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+
+    """Extract every uploaded S3 object from the event, whatever the delivering source.
+
+    Each record is parsed on its own, so a malformed record is reported without keeping the objects
+    of the other records in the event from being processed.
+
+    Args:
+        event (Dict[str, Any]): The event data from S3, SQS, or EventBridge.
+
+    Returns:
+        Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]: One entry per object with its bucket, key,
+            and SQS message ID (if any), and one entry per malformed record with its message ID and error.
+
+    Raises:
+        KeyError: If the event has no records, or an EventBridge event is missing the bucket name or object key.
+    """
+
+    # Handle EventBridge events, which carry a single object in the detail
+    if 'detail' in event:
+
+        # Extract bucket and key from the EventBridge event
+        return [{
+            'bucket': event['detail']['bucket']['name'],
+            'key': event['detail']['object']['key'],
+            'message_id': None
+        }], []
+
+    # Initialize the lists of uploaded objects and malformed records
+    s3_objects: List[Dict[str, Any]] = []
+    malformed: List[Dict[str, Any]] = []
+
+    # Loop through each record delivered in the event
+    for index, record in enumerate(event['Records']):
+
+        # Try to extract the objects of the record
+        try:
+
+            # Add the objects of the record
+            s3_objects.extend(extract_record_objects(record))
+
+        # Handle records missing a key and malformed SQS message bodies
+        except (KeyError, TypeError, AttributeError, json.JSONDecodeError) as e:
+
+            # Log the error and report the record
+            message_id = record.get('messageId') if isinstance(record, dict) else None
+            logger.error("Malformed record %d (message ID: %s): %s", index, message_id, repr(e))
+            malformed.append({'message_id': message_id, 'status': FAILED, 'error': f'Malformed record: {e!r}'})
+
+    # Return the uploaded objects and the malformed records
+    return s3_objects, malformed
+
+# Function to handle the AWS Lambda invocation and start a Step Functions execution per uploaded object
+@instrumented('trigger')
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 
-    """AWS Lambda function handler to start a Step Functions execution based on S3 event.
+    """AWS Lambda function handler to start Step Functions executions for every record in the event.
+
+    The records are grouped, in order, into batches of up to MAX_BATCH_SIZE objects (1 by default),
+    and one execution is started per batch, so a burst of small uploads delivered together through
+    the SQS batch window shares the state transitions and Lambda invocations of one execution.
+    Batches are fanned out over a bounded thread pool, sized by the MAX_CONCURRENT_EXECUTIONS
+    environment variable, and each record is reported as started or failed with its batch. Malformed
+    records are reported as failed, with their SQS messages in batchItemFailures, and do not keep
+    the other records from being started.
 
     Args:
-        event (Dict[str, Any]): The event data from S3.
+        event (Dict[str, Any]): The event data from S3, SQS, or EventBridge.
         context (Any): The context object provided by AWS Lambda.
 
     Returns:
-        Dict[str, Any]: A response dictionary with status code and message.
+        Dict[str, Any]: A response dictionary with status code and per-record results.
     """
 
-    # Set log level from the event, default to DEBUG if not specified
+    # Set log level from the event, default to the LOG_LEVEL environment variable (DEBUG if unset)
     # Expecting logLevel to be one of 'DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'
-    log_level = event.get('logLevel', 'DEBUG')
+    log_level = event.get('logLevel', DEFAULT_LOG_LEVEL)
     set_log_level(log_level)
 
     # Log the invocation of the Lambda function
-    logger.info("Received event: %s", json.dumps(event))
+    logger.info("Received event: %s", LazyJson(event))
 
     # Try to extract data from the event
     try:
 
-        # Extract bucket and key from the S3 event
-        bucket = event['Records'][0]['s3']['bucket']['name']
-        key = event['Records'][0]['s3']['object']['key']
+        # Extract bucket and key from every record in the event
+        s3_objects, malformed = extract_s3_objects(event)
 
-    # Handle KeyError
-    except KeyError as e:
+    # Handle events without records and EventBridge events missing the bucket or key
+    except (KeyError, TypeError) as e:
 
         # Log the error if bucket or key is missing
         logger.error("Missing key in event data: %s", e)
@@ -49,80 +159,89 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps('Error: Missing required key in event data.')
         }
 
-    # Log the extracted bucket and key
-    logger.info("Extracted bucket: %s, key: %s", bucket, key)
+    # Report the malformed SQS messages as failed; after UploadMaxReceiveCount deliveries they move to the dead-letter queue
+    malformed_message_ids = [record['message_id'] for record in malformed if record['message_id']]
 
-    # Try to start the Step Functions execution
-    try:
+    # Check if any objects were found in the event
+    if not s3_objects:
 
-        # Log the preparation for starting the Step Functions execution
-        logger.debug("Preparing to start Step Functions execution with bucket: %s, key: %s", bucket, key)
+        # Log an error if the event carried no valid records
+        logger.error("No valid records found in event data.")
 
-        # Ensure the state machine ARN is set in the environment variables
-        # This should be set in the Lambda environment configuration
-        # if 'STATE_MACHINE_ARN' not in os.environ:
-        if 'STATE_MACHINE_ARN' not in os.environ:
-
-            # Log an error if the ARN is not set
-            logger.error("STATE_MACHINE_ARN environment variable is not set.")
-
-            # Return an error response if the ARN is not set
-            return {
-                'statusCode': 500,
-                'body': json.dumps('Error: STATE_MACHINE_ARN environment variable is not set.')
-            }
-
-        # Start the Step Functions execution with the provided bucket, key, and target languages
-        response = stepfunctions.start_execution(
-            stateMachineArn=os.environ['STATE_MACHINE_ARN'],
-            input=json.dumps({
-                'bucket': bucket,
-                'key': key,
-                'target_languages': ['es', 'fr', 'de']
-            })
-        )
-
-        # Log the successful start of the Step Functions execution
-        logger.info("Started Step Functions execution: %s", response['executionArn'])
-
-        # Log the full response for debugging with serialization of datetime objects
-        logger.debug("Step Functions response: %s", json.dumps(response, default=serialize_datetime))
-
-        # Return a success response
+        # Return an error response if there is nothing to process
         return {
-            'statusCode': 200,
-            'body': json.dumps('Step Function execution started!')
+            'statusCode': 400,
+            'body': json.dumps('Error: No records found in event data.' if not malformed else {'results': malformed}),
+            'batchItemFailures': [{'itemIdentifier': message_id} for message_id in dict.fromkeys(malformed_message_ids)]
         }
 
-    # Handle ClientError exceptions
-    except ClientError as e:
+    # Log the number of extracted records
+    logger.info("Extracted %d record(s) from the event.", len(s3_objects))
+
+    # Ensure the state machine ARN is set in the environment variables
+    # This should be set in the Lambda environment configuration
+    if 'STATE_MACHINE_ARN' not in os.environ:
 
-        # Log the ClientError with traceback
-        logger.error("ClientError while starting Step Functions execution for bucket: %s, key: %s. Error: %s", bucket,
-                     key, e.response['Error']['Message'], exc_info=True)
+        # Log an error if the ARN is not set
+        logger.error("STATE_MACHINE_ARN environment variable is not set.")
 
-        # Log the error with traceback
+        # Return an error response if the ARN is not set
         return {
             'statusCode': 500,
-            'body': json.dumps(f'ClientError: {e.response["Error"]["Message"]}')
+            'body': json.dumps('Error: STATE_MACHINE_ARN environment variable is not set.')
         }
 
-    # Handle unexpected exceptions
-    except Exception as e:
+    # Get the state machine ARN, the maximum number of concurrent executions, and the batch size
+    state_machine_arn = os.environ['STATE_MACHINE_ARN']
+    max_workers = max(1, int(os.environ.get('MAX_CONCURRENT_EXECUTIONS', DEFAULT_MAX_WORKERS)))
+    batch_size = max(1, int(os.environ.get('MAX_BATCH_SIZE', DEFAULT_BATCH_SIZE)))
 
-        # Log the exception with traceback
-        logger.critical("Critical error starting Step Functions execution for bucket: %s, key: %s. Error: %s", bucket,
-                        key, str(e),
-                        exc_info=True)
+    # Group the records into batches, keeping the record order
+    batches = [s3_objects[start:start + batch_size] for start in range(0, len(s3_objects), batch_size)]
+    logger.info("Grouped %d record(s) into %d batch(es) of up to %d.", len(s3_objects), len(batches), batch_size)
 
-        # Log the error with traceback
+    # Try to start the Step Functions executions
+    try:
+
+        # Start one execution per batch on a bounded thread pool, keeping the record order
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+            results = [result for batch_results in executor.map(
+                in_current_context(lambda batch: start_batch_execution(s3, stepfunctions, state_machine_arn, batch)),
+                batches
+            ) for result in batch_results]
+
+        # Collect the SQS messages that were malformed or whose execution could not be started, to be retried or dead-lettered
+        failed_message_ids = dict.fromkeys(malformed_message_ids + [
+            s3_object['message_id']
+            for s3_object, result in zip(s3_objects, results)
+            if result['status'] == FAILED and s3_object['message_id']
+        ])
+        batch_item_failures = [{'itemIdentifier': message_id} for message_id in failed_message_ids]
+
+        # Report the malformed records after the started ones
+        results.extend(malformed)
+
+        # Count the failed records & log the summary
+        failed_count = sum(1 for result in results if result['status'] == FAILED)
+        logger.info("Started Step Functions execution(s) for %d of %d record(s).", len(results) - failed_count, len(results))
+
+        # Return 200 if every execution started, 207 on partial failure, and 500 if none did
+        if failed_count == 0:
+            status_code = 200
+        elif failed_count < len(results):
+            status_code = 207
+        else:
+            status_code = 500
+
+        # Return the per-record results
         return {
-            'statusCode': 500,
-            'body': json.dumps(f'Error starting Step Function execution: {str(e)}')
+            'statusCode': status_code,
+            'body': json.dumps({'results': results}),
+            'batchItemFailures': batch_item_failures
         }
 
     # Handle the finalization of the function
     finally:
 
         # Log the completion of the Lambda function execution
-        logger.debug("Lambda function execution completed for bucket: %s, key: %s", bucket, key)
+        logger.debug("Lambda function execution completed for %d record(s).", len(s3_objects))
@@ -0,0 +1,121 @@
+"""Run the SpeakEasy pipeline locally against fake AWS services.
+
+Usage:
+    python -m local_runner [FILE ...] [--languages es,fr] [--profile behaviour.json]
+                           [--latency-scale 0] [--fail translate.TranslateText=0.2]
+                           [--transcript-words 500] [--parallel 2] [--backfill] [--set NAME=VALUE] [--json]
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+from typing import Any, Dict, List
+
+from local_runner.pipeline import REPO_DIR, LocalPipeline
+from local_runner.fake_aws import FakeBehaviour, generate_text
+
+def parse_assignments(values: List[str]) -> Dict[str, str]:
+    """Parse NAME=VALUE arguments.
+
+    Args:
+        values (List[str]): The arguments.
+
+    Returns:
+        Dict[str, str]: The values by name.
+    """
+
+    # Split each argument at the first '='
+    return dict(value.split('=', 1) for value in values)
+
+def build_behaviour(args: argparse.Namespace) -> FakeBehaviour:
+    """Build the injected behaviour from the profile and the command line.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+
+    Returns:
+        FakeBehaviour: The behaviour.
+    """
+
+    # Start from the profile, if any
+    config: Dict[str, Any] = {}
+    if args.profile:
+        with open(args.profile, 'r', encoding='utf-8') as profile_file:
+            config = json.load(profile_file)
+
+    # Apply the command line overrides
+    if args.latency_scale is not None:
+        config['latency_scale'] = args.latency_scale
+    for operation, rate in parse_assignments(args.fail).items():
+        config.setdefault('operations', {}).setdefault(operation, {})['failure_rate'] = float(rate)
+    return FakeBehaviour(config)
+
+def main() -> int:
+    """Run the pipeline for the given files and print a report.
+
+    Returns:
+        int: The exit code, 1 if any execution failed.
+    """
+
+    # Parse the command line
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('files', nargs='*', help='audio files to process (default: audio_inputs/*.mp3)')
+    parser.add_argument('--languages', help='target languages, e.g. es,fr (default: from the template)')
+    parser.add_argument('--profile', help='JSON file with the latency and failure settings')
+    parser.add_argument('--latency-scale', type=float, help='multiplier of the injected latency, 0 to disable')
+    parser.add_argument('--fail', action='append', default=[], metavar='OPERATION=RATE',
+                        help='failure rate of an operation, e.g. translate.TranslateText=0.2')
+    parser.add_argument('--transcript-words', type=int, help='words in each transcript (default: from the audio size)')
+    parser.add_argument('--parallel', type=int, default=1, help='executions run at once (default: 1)')
+    parser.add_argument('--backfill', action='store_true', help='process the files through the backfill function instead of the trigger')
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUE', help='environment variable for the handlers')
+    parser.add_argument('--log-level', default='WARNING', help='log level of the handlers (default: WARNING)')
+    parser.add_argument('--json', action='store_true', help='print the full report as JSON')
+    args = parser.parse_args()
+
+    # Configure the handlers
+    environment = {'LOG_LEVEL': args.log_level, 'LOG_FORMAT': 'text'}
+    if args.languages:
+        environment['TARGET_LANGUAGES'] = args.languages
+    environment.update(parse_assignments(args.set))
+    transcript_text = (lambda data: generate_text(args.transcript_words, len(data))) if args.transcript_words else None
+    pipeline = LocalPipeline(behaviour=build_behaviour(args), environment=environment, transcript_text=transcript_text)
+
+    # Upload the files
+    files = args.files or sorted(glob.glob(os.path.join(REPO_DIR, 'audio_inputs', '*.mp3')))
+    keys = []
+    for path in files:
+        key = f'audio_inputs/{os.path.basename(path)}'
+        with open(path, 'rb') as audio_file:
+            pipeline.upload(key, audio_file.read())
+        keys.append(key)
+
+    # Process them
+    report = pipeline.backfill('audio_inputs/', args.parallel) if args.backfill else pipeline.process(keys, args.parallel)
+    report['objects'] = pipeline.s3.keys(pipeline.bucket)
+
+    # Print the report as JSON
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+    else:
+
+        # Print each execution with its states
+        for execution in report['executions']:
+            print(f"{execution['key']}: {execution['status']} in {execution['elapsed_ms']} ms "
+                  f"(+{execution['wait_seconds']:.0f} s simulated waits)")
+            if execution['status'] == 'FAILED':
+                print(f"  {execution['error']}: {execution['cause']}")
+            for state in execution['history']:
+                print(f"  {state['state']:<48}{state['elapsed_ms']:>10} ms")
+        print(f"Total: {report['elapsed_ms']} ms for {len(keys)} file(s)")
+        print('Objects:')
+        for key in report['objects']:
+            print(f'  {key}')
+
+    # Fail if any execution failed
+    return 1 if any(execution['status'] != 'SUCCEEDED' for execution in report['executions']) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
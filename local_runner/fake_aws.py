@@ -0,0 +1,838 @@
+import copy
+import hashlib
+import io
+import json
+import random
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+from botocore.exceptions import ClientError
+from helpers.metrics import get_metrics
+
+# Latency and fault settings of each operation, keyed by 'service.Operation' or 'service.*'
+DEFAULT_OPERATIONS: Dict[str, Dict[str, Any]] = {
+    's3.*': {'latency_ms': 15, 'per_kb_ms': 0.02},
+    's3.CopyObject': {'latency_ms': 40},
+    's3.ListObjectsV2': {'latency_ms': 30},
+    'transcribe.*': {'latency_ms': 60},
+    'translate.TranslateText': {'latency_ms': 120, 'per_kb_ms': 25},
+    'polly.SynthesizeSpeech': {'latency_ms': 150, 'per_kb_ms': 80},
+    'stepfunctions.*': {'latency_ms': 40},
+}
+
+# Default duration of a transcription job, in simulated seconds
+DEFAULT_JOB_SECONDS = 15
+
+# Default additional duration of a transcription job per MB of audio, in simulated seconds
+DEFAULT_JOB_SECONDS_PER_MB = 20
+
+# Words spoken per MB of MP3 audio (about a minute at 128 kbps)
+WORDS_PER_MB = 150
+
+# Bytes of MP3 audio returned per character synthesized (about 16 KB per second of speech)
+DEFAULT_AUDIO_BYTES_PER_CHARACTER = 1000
+
+# Words used to generate transcripts
+VOCABULARY = ('the', 'quick', 'brown', 'fox', 'jumps', 'over', 'lazy', 'dog', 'audio', 'speech', 'system',
+              'translate', 'voice', 'today', 'we', 'will', 'process', 'files', 'and', 'listen', 'carefully')
+
+def generate_text(words: int, seed: int = 0) -> str:
+    """Generate a deterministic English-like text of sentences.
+
+    Args:
+        words (int): The number of words.
+        seed (int): The seed of the generator.
+
+    Returns:
+        str: The text.
+    """
+
+    # Build sentences of five to fifteen words
+    rng = random.Random(seed)
+    sentences = []
+    remaining = max(1, words)
+    while remaining > 0:
+        length = min(remaining, rng.randint(5, 15))
+        sentence = ' '.join(rng.choice(VOCABULARY) for _ in range(length))
+        sentences.append(sentence.capitalize() + '.')
+        remaining -= length
+
+    # Join the sentences
+    return ' '.join(sentences)
+
+def client_error(code: str, message: str, operation: str, status: int = 400) -> ClientError:
+    """Build a botocore ClientError like the ones real clients raise.
+
+    Args:
+        code (str): The error code.
+        message (str): The error message.
+        operation (str): The operation name.
+        status (int): The HTTP status code.
+
+    Returns:
+        ClientError: The error.
+    """
+
+    # Build the error response
+    return ClientError({'Error': {'Code': code, 'Message': message}, 'ResponseMetadata': {'HTTPStatusCode': status}}, operation)
+
+class VirtualClock:
+    """A clock that Wait states advance instead of sleeping."""
+
+    def __init__(self) -> None:
+        """Initialize the clock at the current time."""
+
+        # Start with no simulated time
+        self.offset = 0.0
+        self._lock = threading.Lock()
+
+    def now(self) -> float:
+        """Get the simulated time.
+
+        Returns:
+            float: The wall-clock time plus the simulated seconds, in seconds.
+        """
+
+        # Add the simulated seconds to the wall clock
+        return time.time() + self.offset
+
+    def advance(self, seconds: float) -> None:
+        """Move the clock forward.
+
+        Args:
+            seconds (float): The number of seconds to skip.
+        """
+
+        # Add to the simulated seconds
+        with self._lock:
+            self.offset += max(0.0, seconds)
+
+class FakeBehaviour:
+    """Latency and failures injected into the fake services.
+
+    The configuration is a JSON-friendly dictionary:
+
+        {
+            "seed": 1,
+            "latency_scale": 1.0,
+            "operations": {
+                "translate.TranslateText": {"latency_ms": 120, "per_kb_ms": 25, "jitter_ms": 20,
+                                            "failure_rate": 0.1, "fail_first": 0,
+                                            "error_code": "ThrottlingException"}
+            },
+            "transcribe": {"job_seconds": 15, "job_seconds_per_mb": 20, "job_failure_rate": 0.0},
+            "polly": {"audio_bytes_per_character": 1000}
+        }
+
+    Operation settings are merged over DEFAULT_OPERATIONS, and 'service.*' applies to every
+    operation of a service without its own entry.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None) -> None:
+        """Initialize the behaviour.
+
+        Args:
+            config (Optional[Dict[str, Any]]): The configuration, or None for the defaults.
+        """
+
+        # Merge the configuration over the defaults
+        config = config or {}
+        self.operations = copy.deepcopy(DEFAULT_OPERATIONS)
+        for operation, settings in config.get('operations', {}).items():
+            self.operations.setdefault(operation, {}).update(settings)
+        self.latency_scale = float(config.get('latency_scale', 1.0))
+        self.transcribe = dict(config.get('transcribe', {}))
+        self.polly = dict(config.get('polly', {}))
+        self.random = random.Random(config.get('seed', 0))
+        self.calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def settings(self, service: str, operation: str) -> Dict[str, Any]:
+        """Get the settings of an operation.
+
+        Args:
+            service (str): The service name.
+            operation (str): The operation name.
+
+        Returns:
+            Dict[str, Any]: The settings of the service, overridden by those of the operation.
+        """
+
+        # Merge the operation settings over the service settings
+        settings = dict(self.operations.get(f'{service}.*', {}))
+        settings.update(self.operations.get(f'{service}.{operation}', {}))
+        return settings
+
+    def apply(self, service: str, operation: str, size: int = 0) -> None:
+        """Inject the latency and failures of one call.
+
+        Args:
+            service (str): The service name.
+            operation (str): The operation name.
+            size (int): The payload size of the call, in bytes.
+
+        Raises:
+            ClientError: If a failure is injected.
+        """
+
+        # Count the call and draw the random values under the lock
+        settings = self.settings(service, operation)
+        with self._lock:
+            name = f'{service}.{operation}'
+            self.calls[name] = self.calls.get(name, 0) + 1
+            call_number = self.calls[name]
+            jitter = self.random.uniform(-1, 1) * settings.get('jitter_ms', 0)
+            fails = call_number <= settings.get('fail_first', 0) or self.random.random() < settings.get('failure_rate', 0)
+
+        # Sleep for the modelled latency
+        latency_ms = settings.get('latency_ms', 0) + settings.get('per_kb_ms', 0) * size / 1024 + jitter
+        if latency_ms > 0 and self.latency_scale > 0:
+            time.sleep(latency_ms * self.latency_scale / 1000)
+
+        # Raise the injected failure
+        if fails:
+            raise client_error(settings.get('error_code', 'ThrottlingException'), 'Injected failure', operation,
+                               settings.get('error_status', 400))
+
+class FakeService:
+    """Base class of the fake clients, injecting behaviour and recording metrics for each call."""
+
+    # Service name, as used by Boto3
+    service_name = ''
+
+    def __init__(self, behaviour: FakeBehaviour) -> None:
+        """Initialize the fake service.
+
+        Args:
+            behaviour (FakeBehaviour): The latency and failures to inject.
+        """
+
+        # Keep the behaviour, and describe the client like Boto3's client.meta
+        self.behaviour = behaviour
+        self.meta = SimpleNamespace(region_name='us-east-1')
+
+    def _call(self, operation: str, size: int, action: Callable[[], Any]) -> Any:
+        """Run one call with the injected behaviour and record it in the invocation metrics.
+
+        Args:
+            operation (str): The operation name.
+            size (int): The payload size of the call, in bytes.
+            action (Callable[[], Any]): The work of the call.
+
+        Returns:
+            Any: The response.
+        """
+
+        # Run the call and record it, failed or not
+        started = time.perf_counter()
+        try:
+            self.behaviour.apply(self.service_name, operation, size)
+            response = action()
+        except ClientError:
+            get_metrics().record_api_call(f'{self.service_name}.{operation}', (time.perf_counter() - started) * 1000, error=True)
+            raise
+        get_metrics().record_api_call(f'{self.service_name}.{operation}', (time.perf_counter() - started) * 1000)
+        return response
+
+class FakeBody:
+    """A streaming body over bytes, like botocore's StreamingBody."""
+
+    def __init__(self, data: bytes) -> None:
+        """Initialize the body.
+
+        Args:
+            data (bytes): The content.
+        """
+
+        # Wrap the content in a stream
+        self._stream = io.BytesIO(data)
+
+    def read(self, amt: Optional[int] = None) -> bytes:
+        """Read from the body.
+
+        Args:
+            amt (Optional[int]): The number of bytes to read, or None for the rest.
+
+        Returns:
+            bytes: The data read.
+        """
+
+        # Read from the stream
+        return self._stream.read(amt if amt is not None else -1)
+
+    def iter_chunks(self, chunk_size: int = 1024) -> Iterator[bytes]:
+        """Iterate over the body in chunks.
+
+        Args:
+            chunk_size (int): The size of each chunk.
+
+        Returns:
+            Iterator[bytes]: The chunks.
+        """
+
+        # Read until the end of the stream
+        return iter(lambda: self.read(chunk_size), b'')
+
+    def close(self) -> None:
+        """Close the body."""
+
+        # Close the stream
+        self._stream.close()
+
+class FakePaginator:
+    """A paginator over a fake list operation."""
+
+    def __init__(self, method: Callable[..., Dict[str, Any]]) -> None:
+        """Initialize the paginator.
+
+        Args:
+            method (Callable[..., Dict[str, Any]]): The list method to page through.
+        """
+
+        # Keep the list method
+        self.method = method
+
+    def paginate(self, **kwargs: Any) -> Iterator[Dict[str, Any]]:
+        """Yield every page of the listing.
+
+        Args:
+            **kwargs (Any): The arguments of the list method.
+
+        Returns:
+            Iterator[Dict[str, Any]]: The pages.
+        """
+
+        # Follow the continuation tokens
+        while True:
+            page = self.method(**kwargs)
+            yield page
+            if not page.get('IsTruncated'):
+                return
+            kwargs['ContinuationToken'] = page['NextContinuationToken']
+
+class FakeS3(FakeService):
+    """An in-memory S3 with the operations the handlers use."""
+
+    service_name = 's3'
+
+    def __init__(self, behaviour: FakeBehaviour) -> None:
+        """Initialize an empty store.
+
+        Args:
+            behaviour (FakeBehaviour): The latency and failures to inject.
+        """
+
+        # Initialize the objects and the multipart uploads in progress
+        super().__init__(behaviour)
+        self.objects: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.uploads: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def store(self, bucket: str, key: str, data: bytes, metadata: Optional[Dict[str, str]] = None,
+              content_type: Optional[str] = None) -> Dict[str, Any]:
+        """Store an object directly, without latency or metrics.
+
+        Args:
+            bucket (str): The bucket.
+            key (str): The key.
+            data (bytes): The content.
+            metadata (Optional[Dict[str, str]]): The user metadata.
+            content_type (Optional[str]): The content type.
+
+        Returns:
+            Dict[str, Any]: The stored object.
+        """
+
+        # Build the object and its single-part ETag
+        entry = {
+            'Body': bytes(data),
+            'ETag': f'"{hashlib.md5(data).hexdigest()}"',
+            'LastModified': datetime.now(timezone.utc),
+            'Metadata': dict(metadata or {}),
+            'ContentType': content_type or 'binary/octet-stream'
+        }
+
+        # Save the object
+        with self._lock:
+            self.objects.setdefault(bucket, {})[key] = entry
+        return entry
+
+    def load(self, bucket: str, key: str) -> Optional[bytes]:
+        """Read an object directly, without latency or metrics.
+
+        Args:
+            bucket (str): The bucket.
+            key (str): The key.
+
+        Returns:
+            Optional[bytes]: The content, or None if there is no such object.
+        """
+
+        # Look up the object
+        entry = self.objects.get(bucket, {}).get(key)
+        return entry['Body'] if entry else None
+
+    def keys(self, bucket: str, prefix: str = '') -> List[str]:
+        """List the keys of a bucket directly.
+
+        Args:
+            bucket (str): The bucket.
+            prefix (str): The prefix to filter on.
+
+        Returns:
+            List[str]: The sorted keys.
+        """
+
+        # Filter and sort the keys
+        return sorted(key for key in self.objects.get(bucket, {}) if key.startswith(prefix))
+
+    def _get(self, bucket: str, key: str, operation: str) -> Dict[str, Any]:
+        """Get a stored object or raise the error S3 would.
+
+        Args:
+            bucket (str): The bucket.
+            key (str): The key.
+            operation (str): The operation name, for the error.
+
+        Returns:
+            Dict[str, Any]: The stored object.
+
+        Raises:
+            ClientError: If there is no such object.
+        """
+
+        # Look up the object
+        entry = self.objects.get(bucket, {}).get(key)
+        if entry is None:
+            if operation == 'HeadObject':
+                raise client_error('404', 'Not Found', operation, 404)
+            raise client_error('NoSuchKey', 'The specified key does not exist.', operation, 404)
+        return entry
+
+    @staticmethod
+    def _read_body(body: Any) -> bytes:
+        """Turn a request body into bytes.
+
+        Args:
+            body (Any): The body, as bytes, text, or a file-like object.
+
+        Returns:
+            bytes: The content.
+        """
+
+        # Convert the body
+        if isinstance(body, str):
+            return body.encode('utf-8')
+        if hasattr(body, 'read'):
+            return body.read()
+        return bytes(body or b'')
+
+    def head_object(self, Bucket: str, Key: str, **kwargs: Any) -> Dict[str, Any]:
+        """Get the metadata of an object."""
+
+        # Return the object metadata
+        def action() -> Dict[str, Any]:
+            entry = self._get(Bucket, Key, 'HeadObject')
+            return {'ContentLength': len(entry['Body']), 'ETag': entry['ETag'], 'LastModified': entry['LastModified'],
+                    'Metadata': dict(entry['Metadata']), 'ContentType': entry['ContentType']}
+        return self._call('HeadObject', 0, action)
+
+    def get_object(self, Bucket: str, Key: str, Range: Optional[str] = None, **kwargs: Any) -> Dict[str, Any]:
+        """Get an object, or a byte range of it."""
+
+        # Look up the object first, so the latency reflects its size
+        entry = self.objects.get(Bucket, {}).get(Key)
+        data = entry['Body'] if entry else b''
+
+        # Apply the range, e.g. 'bytes=0-1023'
+        if Range:
+            start, _, end = Range.replace('bytes=', '').partition('-')
+            data = data[int(start):int(end) + 1 if end else None]
+
+        # Return the content
+        def action() -> Dict[str, Any]:
+            entry = self._get(Bucket, Key, 'GetObject')
+            get_metrics().add_bytes('s3_read', len(data))
+            return {'Body': FakeBody(data), 'ContentLength': len(data), 'ETag': entry['ETag'],
+                    'LastModified': entry['LastModified'], 'Metadata': dict(entry['Metadata']),
+                    'ContentType': entry['ContentType']}
+        return self._call('GetObject', len(data), action)
+
+    def put_object(self, Bucket: str, Key: str, Body: Any = b'', ContentType: Optional[str] = None,
+                   Metadata: Optional[Dict[str, str]] = None, **kwargs: Any) -> Dict[str, Any]:
+        """Store an object."""
+
+        # Store the content
+        data = self._read_body(Body)
+        def action() -> Dict[str, Any]:
+            get_metrics().add_bytes('s3_written', len(data))
+            return {'ETag': self.store(Bucket, Key, data, Metadata, ContentType)['ETag']}
+        return self._call('PutObject', len(data), action)
+
+    def copy_object(self, Bucket: str, Key: str, CopySource: Dict[str, str], **kwargs: Any) -> Dict[str, Any]:
+        """Copy an object server-side."""
+
+        # Copy the content and metadata unless they are replaced
+        def action() -> Dict[str, Any]:
+            source = self._get(CopySource['Bucket'], CopySource['Key'], 'CopyObject')
+            replace = kwargs.get('MetadataDirective') == 'REPLACE'
+            entry = self.store(Bucket, Key, source['Body'],
+                               kwargs.get('Metadata') if replace else source['Metadata'],
+                               kwargs.get('ContentType') if replace else source['ContentType'])
+            return {'CopyObjectResult': {'ETag': entry['ETag'], 'LastModified': entry['LastModified']}}
+        return self._call('CopyObject', 0, action)
+
+    def delete_object(self, Bucket: str, Key: str, **kwargs: Any) -> Dict[str, Any]:
+        """Delete an object."""
+
+        # Remove the object if it exists
+        def action() -> Dict[str, Any]:
+            with self._lock:
+                self.objects.get(Bucket, {}).pop(Key, None)
+            return {}
+        return self._call('DeleteObject', 0, action)
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = '', MaxKeys: int = 1000, ContinuationToken: Optional[str] = None,
+                        StartAfter: Optional[str] = None, **kwargs: Any) -> Dict[str, Any]:
+        """List objects in key order, a page at a time."""
+
+        # List the keys after the token or the start key
+        def action() -> Dict[str, Any]:
+            after = ContinuationToken or StartAfter or ''
+            keys = [key for key in self.keys(Bucket, Prefix) if key > after]
+            page, rest = keys[:MaxKeys], keys[MaxKeys:]
+            contents = [{'Key': key, 'Size': len(self.objects[Bucket][key]['Body']),
+                         'ETag': self.objects[Bucket][key]['ETag'],
+                         'LastModified': self.objects[Bucket][key]['LastModified']} for key in page]
+            response = {'Contents': contents, 'KeyCount': len(contents), 'IsTruncated': bool(rest), 'Prefix': Prefix}
+            if rest:
+                response['NextContinuationToken'] = page[-1]
+            return response
+        return self._call('ListObjectsV2', 0, action)
+
+    def get_paginator(self, operation_name: str) -> FakePaginator:
+        """Get a paginator; only list_objects_v2 is supported."""
+
+        # Page through list_objects_v2
+        if operation_name != 'list_objects_v2':
+            raise NotImplementedError(f'No fake paginator for {operation_name}')
+        return FakePaginator(self.list_objects_v2)
+
+    def create_multipart_upload(self, Bucket: str, Key: str, ContentType: Optional[str] = None,
+                                Metadata: Optional[Dict[str, str]] = None, **kwargs: Any) -> Dict[str, Any]:
+        """Start a multipart upload."""
+
+        # Register the upload
+        def action() -> Dict[str, Any]:
+            upload_id = uuid.uuid4().hex
+            with self._lock:
+                self.uploads[upload_id] = {'Bucket': Bucket, 'Key': Key, 'Parts': {}, 'ContentType': ContentType, 'Metadata': Metadata}
+            return {'Bucket': Bucket, 'Key': Key, 'UploadId': upload_id}
+        return self._call('CreateMultipartUpload', 0, action)
+
+    def upload_part(self, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body: Any, **kwargs: Any) -> Dict[str, Any]:
+        """Upload one part of a multipart upload."""
+
+        # Keep the part
+        data = self._read_body(Body)
+        def action() -> Dict[str, Any]:
+            upload = self.uploads.get(UploadId)
+            if upload is None:
+                raise client_error('NoSuchUpload', 'The specified upload does not exist.', 'UploadPart', 404)
+            get_metrics().add_bytes('s3_written', len(data))
+            upload['Parts'][PartNumber] = data
+            return {'ETag': f'"{hashlib.md5(data).hexdigest()}"'}
+        return self._call('UploadPart', len(data), action)
+
+    def complete_multipart_upload(self, Bucket: str, Key: str, UploadId: str, MultipartUpload: Dict[str, Any],
+                                  **kwargs: Any) -> Dict[str, Any]:
+        """Assemble the parts of a multipart upload into the object."""
+
+        # Join the listed parts in order
+        def action() -> Dict[str, Any]:
+            with self._lock:
+                upload = self.uploads.pop(UploadId, None)
+            if upload is None:
+                raise client_error('NoSuchUpload', 'The specified upload does not exist.', 'CompleteMultipartUpload', 404)
+            data = b''.join(upload['Parts'][part['PartNumber']] for part in MultipartUpload['Parts'])
+            entry = self.store(Bucket, Key, data, upload['Metadata'], upload['ContentType'])
+            entry['ETag'] = f'"{hashlib.md5(data).hexdigest()}-{len(MultipartUpload["Parts"])}"'
+            return {'Bucket': Bucket, 'Key': Key, 'ETag': entry['ETag']}
+        return self._call('CompleteMultipartUpload', 0, action)
+
+    def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str, **kwargs: Any) -> Dict[str, Any]:
+        """Discard a multipart upload."""
+
+        # Drop the upload
+        def action() -> Dict[str, Any]:
+            with self._lock:
+                self.uploads.pop(UploadId, None)
+            return {}
+        return self._call('AbortMultipartUpload', 0, action)
+
+class FakeTranscribe(FakeService):
+    """Amazon Transcribe jobs that complete after a simulated duration and write their JSON output to the fake S3."""
+
+    service_name = 'transcribe'
+
+    def __init__(self, behaviour: FakeBehaviour, s3: FakeS3, clock: VirtualClock, region: str = 'us-east-1',
+                 transcript_text: Optional[Callable[[bytes], str]] = None) -> None:
+        """Initialize the fake service.
+
+        Args:
+            behaviour (FakeBehaviour): The latency and failures to inject.
+            s3 (FakeS3): The fake S3 holding the media and receiving the output.
+            clock (VirtualClock): The clock the job durations are measured on.
+            region (str): The region used in the transcript URIs.
+            transcript_text (Optional[Callable[[bytes], str]]): Builds the transcript of some audio,
+                by default a generated text of about WORDS_PER_MB words per MB.
+        """
+
+        # Keep the collaborators and initialize the jobs
+        super().__init__(behaviour)
+        self.s3 = s3
+        self.clock = clock
+        self.region = region
+        self.transcript_text = transcript_text or (lambda data: generate_text(max(20, int(len(data) / 1e6 * WORDS_PER_MB)), len(data)))
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def start_transcription_job(self, TranscriptionJobName: str, Media: Dict[str, str], OutputBucketName: str,
+                                OutputKey: str, LanguageCode: str = 'en-US', **kwargs: Any) -> Dict[str, Any]:
+        """Start a transcription job."""
+
+        # Register the job with its simulated completion time
+        def action() -> Dict[str, Any]:
+            bucket, _, key = Media['MediaFileUri'].replace('s3://', '', 1).partition('/')
+            data = self.s3.load(bucket, key)
+            if data is None:
+                raise client_error('BadRequestException', 'The media file could not be found.', 'StartTranscriptionJob')
+            settings = self.behaviour.transcribe
+            duration = settings.get('job_seconds', DEFAULT_JOB_SECONDS) + settings.get('job_seconds_per_mb', DEFAULT_JOB_SECONDS_PER_MB) * len(data) / 1e6
+            with self._lock:
+                if TranscriptionJobName in self.jobs:
+                    raise client_error('ConflictException', 'The requested job name already exists.', 'StartTranscriptionJob')
+                fails = self.behaviour.random.random() < settings.get('job_failure_rate', 0)
+                self.jobs[TranscriptionJobName] = {
+                    'TranscriptionJobName': TranscriptionJobName, 'TranscriptionJobStatus': 'IN_PROGRESS',
+                    'LanguageCode': LanguageCode, 'Media': Media, 'started_at': self.clock.now(), 'ready_at': self.clock.now() + duration,
+                    'fails': fails, 'data': data, 'output': (OutputBucketName, OutputKey)
+                }
+            return {'TranscriptionJob': {'TranscriptionJobName': TranscriptionJobName, 'TranscriptionJobStatus': 'IN_PROGRESS'}}
+        return self._call('StartTranscriptionJob', 0, action)
+
+    def _update_job(self, job: Dict[str, Any]) -> None:
+        """Complete or fail a job once its simulated duration has passed. The lock must be held.
+
+        Args:
+            job (Dict[str, Any]): The job.
+        """
+
+        # Finish the job when it is due, writing its output
+        if job['TranscriptionJobStatus'] == 'IN_PROGRESS' and self.clock.now() >= job['ready_at']:
+            if job['fails']:
+                job['TranscriptionJobStatus'] = 'FAILED'
+                job['FailureReason'] = 'Injected failure'
+            else:
+                bucket, key = job['output']
+                text = self.transcript_text(job['data'])
+                output = {'jobName': job['TranscriptionJobName'], 'results': {'transcripts': [{'transcript': text}], 'items': []}}
+                self.s3.store(bucket, key, json.dumps(output).encode('utf-8'), content_type='application/json')
+                job['TranscriptionJobStatus'] = 'COMPLETED'
+
+    def next_ready_at(self) -> Optional[float]:
+        """Get the virtual time the next running job finishes at.
+
+        Returns:
+            Optional[float]: The time, or None if no job is running.
+        """
+
+        # Find the earliest running job
+        with self._lock:
+            times = [job['ready_at'] for job in self.jobs.values() if job['TranscriptionJobStatus'] == 'IN_PROGRESS']
+        return min(times) if times else None
+
+    def take_state_changes(self) -> List[Dict[str, Any]]:
+        """Finish the jobs that are due and return their EventBridge state change events, once per job.
+
+        Returns:
+            List[Dict[str, Any]]: The 'Transcribe Job State Change' events.
+        """
+
+        # Finish the due jobs and announce the ones that completed or failed
+        events = []
+        with self._lock:
+            for job in self.jobs.values():
+                self._update_job(job)
+                if job['TranscriptionJobStatus'] != 'IN_PROGRESS' and not job.get('announced'):
+                    job['announced'] = True
+                    events.append({
+                        'version': '0', 'id': uuid.uuid4().hex, 'source': 'aws.transcribe',
+                        'detail-type': 'Transcribe Job State Change', 'region': self.region,
+                        'time': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                        'detail': {'TranscriptionJobName': job['TranscriptionJobName'],
+                                   'TranscriptionJobStatus': job['TranscriptionJobStatus']}
+                    })
+        return events
+
+    def get_transcription_job(self, TranscriptionJobName: str, **kwargs: Any) -> Dict[str, Any]:
+        """Get a transcription job, completing it once its simulated duration has passed."""
+
+        # Complete the job when it is due and describe it
+        def action() -> Dict[str, Any]:
+            with self._lock:
+                job = self.jobs.get(TranscriptionJobName)
+                if job is None:
+                    raise client_error('BadRequestException', 'The requested job couldn\'t be found.', 'GetTranscriptionJob')
+                self._update_job(job)
+                description = {name: value for name, value in job.items() if name[0].isupper()}
+                description['StartTime'] = datetime.fromtimestamp(time.time() - (self.clock.now() - job['started_at']), timezone.utc)
+                if job['TranscriptionJobStatus'] == 'COMPLETED':
+                    bucket, key = job['output']
+                    description['Transcript'] = {'TranscriptFileUri': f'https://s3.{self.region}.amazonaws.com/{bucket}/{key}'}
+                else:
+                    description['Transcript'] = {}
+                return {'TranscriptionJob': description}
+        return self._call('GetTranscriptionJob', 0, action)
+
+    def delete_transcription_job(self, TranscriptionJobName: str, **kwargs: Any) -> Dict[str, Any]:
+        """Delete a transcription job, so its name can be used again."""
+
+        # Forget the job
+        def action() -> Dict[str, Any]:
+            with self._lock:
+                if self.jobs.pop(TranscriptionJobName, None) is None:
+                    raise client_error('BadRequestException', 'The requested job couldn\'t be found.', 'DeleteTranscriptionJob')
+            return {}
+        return self._call('DeleteTranscriptionJob', 0, action)
+
+class FakeTranslate(FakeService):
+    """Amazon Translate that tags the text with the target language."""
+
+    service_name = 'translate'
+
+    # Maximum size of the text in a single request, in UTF-8 bytes
+    MAX_TEXT_BYTES = 10000
+
+    def translate_text(self, Text: str, SourceLanguageCode: str, TargetLanguageCode: str, **kwargs: Any) -> Dict[str, Any]:
+        """Translate a text."""
+
+        # Check the size limit and tag the text
+        size = len(Text.encode('utf-8'))
+        def action() -> Dict[str, Any]:
+            if size > self.MAX_TEXT_BYTES:
+                raise client_error('TextSizeLimitExceededException', 'Input text size exceeds limit.', 'TranslateText')
+            return {'TranslatedText': f'[{TargetLanguageCode}] {Text.strip()}', 'SourceLanguageCode': SourceLanguageCode,
+                    'TargetLanguageCode': TargetLanguageCode}
+        return self._call('TranslateText', size, action)
+
+class FakePolly(FakeService):
+    """Amazon Polly that returns silent MP3-like audio sized like real speech."""
+
+    service_name = 'polly'
+
+    # Maximum number of characters in a single request
+    MAX_CHARACTERS = 3000
+
+    def synthesize_speech(self, Text: str, OutputFormat: str, VoiceId: str, **kwargs: Any) -> Dict[str, Any]:
+        """Synthesize speech."""
+
+        # Check the size limit and build audio proportional to the text
+        def action() -> Dict[str, Any]:
+            if len(Text) > self.MAX_CHARACTERS:
+                raise client_error('TextLengthExceededException', 'Maximum text length has been exceeded.', 'SynthesizeSpeech')
+            size = len(Text) * self.behaviour.polly.get('audio_bytes_per_character', DEFAULT_AUDIO_BYTES_PER_CHARACTER)
+            audio = b'\xff\xfb\x90\x64' + bytes(max(0, size - 4))
+            return {'AudioStream': FakeBody(audio), 'ContentType': 'audio/mpeg', 'RequestCharacters': len(Text)}
+        return self._call('SynthesizeSpeech', len(Text.encode('utf-8')), action)
+
+class FakeStepFunctions(FakeService):
+    """Step Functions that records started executions and hands them to a callback, and collects task token results."""
+
+    service_name = 'stepfunctions'
+
+    def __init__(self, behaviour: FakeBehaviour, on_start: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> None:
+        """Initialize the fake service.
+
+        Args:
+            behaviour (FakeBehaviour): The latency and failures to inject.
+            on_start (Optional[Callable[[str, Dict[str, Any]], None]]): Called with the execution ARN
+                and input of each started execution.
+        """
+
+        # Keep the callback and initialize the executions
+        super().__init__(behaviour)
+        self.on_start = on_start
+        self.executions: List[Dict[str, Any]] = []
+        self.task_outcomes: Dict[str, Dict[str, Any]] = {}
+        self._closed_tokens: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def _close_task(self, operation: str, token: str, outcome: Dict[str, Any]) -> Dict[str, Any]:
+        """Record the result of a task token, which can only be sent once.
+
+        Args:
+            operation (str): The operation name.
+            token (str): The task token.
+            outcome (Dict[str, Any]): The 'output', or the 'error' and 'cause'.
+
+        Returns:
+            Dict[str, Any]: The empty response.
+        """
+
+        # Reject tokens that were already used
+        with self._lock:
+            if token in self._closed_tokens:
+                raise client_error('TaskTimedOut', 'Task Timed Out', operation)
+            self._closed_tokens.add(token)
+            self.task_outcomes[token] = outcome
+        return {}
+
+    def send_task_success(self, taskToken: str, output: str, **kwargs: Any) -> Dict[str, Any]:
+        """Complete the task waiting for a token."""
+
+        # Record the task output
+        def action() -> Dict[str, Any]:
+            return self._close_task('SendTaskSuccess', taskToken, {'output': json.loads(output)})
+        return self._call('SendTaskSuccess', len(output), action)
+
+    def send_task_failure(self, taskToken: str, error: str = '', cause: str = '', **kwargs: Any) -> Dict[str, Any]:
+        """Fail the task waiting for a token."""
+
+        # Record the task failure
+        def action() -> Dict[str, Any]:
+            return self._close_task('SendTaskFailure', taskToken, {'error': error, 'cause': cause})
+        return self._call('SendTaskFailure', len(cause), action)
+
+    def take_task_outcome(self, token: str) -> Optional[Dict[str, Any]]:
+        """Take the result sent for a task token, if any.
+
+        Args:
+            token (str): The task token.
+
+        Returns:
+            Optional[Dict[str, Any]]: The 'output', or the 'error' and 'cause', or None if nothing was sent yet.
+        """
+
+        # Remove and return the outcome
+        with self._lock:
+            return self.task_outcomes.pop(token, None)
+
+    def start_execution(self, stateMachineArn: str, input: str = '{}', name: Optional[str] = None, **kwargs: Any) -> Dict[str, Any]:
+        """Start an execution, whose name must not have been used before."""
+
+        # Record the execution and notify the callback
+        def action() -> Dict[str, Any]:
+            execution_arn = f"{stateMachineArn.replace(':stateMachine:', ':execution:')}:{name or uuid.uuid4().hex}"
+            execution = {'executionArn': execution_arn, 'input': json.loads(input), 'startDate': datetime.now(timezone.utc)}
+            with self._lock:
+                if any(started['executionArn'] == execution_arn for started in self.executions):
+                    raise client_error('ExecutionAlreadyExists', f'Execution Already Exists: {execution_arn}', 'StartExecution')
+                self.executions.append(execution)
+            if self.on_start is not None:
+                self.on_start(execution_arn, execution['input'])
+            return {'executionArn': execution_arn, 'startDate': execution['startDate']}
+        return self._call('StartExecution', len(input), action)
@@ -0,0 +1,430 @@
+import importlib
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Directory holding the repository
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Directory holding the Lambda handlers, which import their helpers as a top-level package
+LAMBDA_DIR = os.path.join(REPO_DIR, 'lambda')
+if LAMBDA_DIR not in sys.path:
+    sys.path.insert(0, LAMBDA_DIR)
+
+from helpers.clients import set_client
+from helpers.concurrency import in_current_context
+from local_runner.fake_aws import FakeBehaviour, FakePolly, FakeS3, FakeStepFunctions, FakeTranscribe, FakeTranslate, VirtualClock
+from local_runner.state_machine import ExecutionFailed, StateMachine, load_template
+
+# Default CloudFormation template describing the functions and the state machine
+DEFAULT_TEMPLATE = os.path.join(REPO_DIR, 'cloudformation', 'template.yaml')
+
+# Default bucket of the local runs
+DEFAULT_BUCKET = 'speakeasy-local'
+
+# Region used for the fake clients and the transcript URIs
+REGION = 'us-east-1'
+
+class FakeLambdaContext:
+    """The parts of the Lambda context object the handlers use."""
+
+    def __init__(self, function_name: str, timeout_seconds: float) -> None:
+        """Initialize the context of one invocation.
+
+        Args:
+            function_name (str): The function name.
+            timeout_seconds (float): The function timeout.
+        """
+
+        # Record the deadline of the invocation
+        self.function_name = function_name
+        self.aws_request_id = uuid.uuid4().hex
+        self.memory_limit_in_mb = 128
+        self._deadline = time.time() + timeout_seconds
+
+    def get_remaining_time_in_millis(self) -> int:
+        """Get the time left before the invocation times out.
+
+        Returns:
+            int: The remaining milliseconds.
+        """
+
+        # Count down to the deadline
+        return max(0, int((self._deadline - time.time()) * 1000))
+
+class LocalPipeline:
+    """Run the SpeakEasy pipeline in-process against fake AWS services.
+
+    The functions and the state machine are read from the CloudFormation template: each function's
+    handler and environment variables come from its resource and parameter defaults, and the state
+    machine definition is run by a local interpreter whose Task states call the handlers directly.
+    Wait states advance a virtual clock that the fake Transcribe jobs complete on, so nothing sleeps
+    except for the latency injected into the fake services. Callback tasks advance the clock to the
+    next job completion instead, and the job state change events are delivered to the functions
+    targeted by the template's EventBridge rules.
+
+    Handlers and the fake clients are module-level state, so one pipeline is active per process.
+    """
+
+    def __init__(self, template_path: str = DEFAULT_TEMPLATE, behaviour: Optional[FakeBehaviour] = None,
+                 bucket: str = DEFAULT_BUCKET, environment: Optional[Dict[str, str]] = None,
+                 transcript_text: Optional[Callable[[bytes], str]] = None) -> None:
+        """Set up the fake services, the environment and the state machine.
+
+        Args:
+            template_path (str): The CloudFormation template.
+            behaviour (Optional[FakeBehaviour]): The latency and failures to inject, or None for the defaults.
+            bucket (str): The bucket the audio is uploaded to.
+            environment (Optional[Dict[str, str]]): Environment variables overriding the template.
+            transcript_text (Optional[Callable[[bytes], str]]): Builds the transcript of some audio.
+        """
+
+        # Load the template
+        self.template = load_template(template_path)
+        self.bucket = bucket
+        self.behaviour = behaviour or FakeBehaviour()
+        self.clock = VirtualClock()
+
+        # Create the fake services and hand them to the handlers
+        self.executions: List[Dict[str, Any]] = []
+        self._executions_lock = threading.Lock()
+        self.s3 = FakeS3(self.behaviour)
+        self.transcribe = FakeTranscribe(self.behaviour, self.s3, self.clock, REGION, transcript_text)
+        self.translate = FakeTranslate(self.behaviour)
+        self.polly = FakePolly(self.behaviour)
+        self.stepfunctions = FakeStepFunctions(self.behaviour, self._record_execution)
+        for service_name, client in (('s3', self.s3), ('transcribe', self.transcribe), ('translate', self.translate),
+                                     ('polly', self.polly), ('stepfunctions', self.stepfunctions)):
+            set_client(service_name, client)
+
+        # Collect the functions and the event rules, apply their environment, and build the state machine
+        self.functions = self._load_functions()
+        self.event_rules = self._load_event_rules()
+        self._events_lock = threading.RLock()
+        os.environ.setdefault('AWS_DEFAULT_REGION', REGION)
+        os.environ.setdefault('METRICS_EMF', 'false')
+        for function in self.functions.values():
+            os.environ.update(function['environment'])
+        os.environ.update(environment or {})
+        definition = self._resources_of_type('AWS::StepFunctions::StateMachine')[0][1]['Properties']['Definition']
+        self.state_machine = StateMachine(definition, self._resolve_task, self.clock.advance, self._wait_for_task_token)
+
+    def _resources_of_type(self, resource_type: str) -> List[Any]:
+        """List the resources of a type.
+
+        Args:
+            resource_type (str): The CloudFormation resource type.
+
+        Returns:
+            List[Any]: The (logical ID, resource) pairs.
+        """
+
+        # Filter the resources
+        return [(name, resource) for name, resource in self.template['Resources'].items() if resource['Type'] == resource_type]
+
+    def _resolve_value(self, value: Any) -> Any:
+        """Resolve a template value to a plain string where it can be done locally.
+
+        Args:
+            value (Any): The value, possibly a Ref, GetAtt or Sub.
+
+        Returns:
+            Any: The resolved value, or None if it cannot be resolved.
+        """
+
+        # Resolve references to parameters and resources
+        if isinstance(value, dict) and 'Ref' in value:
+            parameter = self.template.get('Parameters', {}).get(value['Ref'], {})
+            return str(parameter['Default']) if 'Default' in parameter else value['Ref']
+        if isinstance(value, dict) and 'Fn::GetAtt' in value:
+            resource, attribute = value['Fn::GetAtt']
+            if self.template['Resources'][resource]['Type'] == 'AWS::StepFunctions::StateMachine':
+                return f'arn:aws:states:{REGION}:000000000000:stateMachine:{resource}'
+            return f'arn:aws:local:{REGION}:000000000000:{resource}/{attribute}'
+        if isinstance(value, dict) and 'Fn::Sub' in value and isinstance(value['Fn::Sub'], str):
+            return value['Fn::Sub'].replace('${AudioS3BucketName}-${Environment}', self.bucket)
+        if isinstance(value, dict):
+            return None
+        return str(value)
+
+    def _load_functions(self) -> Dict[str, Dict[str, Any]]:
+        """Read the Lambda functions from the template.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: The handler name, environment and timeout of each function, by logical ID.
+        """
+
+        # Resolve each function's handler and environment
+        functions = {}
+        for name, resource in self._resources_of_type('AWS::Lambda::Function'):
+            properties = resource['Properties']
+            variables = properties.get('Environment', {}).get('Variables', {})
+            environment = {key: self._resolve_value(value) for key, value in variables.items()}
+            functions[name] = {
+                'handler': self._resolve_value(properties['Handler']),
+                'environment': {key: value for key, value in environment.items() if value is not None},
+                'timeout': float(properties.get('Timeout', 3))
+            }
+        return functions
+
+    def _load_event_rules(self) -> List[Tuple[Dict[str, Any], List[str]]]:
+        """Read the EventBridge rules that target functions from the template.
+
+        Returns:
+            List[Tuple[Dict[str, Any], List[str]]]: The event pattern and the logical IDs of the targeted functions of each rule.
+        """
+
+        # Keep the pattern and the function targets of each rule
+        rules = []
+        for _, resource in self._resources_of_type('AWS::Events::Rule'):
+            properties = resource['Properties']
+            targets = [target['Arn']['Fn::GetAtt'][0] for target in properties.get('Targets', [])
+                       if isinstance(target.get('Arn'), dict) and 'Fn::GetAtt' in target['Arn']]
+            rules.append((properties.get('EventPattern', {}), [target for target in targets if target in self.functions]))
+        return rules
+
+    @staticmethod
+    def _matches_pattern(pattern: Dict[str, Any], event: Dict[str, Any]) -> bool:
+        """Check whether an event matches an EventBridge pattern of exact values.
+
+        Args:
+            pattern (Dict[str, Any]): The pattern, e.g. {'source': ['aws.transcribe']}.
+            event (Dict[str, Any]): The event.
+
+        Returns:
+            bool: Whether every field of the pattern matches.
+        """
+
+        # Match nested fields recursively and leaf fields against their list of values
+        for name, expected in pattern.items():
+            if isinstance(expected, dict):
+                if not isinstance(event.get(name), dict) or not LocalPipeline._matches_pattern(expected, event[name]):
+                    return False
+            elif event.get(name) not in expected:
+                return False
+        return True
+
+    def publish_event(self, event: Dict[str, Any]) -> List[Any]:
+        """Deliver an EventBridge event to the functions of the matching rules.
+
+        Args:
+            event (Dict[str, Any]): The event.
+
+        Returns:
+            List[Any]: The responses of the invoked functions.
+        """
+
+        # Invoke the targets of every matching rule
+        return [self.invoke(function, event) for pattern, functions in self.event_rules
+                if self._matches_pattern(pattern, event) for function in functions]
+
+    def _wait_for_task_token(self, token: str, timeout_seconds: Optional[float]) -> Tuple[Any, float]:
+        """Wait for the result sent for a task token, advancing the clock from one job completion to the next.
+
+        Args:
+            token (str): The task token.
+            timeout_seconds (Optional[float]): The state's TimeoutSeconds, if any.
+
+        Returns:
+            Tuple[Any, float]: The task output and the simulated seconds waited.
+
+        Raises:
+            ExecutionFailed: If the task was failed, or nothing is left that could send the result.
+        """
+
+        # Deliver the job state changes until the token's result arrives
+        waited = 0.0
+        while True:
+            with self._events_lock:
+                for event in self.transcribe.take_state_changes():
+                    self.publish_event(event)
+                outcome = self.stepfunctions.take_task_outcome(token)
+                if outcome is not None:
+                    if 'output' in outcome:
+                        return outcome['output'], waited
+                    raise ExecutionFailed(outcome['error'], outcome['cause'])
+
+                # Advance the clock to the next job completion
+                ready_at = self.transcribe.next_ready_at()
+                delay = max(0.0, ready_at - self.clock.now()) if ready_at is not None else None
+                if delay is None or (timeout_seconds is not None and waited + delay > timeout_seconds):
+                    raise ExecutionFailed('States.Timeout', 'No result was sent for the task token')
+                self.clock.advance(delay)
+                waited += delay
+
+    def invoke(self, function: str, event: Any) -> Any:
+        """Invoke a function's handler directly.
+
+        Args:
+            function (str): The logical ID of the function, e.g. 'TranslateLambda'.
+            event (Any): The event.
+
+        Returns:
+            Any: The handler's response.
+        """
+
+        # Import the handler module and call the handler
+        module_name, handler_name = self.functions[function]['handler'].rsplit('.', 1)
+        handler = getattr(importlib.import_module(module_name), handler_name)
+        return handler(event, FakeLambdaContext(function, self.functions[function]['timeout']))
+
+    def _resolve_task(self, resource: Any) -> Callable[[Any], Any]:
+        """Map a Task state's Resource to the handler it invokes.
+
+        Args:
+            resource (Any): The Resource, e.g. {'Fn::GetAtt': ['TranslateLambda', 'Arn']}, or the Lambda
+                service integration 'arn:aws:states:::lambda:invoke', with or without '.waitForTaskToken'.
+
+        Returns:
+            Callable[[Any], Any]: The function running the task.
+        """
+
+        # Invoke the function named in the parameters of the service integration
+        if isinstance(resource, str) and resource.startswith('arn:aws:states:::lambda:invoke'):
+            def invoke_integration(parameters: Dict[str, Any]) -> Dict[str, Any]:
+                function = parameters['FunctionName']['Fn::GetAtt'][0]
+                return {'StatusCode': 200, 'Payload': self.invoke(function, parameters.get('Payload', {}))}
+            return invoke_integration
+
+        # Invoke the function named by the GetAtt
+        function = resource['Fn::GetAtt'][0]
+        return lambda event: self.invoke(function, event)
+
+    def _record_execution(self, execution_arn: str, execution_input: Dict[str, Any]) -> None:
+        """Queue an execution started through the fake Step Functions.
+
+        Args:
+            execution_arn (str): The execution ARN.
+            execution_input (Dict[str, Any]): The execution input.
+        """
+
+        # Remember the execution so it can be run after the trigger returns
+        with self._executions_lock:
+            self.executions.append({'executionArn': execution_arn, 'input': execution_input})
+
+    def upload(self, key: str, data: bytes, metadata: Optional[Dict[str, str]] = None) -> None:
+        """Put an audio file into the fake bucket, without latency.
+
+        Args:
+            key (str): The key, e.g. 'audio_inputs/marvin.mp3'.
+            data (bytes): The audio.
+            metadata (Optional[Dict[str, str]]): The user metadata, e.g. {'target-languages': 'it,ja'}.
+        """
+
+        # Store the object
+        self.s3.store(self.bucket, key, data, metadata, 'audio/mpeg')
+
+    def run_execution(self, execution_input: Dict[str, Any], name: Optional[str] = None) -> Dict[str, Any]:
+        """Run the state machine for one execution input.
+
+        Args:
+            execution_input (Dict[str, Any]): The input, as the trigger would start it.
+            name (Optional[str]): The execution name.
+
+        Returns:
+            Dict[str, Any]: The execution result, with its 'elapsed_ms'.
+        """
+
+        # Run the execution and time it
+        started = time.perf_counter()
+        result = self.state_machine.run(execution_input, name or uuid.uuid4().hex)
+        result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    @staticmethod
+    def _execution_keys(execution_input: Dict[str, Any]) -> str:
+        """Describe the files an execution processes.
+
+        Args:
+            execution_input (Dict[str, Any]): The execution input, of one file or of a batch of 'items'.
+
+        Returns:
+            str: The key of the file, or the comma-separated keys of the batch.
+        """
+
+        # Join the keys of a batch
+        if 'items' in execution_input:
+            return ', '.join(item['key'] for item in execution_input['items'])
+        return execution_input.get('key')
+
+    def _run_started_executions(self, parallel: int) -> List[Dict[str, Any]]:
+        """Run the executions started since the queue was last emptied.
+
+        Args:
+            parallel (int): The number of executions run at once.
+
+        Returns:
+            List[Dict[str, Any]]: The execution results, with the key or keys of each.
+        """
+
+        # Take the queued executions
+        with self._executions_lock:
+            executions, self.executions = self.executions, []
+
+        # Run them, each in its own copy of the caller's context
+        with ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+            return list(executor.map(in_current_context(lambda execution: dict(self.run_execution(execution['input']),
+                                                                               key=self._execution_keys(execution['input']))),
+                                     executions))
+
+    def process(self, keys: List[str], parallel: int = 1) -> Dict[str, Any]:
+        """Process uploaded files end to end: trigger, then run each started execution.
+
+        Args:
+            keys (List[str]): The keys of the uploaded files.
+            parallel (int): The number of executions run at once.
+
+        Returns:
+            Dict[str, Any]: The trigger response, the execution results, and the total 'elapsed_ms'.
+        """
+
+        # Invoke the trigger with an S3 event for the keys
+        started = time.perf_counter()
+        with self._executions_lock:
+            self.executions = []
+        event = {'Records': [{'eventSource': 'aws:s3', 's3': {'bucket': {'name': self.bucket}, 'object': {'key': key}}}
+                             for key in keys]}
+        trigger_response = self.invoke('TriggerLambda', event)
+
+        # Run the started executions
+        results = self._run_started_executions(parallel)
+
+        # Return the results
+        return {'trigger': trigger_response, 'executions': results,
+                'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)}
+
+    def backfill(self, prefix: str = 'audio_inputs/', parallel: int = 1, backfill_id: Optional[str] = None) -> Dict[str, Any]:
+        """Process the files under a prefix through the backfill function, then run each started execution.
+
+        The function is invoked again with the same backfill ID until it reports the backfill
+        completed, as it would invoke itself after running out of time.
+
+        Args:
+            prefix (str): The prefix to backfill.
+            parallel (int): The number of executions run at once.
+            backfill_id (Optional[str]): The backfill ID, generated if not provided.
+
+        Returns:
+            Dict[str, Any]: The last backfill response, the execution results, and the total 'elapsed_ms'.
+        """
+
+        # Invoke the backfill function until it completes
+        started = time.perf_counter()
+        with self._executions_lock:
+            self.executions = []
+        event = {'bucket': self.bucket, 'prefix': prefix, 'backfill_id': backfill_id or uuid.uuid4().hex, 'continue': False}
+        while True:
+            backfill_response = self.invoke('BackfillLambda', event)
+            if backfill_response.get('status') != 'PAUSED':
+                break
+
+        # Run the started executions
+        results = self._run_started_executions(parallel)
+
+        # Return the results
+        return {'backfill': backfill_response, 'executions': results,
+                'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)}
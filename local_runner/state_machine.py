@@ -0,0 +1,651 @@
+import contextvars
+import copy
+import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+import yaml
+
+# Maximum number of state transitions before an execution is stopped
+MAX_TRANSITIONS = 1000
+
+# Marker of a value missing from the state data
+MISSING = object()
+
+# Path step selecting every item of a list, as in '$[*]'
+WILDCARD = object()
+
+class PathFilter(NamedTuple):
+    """A path step selecting the list items whose field compares to a literal, as in "$[?(@.status == 'COMPLETED')]"."""
+
+    field: str
+    operator: str
+    value: Any
+
+    def matches(self, item: Any) -> bool:
+        """Check whether a list item is selected.
+
+        Args:
+            item (Any): The list item.
+
+        Returns:
+            bool: Whether the item has the field and it compares to the value.
+        """
+
+        # Items without the field are never selected
+        if not isinstance(item, dict) or self.field not in item:
+            return False
+        return (item[self.field] == self.value) == (self.operator == '==')
+
+class ExecutionFailed(Exception):
+    """Raised inside an execution when a state fails."""
+
+    def __init__(self, error: str, cause: str) -> None:
+        """Initialize the failure.
+
+        Args:
+            error (str): The error name, e.g. 'States.TaskFailed'.
+            cause (str): The description of the failure.
+        """
+
+        # Keep the error and cause
+        super().__init__(f'{error}: {cause}')
+        self.error = error
+        self.cause = cause
+        self.wait_seconds = 0.0
+
+class CloudFormationLoader(yaml.SafeLoader):
+    """A YAML loader that reads CloudFormation short-form tags into their long form."""
+
+def _construct_tag(loader: CloudFormationLoader, tag_suffix: str, node: yaml.Node) -> Dict[str, Any]:
+    """Turn a tag such as !GetAtt or !Sub into its long form, e.g. {'Fn::GetAtt': [...]}.
+
+    Args:
+        loader (CloudFormationLoader): The loader.
+        tag_suffix (str): The tag name without the '!'.
+        node (yaml.Node): The tagged node.
+
+    Returns:
+        Dict[str, Any]: The long form.
+    """
+
+    # Read the tagged value
+    if isinstance(node, yaml.ScalarNode):
+        value = loader.construct_scalar(node)
+    elif isinstance(node, yaml.SequenceNode):
+        value = loader.construct_sequence(node, deep=True)
+    else:
+        value = loader.construct_mapping(node, deep=True)
+
+    # Ref keeps its name; GetAtt in scalar form is 'Resource.Attribute'
+    if tag_suffix == 'Ref':
+        return {'Ref': value}
+    if tag_suffix == 'GetAtt' and isinstance(value, str):
+        value = value.split('.', 1)
+    return {f'Fn::{tag_suffix}': value}
+
+CloudFormationLoader.add_multi_constructor('!', _construct_tag)
+
+def load_template(path: str) -> Dict[str, Any]:
+    """Load a CloudFormation template.
+
+    Args:
+        path (str): The path of the template.
+
+    Returns:
+        Dict[str, Any]: The template, with short-form tags in their long form.
+    """
+
+    # Parse the template
+    with open(path, 'r', encoding='utf-8') as template_file:
+        return yaml.load(template_file, Loader=CloudFormationLoader)
+
+def parse_path(path: str) -> List[Any]:
+    """Split a JSONPath such as '$.a.b[0]' or "$[?(@.status == 'FAILED')].language" into its steps.
+
+    Args:
+        path (str): The path, which must start at the root '$'.
+
+    Returns:
+        List[Any]: The field names, list indexes, WILDCARD and PathFilter steps.
+
+    Raises:
+        ValueError: If the path is not supported.
+    """
+
+    # Only paths from the root are supported
+    if path != '$' and not path.startswith('$.') and not path.startswith('$['):
+        raise ValueError(f'Unsupported path: {path}')
+
+    # Split the path into field names, indexes, wildcards and filters
+    steps: List[Any] = []
+    pattern = r"\.([^.\[]+)|\[(\d+)\]|(\[\*\])|\[\?\(@\.(\w+)\s*(==|!=)\s*'([^']*)'\)\]"
+    for name, index, wildcard, field, operator, value in re.findall(pattern, path[1:]):
+        if wildcard:
+            steps.append(WILDCARD)
+        elif field:
+            steps.append(PathFilter(field, operator, value))
+        else:
+            steps.append(int(index) if index else name)
+    return steps
+
+def get_path(data: Any, path: str, default: Any = MISSING) -> Any:
+    """Read the value at a JSONPath.
+
+    Paths with a wildcard or a filter select a list of values, which is empty when nothing matches.
+
+    Args:
+        data (Any): The state data.
+        path (str): The path.
+        default (Any): The value returned when the path does not exist; raises if not given.
+
+    Returns:
+        Any: The value.
+
+    Raises:
+        ExecutionFailed: If the path does not exist and no default is given.
+    """
+
+    # Follow each step of the path from every value selected so far
+    values = [data]
+    indefinite = False
+    for step in parse_path(path):
+        selected = []
+        for value in values:
+            if step is WILDCARD or isinstance(step, PathFilter):
+                indefinite = True
+                selected.extend(item for item in (value if isinstance(value, list) else [])
+                                if step is WILDCARD or step.matches(item))
+            elif isinstance(step, int) and isinstance(value, list) and step < len(value):
+                selected.append(value[step])
+            elif isinstance(step, str) and isinstance(value, dict) and step in value:
+                selected.append(value[step])
+            elif not indefinite and default is not MISSING:
+                return default
+            elif not indefinite:
+                raise ExecutionFailed('States.Runtime', f'Invalid path {path}: the input does not contain it')
+        values = selected
+    return values if indefinite else values[0]
+
+def evaluate_intrinsic(expression: str, data: Any) -> Any:
+    """Evaluate an intrinsic function such as 'States.ArrayLength($.items)'.
+
+    Args:
+        expression (str): The intrinsic function call, with a single path argument.
+        data (Any): The state data.
+
+    Returns:
+        Any: The result of the function.
+
+    Raises:
+        ExecutionFailed: If the function is not supported.
+    """
+
+    # Split the function name from its argument
+    match = re.fullmatch(r'(States\.\w+)\((\$[^)]*)\)', expression.strip())
+    if match and match.group(1) == 'States.ArrayLength':
+        value = get_path(data, match.group(2))
+        if not isinstance(value, list):
+            raise ExecutionFailed('States.IntrinsicFailure', f'{expression}: the argument is not an array')
+        return len(value)
+    raise ExecutionFailed('States.Runtime', f'Unsupported intrinsic function: {expression}')
+
+def set_path(data: Any, path: Optional[str], result: Any) -> Any:
+    """Place a result into the state data at a ResultPath.
+
+    Args:
+        data (Any): The state data.
+        path (Optional[str]): The ResultPath; '$' replaces the data and None discards the result.
+        result (Any): The result.
+
+    Returns:
+        Any: The new state data.
+    """
+
+    # Handle the paths that replace or keep the data
+    if path is None:
+        return data
+    steps = parse_path(path)
+    if not steps:
+        return result
+
+    # Create the parents and set the result on a copy of the data
+    data = copy.deepcopy(data) if isinstance(data, dict) else {}
+    target = data
+    for step in steps[:-1]:
+        if not isinstance(target.get(step), dict):
+            target[step] = {}
+        target = target[step]
+    target[steps[-1]] = result
+    return data
+
+def resolve_parameters(template: Any, data: Any, context: Dict[str, Any]) -> Any:
+    """Build the effective input from a Parameters or ItemSelector template.
+
+    Keys ending in '.$' take their value from a path into the data, from a path into the context
+    object when the path starts with '$$', or from an intrinsic function such as States.ArrayLength.
+
+    Args:
+        template (Any): The Parameters template.
+        data (Any): The state data.
+        context (Dict[str, Any]): The context object.
+
+    Returns:
+        Any: The effective input.
+    """
+
+    # Resolve dictionaries key by key
+    if isinstance(template, dict):
+        resolved = {}
+        for key, value in template.items():
+            if key.endswith('.$'):
+                if value.startswith('$$'):
+                    resolved[key[:-2]] = get_path(context, value[1:])
+                elif value.startswith('States.'):
+                    resolved[key[:-2]] = evaluate_intrinsic(value, data)
+                else:
+                    resolved[key[:-2]] = get_path(data, value)
+            else:
+                resolved[key] = resolve_parameters(value, data, context)
+        return resolved
+
+    # Resolve lists item by item
+    if isinstance(template, list):
+        return [resolve_parameters(item, data, context) for item in template]
+
+    # Keep anything else
+    return template
+
+def evaluate_rule(rule: Dict[str, Any], data: Any) -> bool:
+    """Evaluate a Choice rule.
+
+    Args:
+        rule (Dict[str, Any]): The rule.
+        data (Any): The state data.
+
+    Returns:
+        bool: Whether the rule matches.
+
+    Raises:
+        ExecutionFailed: If the rule uses an unsupported comparison.
+    """
+
+    # Combine nested rules
+    if 'And' in rule:
+        return all(evaluate_rule(item, data) for item in rule['And'])
+    if 'Or' in rule:
+        return any(evaluate_rule(item, data) for item in rule['Or'])
+    if 'Not' in rule:
+        return not evaluate_rule(rule['Not'], data)
+
+    # Read the variable, with a marker of its own for absence, as MISSING would make get_path raise
+    absent = object()
+    value = get_path(data, rule['Variable'], absent)
+    present = value is not absent
+
+    # Test for presence; any other test of a missing variable fails the execution, as in Step Functions
+    if 'IsPresent' in rule:
+        return present == rule['IsPresent']
+    if not present:
+        raise ExecutionFailed('States.Runtime', f"Invalid path {rule['Variable']}: the choice state's condition path references an invalid value")
+
+    # Evaluate the type tests
+    if 'IsNull' in rule:
+        return (value is None) == rule['IsNull']
+    if 'IsString' in rule:
+        return isinstance(value, str) == rule['IsString']
+    if 'IsBoolean' in rule:
+        return isinstance(value, bool) == rule['IsBoolean']
+    if 'IsNumeric' in rule:
+        return (isinstance(value, (int, float)) and not isinstance(value, bool)) == rule['IsNumeric']
+
+    # Evaluate the comparisons, against a literal or a path
+    comparisons: Dict[str, Callable[[Any, Any], bool]] = {
+        'StringEquals': lambda a, b: isinstance(a, str) and a == b,
+        'StringMatches': lambda a, b: isinstance(a, str) and re.fullmatch(re.escape(b).replace(r'\*', '.*'), a) is not None,
+        'BooleanEquals': lambda a, b: isinstance(a, bool) and a == b,
+        'NumericEquals': lambda a, b: isinstance(a, (int, float)) and a == b,
+        'NumericLessThan': lambda a, b: isinstance(a, (int, float)) and a < b,
+        'NumericLessThanEquals': lambda a, b: isinstance(a, (int, float)) and a <= b,
+        'NumericGreaterThan': lambda a, b: isinstance(a, (int, float)) and a > b,
+        'NumericGreaterThanEquals': lambda a, b: isinstance(a, (int, float)) and a >= b,
+    }
+    for name, compare in comparisons.items():
+        if name in rule:
+            return compare(value, rule[name])
+        if f'{name}Path' in rule:
+            return compare(value, get_path(data, rule[f'{name}Path']))
+
+    # Reject anything else
+    raise ExecutionFailed('States.Runtime', f'Unsupported Choice rule: {rule}')
+
+class StateMachine:
+    """Run an Amazon States Language definition in-process.
+
+    Task, Map, Choice, Wait, Pass, Succeed and Fail states are supported, with InputPath, Parameters,
+    ResultSelector, ResultPath, OutputPath, Retry and Catch. Wait states call on_wait instead of
+    sleeping, so a virtual clock can be advanced. Task states whose Resource ends with
+    '.waitForTaskToken' get a token in $$.Task.Token and then call wait_for_task_token, which
+    returns the output sent for the token or raises ExecutionFailed. Map iterations run in threads,
+    up to MaxConcurrency at once, and their states are recorded in the history as '<map>/<state>'.
+    """
+
+    def __init__(self, definition: Dict[str, Any], resolve_task: Callable[[Any], Callable[[Any], Any]],
+                 on_wait: Optional[Callable[[float], None]] = None,
+                 wait_for_task_token: Optional[Callable[[str, Optional[float]], Tuple[Any, float]]] = None) -> None:
+        """Initialize the state machine.
+
+        Args:
+            definition (Dict[str, Any]): The state machine definition.
+            resolve_task (Callable[[Any], Callable[[Any], Any]]): Returns the function run by a Task
+                state for its Resource.
+            on_wait (Optional[Callable[[float], None]]): Called with the seconds of each Wait state.
+            wait_for_task_token (Optional[Callable[[str, Optional[float]], Tuple[Any, float]]]): Called with
+                a task token and the state's TimeoutSeconds; returns the task output and the simulated
+                seconds waited.
+        """
+
+        # Keep the definition and the callbacks
+        self.definition = definition
+        self.resolve_task = resolve_task
+        self.on_wait = on_wait or (lambda seconds: None)
+        self.wait_for_task_token = wait_for_task_token
+
+    def run(self, execution_input: Any, name: str = 'local') -> Dict[str, Any]:
+        """Run an execution to completion.
+
+        Args:
+            execution_input (Any): The execution input.
+            name (str): The execution name, available as $$.Execution.Name.
+
+        Returns:
+            Dict[str, Any]: The 'status' (SUCCEEDED or FAILED), 'output' or 'error' and 'cause',
+                the 'history' of states with their elapsed milliseconds, and the simulated 'wait_seconds'.
+        """
+
+        # Initialize the execution
+        context = {'Execution': {'Name': name, 'Input': execution_input}, 'StateMachine': {'Name': 'local'}}
+        history: List[Dict[str, Any]] = []
+
+        # Run the states until the execution ends
+        try:
+            output, wait_seconds = self._run_states(self.definition, execution_input, context, history)
+            return {'status': 'SUCCEEDED', 'output': output, 'history': history, 'wait_seconds': wait_seconds}
+
+        # Report failed executions
+        except ExecutionFailed as e:
+            history.append({'state': context.get('State', {}).get('Name'), 'type': 'Failed', 'elapsed_ms': 0.0, 'wait_seconds': 0})
+            return {'status': 'FAILED', 'error': e.error, 'cause': e.cause, 'history': history, 'wait_seconds': e.wait_seconds}
+
+    def _run_states(self, definition: Dict[str, Any], data: Any, context: Dict[str, Any], history: List[Dict[str, Any]],
+                    prefix: str = '') -> Tuple[Any, float]:
+        """Run the states of a state machine or of a Map iteration from StartAt to their end.
+
+        Args:
+            definition (Dict[str, Any]): The definition with StartAt and States.
+            data (Any): The input.
+            context (Dict[str, Any]): The context object.
+            history (List[Dict[str, Any]]): The history the states are recorded in.
+            prefix (str): The prefix of the state names in the history.
+
+        Returns:
+            Tuple[Any, float]: The output and the simulated wait seconds.
+
+        Raises:
+            ExecutionFailed: If a state fails, carrying the seconds waited until then.
+        """
+
+        # Run the states one after the other
+        state_name = definition['StartAt']
+        wait_seconds = 0.0
+        try:
+            for _ in range(MAX_TRANSITIONS):
+                state = definition['States'][state_name]
+                context['State'] = {'Name': state_name, 'EnteredTime': time.time()}
+                started = time.perf_counter()
+                data, next_state, waited = self._run_state(state, data, context, history, f'{prefix}{state_name}/')
+                wait_seconds += waited
+                history.append({'state': f'{prefix}{state_name}', 'type': state['Type'],
+                                'elapsed_ms': round((time.perf_counter() - started) * 1000, 1), 'wait_seconds': waited})
+                if next_state is None:
+                    return data, wait_seconds
+                state_name = next_state
+            raise ExecutionFailed('States.Runtime', f'Execution exceeded {MAX_TRANSITIONS} transitions')
+
+        # Add the seconds waited to the failure
+        except ExecutionFailed as e:
+            e.wait_seconds += wait_seconds
+            raise
+
+    def _run_state(self, state: Dict[str, Any], data: Any, context: Dict[str, Any], history: List[Dict[str, Any]],
+                   prefix: str) -> Any:
+        """Run one state.
+
+        Args:
+            state (Dict[str, Any]): The state definition.
+            data (Any): The state input.
+            context (Dict[str, Any]): The context object.
+            history (List[Dict[str, Any]]): The history Map iterations are recorded in.
+            prefix (str): The prefix of the state names of Map iterations.
+
+        Returns:
+            Any: The state output, the next state name (None at the end), and the simulated wait seconds.
+        """
+
+        # Dispatch on the state type
+        state_type = state['Type']
+        if state_type == 'Choice':
+            for rule in state.get('Choices', []):
+                if evaluate_rule(rule, data):
+                    return data, rule['Next'], 0
+            if 'Default' not in state:
+                raise ExecutionFailed('States.NoChoiceMatched', 'No Choice rule matched and there is no Default')
+            return data, state['Default'], 0
+        if state_type == 'Succeed':
+            return self._output(state, self._input(state, data, context)), None, 0
+        if state_type == 'Fail':
+            raise ExecutionFailed(state.get('Error', 'States.Fail'), state.get('Cause', ''))
+        if state_type == 'Wait':
+            seconds = get_path(data, state['SecondsPath']) if 'SecondsPath' in state else state.get('Seconds', 0)
+            self.on_wait(float(seconds))
+            return self._output(state, self._input(state, data, context)), self._next(state), float(seconds)
+        if state_type == 'Pass':
+            effective_input = self._input(state, data, context)
+            result = state['Result'] if 'Result' in state else effective_input
+            return self._output(state, set_path(data, state.get('ResultPath', '$'), result)), self._next(state), 0
+        if state_type == 'Task':
+            return self._run_task(state, data, context)
+        if state_type == 'Map':
+            return self._run_map(state, data, context, history, prefix)
+        raise ExecutionFailed('States.Runtime', f'Unsupported state type: {state_type}')
+
+    def _run_map(self, state: Dict[str, Any], data: Any, context: Dict[str, Any], history: List[Dict[str, Any]],
+                 prefix: str) -> Any:
+        """Run a Map state, applying its Catch rules.
+
+        Each item is passed through ItemSelector (or Parameters), with the item in $$.Map.Item.Value,
+        and run through ItemProcessor (or Iterator). The iterations run at the same time, so the state
+        waits as long as its longest iteration.
+
+        Args:
+            state (Dict[str, Any]): The state definition.
+            data (Any): The state input.
+            context (Dict[str, Any]): The context object.
+            history (List[Dict[str, Any]]): The history the iterations are recorded in.
+            prefix (str): The prefix of the state names of the iterations.
+
+        Returns:
+            Any: The state output, the next state name, and the simulated wait seconds.
+        """
+
+        # Select the items
+        effective_input = get_path(data, state['InputPath']) if state.get('InputPath') else data
+        items = get_path(effective_input, state.get('ItemsPath', '$'))
+        if not isinstance(items, list):
+            raise ExecutionFailed('States.Runtime', f"Invalid ItemsPath {state.get('ItemsPath', '$')}: the value is not an array")
+        processor = state.get('ItemProcessor') or state['Iterator']
+        selector = state.get('ItemSelector', state.get('Parameters'))
+
+        # Run one iteration with its own context and history
+        def run_item(index: int, item: Any) -> Tuple[Any, float, List[Dict[str, Any]]]:
+            item_context = {**context, 'Map': {'Item': {'Index': index, 'Value': item}}}
+            item_input = resolve_parameters(selector, effective_input, item_context) if selector is not None else item
+            item_history: List[Dict[str, Any]] = []
+            try:
+                output, waited = self._run_states(processor, item_input, item_context, item_history, prefix)
+            finally:
+                history.extend(dict(entry, iteration=index) for entry in item_history)
+            return output, waited, item_history
+
+        # Run the iterations, up to MaxConcurrency at once, each in its own copy of the caller's context
+        # so that the handlers it invokes keep their own context variables, such as their metrics
+        try:
+            max_workers = state.get('MaxConcurrency') or len(items) or 1
+            map_context = contextvars.copy_context()
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                iterations = list(executor.map(lambda index, item: map_context.copy().run(run_item, index, item), range(len(items)), items))
+
+        # Apply the Catch rules to a failed iteration
+        except ExecutionFailed as e:
+            caught = self._catch(state, data, e.error, e.cause)
+            if caught is None:
+                raise
+            return caught[0], caught[1], e.wait_seconds
+
+        # Shape the results into the state output
+        result: Any = [output for output, _, _ in iterations]
+        if 'ResultSelector' in state:
+            result = resolve_parameters(state['ResultSelector'], result, context)
+        waited = max((item_waited for _, item_waited, _ in iterations), default=0.0)
+        return self._output(state, set_path(data, state.get('ResultPath', '$'), result)), self._next(state), waited
+
+    def _run_task(self, state: Dict[str, Any], data: Any, context: Dict[str, Any]) -> Any:
+        """Run a Task state, applying its Retry and Catch rules.
+
+        Args:
+            state (Dict[str, Any]): The state definition.
+            data (Any): The state input.
+            context (Dict[str, Any]): The context object.
+
+        Returns:
+            Any: The state output, the next state name, and the simulated wait seconds.
+        """
+
+        # Run the task, retrying as the Retry rules allow; each attempt of a callback task gets a new token
+        callback = isinstance(state['Resource'], str) and state['Resource'].endswith('.waitForTaskToken')
+        if callback and self.wait_for_task_token is None:
+            raise ExecutionFailed('States.Runtime', 'Callback tasks are not supported by this runner')
+        attempts: Dict[int, int] = {}
+        waited = 0.0
+        while True:
+            try:
+                if callback:
+                    context['Task'] = {'Token': uuid.uuid4().hex}
+                effective_input = self._input(state, data, context)
+                result = self.resolve_task(state['Resource'])(effective_input)
+                if callback:
+                    result, callback_waited = self.wait_for_task_token(context['Task']['Token'], state.get('TimeoutSeconds'))
+                    waited += callback_waited
+                break
+            except Exception as e:
+                error = getattr(e, 'error', type(e).__name__)
+                for index, retrier in enumerate(state.get('Retry', [])):
+                    if self._matches(retrier['ErrorEquals'], error) and attempts.get(index, 0) < retrier.get('MaxAttempts', 3):
+                        delay = retrier.get('IntervalSeconds', 1) * retrier.get('BackoffRate', 2.0) ** attempts.get(index, 0)
+                        attempts[index] = attempts.get(index, 0) + 1
+                        self.on_wait(delay)
+                        waited += delay
+                        break
+                else:
+                    caught = self._catch(state, data, error, getattr(e, 'cause', str(e)))
+                    if caught is not None:
+                        return caught[0], caught[1], waited
+                    raise ExecutionFailed(error, getattr(e, 'cause', str(e)))
+
+        # Shape the result into the state output
+        if 'ResultSelector' in state:
+            result = resolve_parameters(state['ResultSelector'], result, context)
+        return self._output(state, set_path(data, state.get('ResultPath', '$'), result)), self._next(state), waited
+
+    def _catch(self, state: Dict[str, Any], data: Any, error: str, cause: str) -> Optional[Tuple[Any, str]]:
+        """Apply the first Catch rule of a state that matches an error.
+
+        Args:
+            state (Dict[str, Any]): The state definition.
+            data (Any): The state input.
+            error (str): The error name.
+            cause (str): The description of the error.
+
+        Returns:
+            Optional[Tuple[Any, str]]: The state output and the next state name, or None if no rule matches.
+        """
+
+        # Place the error at the rule's ResultPath and continue at its Next state
+        for catcher in state.get('Catch', []):
+            if self._matches(catcher['ErrorEquals'], error):
+                return set_path(data, catcher.get('ResultPath', '$'), {'Error': error, 'Cause': cause}), catcher['Next']
+        return None
+
+    @staticmethod
+    def _matches(error_equals: List[str], error: str) -> bool:
+        """Check whether an error matches a Retry or Catch rule.
+
+        Args:
+            error_equals (List[str]): The error names of the rule.
+            error (str): The error name.
+
+        Returns:
+            bool: Whether the rule applies.
+        """
+
+        # States.ALL matches every error
+        return 'States.ALL' in error_equals or error in error_equals
+
+    @staticmethod
+    def _input(state: Dict[str, Any], data: Any, context: Dict[str, Any]) -> Any:
+        """Apply InputPath and Parameters.
+
+        Args:
+            state (Dict[str, Any]): The state definition.
+            data (Any): The state input.
+            context (Dict[str, Any]): The context object.
+
+        Returns:
+            Any: The effective input.
+        """
+
+        # Select and shape the input
+        effective_input = get_path(data, state['InputPath']) if state.get('InputPath') else data
+        if 'Parameters' in state:
+            effective_input = resolve_parameters(state['Parameters'], effective_input, context)
+        return effective_input
+
+    @staticmethod
+    def _output(state: Dict[str, Any], data: Any) -> Any:
+        """Apply OutputPath.
+
+        Args:
+            state (Dict[str, Any]): The state definition.
+            data (Any): The state output before OutputPath.
+
+        Returns:
+            Any: The state output.
+        """
+
+        # Select the output
+        return get_path(data, state['OutputPath']) if state.get('OutputPath') else data
+
+    @staticmethod
+    def _next(state: Dict[str, Any]) -> Optional[str]:
+        """Get the next state.
+
+        Args:
+            state (Dict[str, Any]): The state definition.
+
+        Returns:
+            Optional[str]: The next state name, or None if the state ends the execution.
+        """
+
+        # End states have no next state
+        return None if state.get('End') else state['Next']
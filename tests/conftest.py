@@ -0,0 +1,40 @@
+"""Shared fixtures of the unit tests.
+
+The Lambda handlers import their helpers as a top-level package, so the lambda directory is put on
+the path first, as in the deployed functions. AWS clients are replaced with the in-memory fakes of
+the local runner, without latency.
+"""
+
+import os
+import sys
+from typing import Iterator
+
+import pytest
+
+# Directory holding the repository
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Make the handlers and the local runner importable
+for path in (os.path.join(REPO_DIR, 'lambda'), REPO_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# Keep the handlers from writing metric log lines or looking for a region
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('METRICS_EMF', 'false')
+
+from helpers.clients import reset_clients, set_client
+from local_runner.fake_aws import FakeBehaviour, FakeS3
+
+# Bucket used by the tests
+BUCKET = 'speakeasy-test'
+
+@pytest.fixture
+def fake_s3() -> Iterator[FakeS3]:
+    """Provide an in-memory S3 without latency, handed to the handlers as their S3 client."""
+
+    # Install the fake client and remove it after the test
+    s3 = FakeS3(FakeBehaviour({'latency_scale': 0}))
+    set_client('s3', s3)
+    yield s3
+    reset_clients()
@@ -0,0 +1,66 @@
+"""Tests of the backfill's check for files that were already processed, run through the local pipeline."""
+
+import os
+from typing import Iterator
+
+import pytest
+
+from helpers.clients import reset_clients
+from local_runner.fake_aws import FakeBehaviour
+from local_runner.pipeline import LocalPipeline
+
+# Audio of the first upload and of a later version of the same file
+AUDIO = b'ID3' + bytes(4000)
+NEW_AUDIO = b'ID3' + bytes(6000)
+
+@pytest.fixture
+def pipeline() -> Iterator[LocalPipeline]:
+    """Provide a local pipeline without latency, restoring the environment it changes afterwards."""
+
+    # Build the pipeline, which applies the template environment
+    saved_environment = dict(os.environ)
+    yield LocalPipeline(behaviour=FakeBehaviour({'latency_scale': 0}),
+                        environment={'TARGET_LANGUAGES': 'es,fr', 'LOG_LEVEL': 'CRITICAL'})
+
+    # Restore the environment and the clients
+    os.environ.clear()
+    os.environ.update(saved_environment)
+    reset_clients()
+
+def backfill_counts(pipeline: LocalPipeline) -> dict:
+    report = pipeline.backfill('audio_inputs/')
+    assert all(execution['status'] == 'SUCCEEDED' for execution in report['executions'])
+    return report['backfill']['counts']
+
+def test_processed_file_is_skipped(pipeline):
+    pipeline.upload('audio_inputs/meeting.mp3', AUDIO)
+
+    assert backfill_counts(pipeline)['started'] == 1
+    assert backfill_counts(pipeline) == {'listed': 1, 'started': 0, 'skipped': 1, 'failed': 0}
+
+def test_new_version_is_processed_again(pipeline):
+    pipeline.upload('audio_inputs/meeting.mp3', AUDIO)
+    backfill_counts(pipeline)
+
+    pipeline.upload('audio_inputs/meeting.mp3', NEW_AUDIO)
+
+    assert backfill_counts(pipeline)['started'] == 1
+
+def test_file_sharing_a_name_is_not_skipped(pipeline):
+    pipeline.upload('audio_inputs/2025/meeting.mp3', AUDIO)
+    backfill_counts(pipeline)
+
+    pipeline.upload('audio_inputs/2026/meeting.mp3', AUDIO)
+
+    counts = backfill_counts(pipeline)
+    assert counts['started'] == 1
+    assert counts['skipped'] == 1
+
+def test_missing_language_is_processed(pipeline):
+    pipeline.upload('audio_inputs/meeting.mp3', AUDIO)
+    backfill_counts(pipeline)
+
+    # A file whose metadata asks for another language is not complete yet
+    pipeline.upload('audio_inputs/meeting.mp3', AUDIO, metadata={'target-languages': 'es,de'})
+
+    assert backfill_counts(pipeline)['started'] == 1
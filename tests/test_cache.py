@@ -0,0 +1,63 @@
+"""Tests of the S3 and local filesystem caches of stage outputs."""
+
+import time
+
+from botocore.exceptions import ClientError
+import pytest
+
+from conftest import BUCKET
+from helpers.cache import LRUIndex, LocalObjectCache, S3ObjectCache, get_object_cache
+
+def store_entries(fake_s3, cache, count: int) -> None:
+    for index in range(count):
+        fake_s3.store(BUCKET, f'outputs/{index}.txt', b'x' * 10)
+        cache.store_from(f'key-{index}', BUCKET, f'outputs/{index}.txt')
+        time.sleep(0.002)
+
+def test_s3_cache_round_trip(fake_s3):
+    cache = S3ObjectCache(fake_s3, BUCKET, 'cache/translations', 3600)
+    fake_s3.store(BUCKET, 'translations/a.txt', b'hola')
+
+    assert not cache.contains('key')
+    cache.store_from('key', BUCKET, 'translations/a.txt')
+    assert cache.contains('key')
+    cache.copy_to('key', BUCKET, 'translations/b.txt')
+
+    assert fake_s3.load(BUCKET, 'translations/b.txt') == b'hola'
+    assert cache.stats.to_dict() == {'hits': 1, 'misses': 1}
+
+def test_s3_cache_is_unbounded_by_default(fake_s3):
+    cache = S3ObjectCache(fake_s3, BUCKET, 'cache/translations/', 3600)
+    store_entries(fake_s3, cache, 5)
+    assert len(fake_s3.keys(BUCKET, 'cache/translations/')) == 5
+
+def test_s3_cache_evicts_oldest_entries(fake_s3):
+    index = LRUIndex(10)
+    cache = S3ObjectCache(fake_s3, BUCKET, 'cache/translations/', 3600, index, max_entries=3)
+    store_entries(fake_s3, cache, 5)
+
+    assert fake_s3.keys(BUCKET, 'cache/translations/') == [f'cache/translations/key-{index}' for index in (2, 3, 4)]
+    assert index.get('key-0') is None
+    assert cache.contains('key-4')
+
+def test_s3_cache_evicts_by_size(fake_s3):
+    cache = S3ObjectCache(fake_s3, BUCKET, 'cache/translations/', 3600, max_bytes=25)
+    store_entries(fake_s3, cache, 4)
+    assert fake_s3.keys(BUCKET, 'cache/translations/') == ['cache/translations/key-2', 'cache/translations/key-3']
+
+def test_s3_cache_settings_from_environment(fake_s3, monkeypatch):
+    monkeypatch.setenv('TRANSLATION_CACHE_MAX_ENTRIES', '2')
+    cache = get_object_cache(fake_s3, BUCKET, 'translation')
+    assert isinstance(cache, S3ObjectCache)
+    assert cache.prefix == 'cache/translations/'
+    assert cache.max_entries == 2
+
+def test_local_cache_missing_entry_raises_client_error(fake_s3, tmp_path):
+    cache = LocalObjectCache(fake_s3, str(tmp_path), 3600)
+    with pytest.raises(ClientError):
+        cache.copy_to('missing', BUCKET, 'translations/a.txt')
+
+def test_local_cache_evicts_oldest_files(fake_s3, tmp_path):
+    cache = LocalObjectCache(fake_s3, str(tmp_path), 3600, max_entries=2)
+    store_entries(fake_s3, cache, 4)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['key-2', 'key-3']
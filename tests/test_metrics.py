@@ -0,0 +1,29 @@
+"""Tests of recording the metrics of each handler invocation."""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from helpers.concurrency import in_current_context, ordered_map
+from helpers.metrics import get_metrics, instrumented
+
+@instrumented('counting')
+def counting_handler(event, context):
+    # Count on the handler's thread and on its worker threads
+    get_metrics().add_count('calls')
+    list(ordered_map(lambda _: get_metrics().add_count('calls'), range(event['workers']), 2))
+    event['barrier'].wait()
+    return {}
+
+def test_concurrent_invocations_record_their_own_metrics():
+    barrier = threading.Barrier(2)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = list(executor.map(lambda workers: counting_handler({'workers': workers, 'barrier': barrier}, None), [3, 5]))
+
+    assert [result['metrics']['counts']['calls'] for result in results] == [4, 6]
+
+def test_worker_threads_see_the_invocation_recorder():
+    recorder = get_metrics()
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        assert executor.submit(in_current_context(get_metrics)).result() is recorder
@@ -0,0 +1,93 @@
+"""Property-based tests of the parsing of S3 URIs and URLs."""
+
+from urllib.parse import quote
+
+import pytest
+from hypothesis import given, strategies as st
+
+from helpers.s3_uri import S3Location, S3UriError, is_s3_uri, parse_s3_uri, to_object_key
+
+# Label of a DNS-compatible bucket name
+LABEL = st.from_regex(r'\A[a-z0-9](?:[a-z0-9-]{0,8}[a-z0-9])?\Z')
+
+# Bucket names usable in virtual-hosted-style URLs, with and without dots
+BUCKETS = st.lists(LABEL, min_size=1, max_size=4).map('.'.join).filter(lambda bucket: 3 <= len(bucket) <= 63)
+
+# Object keys, including characters that need encoding; S3 keys are valid UTF-8, so no lone surrogates
+KEYS = st.text(
+    alphabet=st.one_of(st.sampled_from('+% /?#&=~.-_'), st.characters(exclude_categories=('Cs',))),
+    max_size=60
+)
+
+# Keys of objects, which are never empty
+OBJECT_KEYS = KEYS.filter(bool)
+
+# Regions of the commercial and China partitions
+REGIONS = st.sampled_from(['us-east-1', 'eu-west-1', 'ap-southeast-2', 'cn-north-1', 'us-gov-west-1'])
+
+def encode(key: str) -> str:
+    """Percent-encode a key the way S3 URLs carry it."""
+    return quote(key, safe='/~')
+
+@given(bucket=BUCKETS, key=KEYS)
+def test_s3_uri_round_trip(bucket, key):
+    location = S3Location(bucket, key)
+    assert parse_s3_uri(location.uri) == location
+
+@given(bucket=BUCKETS, key=OBJECT_KEYS, region=REGIONS)
+def test_path_style_url_round_trip(bucket, key, region):
+    location = S3Location(bucket, key)
+    assert parse_s3_uri(location.url(region)) == location
+
+@given(bucket=BUCKETS, key=OBJECT_KEYS, region=REGIONS, suffix=st.sampled_from(['amazonaws.com', 'amazonaws.com.cn']))
+def test_virtual_hosted_url_round_trip(bucket, key, region, suffix):
+    url = f'https://{bucket}.s3.{region}.{suffix}/{encode(key)}'
+    assert parse_s3_uri(url) == S3Location(bucket, key)
+
+@given(bucket=BUCKETS, key=OBJECT_KEYS, region=REGIONS)
+def test_legacy_regional_endpoints(bucket, key, region):
+    assert parse_s3_uri(f'https://s3-{region}.amazonaws.com/{bucket}/{encode(key)}') == S3Location(bucket, key)
+    assert parse_s3_uri(f'https://{bucket}.s3-{region}.amazonaws.com/{encode(key)}') == S3Location(bucket, key)
+
+@given(bucket=BUCKETS, key=OBJECT_KEYS)
+def test_global_endpoint(bucket, key):
+    assert parse_s3_uri(f'https://s3.amazonaws.com/{bucket}/{encode(key)}') == S3Location(bucket, key)
+    assert parse_s3_uri(f'https://{bucket}.s3.amazonaws.com/{encode(key)}') == S3Location(bucket, key)
+
+@given(bucket=BUCKETS, key=OBJECT_KEYS, region=REGIONS, suffix=st.sampled_from(['amazonaws.com', 'amazonaws.com.cn']))
+def test_dualstack_endpoints(bucket, key, region, suffix):
+    assert parse_s3_uri(f'https://s3.dualstack.{region}.{suffix}/{bucket}/{encode(key)}') == S3Location(bucket, key)
+    assert parse_s3_uri(f'https://{bucket}.s3.dualstack.{region}.{suffix}/{encode(key)}') == S3Location(bucket, key)
+
+@given(bucket=BUCKETS, region=REGIONS)
+def test_host_is_case_insensitive(bucket, region):
+    url = f'HTTPS://{bucket.upper()}.S3.{region.upper()}.AMAZONAWS.COM/Key'
+    assert parse_s3_uri(url) == S3Location(bucket, 'Key')
+
+@given(key=KEYS.filter(lambda key: not is_s3_uri(key)))
+def test_bare_keys_are_kept(key):
+    assert to_object_key(key) == key
+
+@pytest.mark.parametrize('key', ['a+b.txt', '100%.txt', 'my file.txt', 'café/ñandú 音声.wav', '/leading/slash', 'a//b'])
+def test_url_keys_are_decoded(key):
+    url = S3Location('my.dotted.bucket', key).url('eu-west-1')
+    assert parse_s3_uri(url).key == key
+    assert to_object_key(url) == key
+
+def test_plus_is_not_a_space():
+    assert parse_s3_uri('https://bucket.s3.amazonaws.com/a+b.txt').key == 'a+b.txt'
+
+def test_s3_uri_key_is_not_decoded():
+    assert parse_s3_uri('s3://bucket/a%20b.txt') == S3Location('bucket', 'a%20b.txt')
+
+@pytest.mark.parametrize('value', [
+    's3://',
+    's3:///key',
+    'https://s3.amazonaws.com/',
+    'https://example.com/bucket/key',
+    'https://bucket.s3.amazonaws.com.evil.example/key',
+    'ftp://s3.amazonaws.com/bucket/key'
+])
+def test_invalid_values_are_rejected(value):
+    with pytest.raises(S3UriError):
+        parse_s3_uri(value)
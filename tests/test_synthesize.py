@@ -0,0 +1,21 @@
+"""Tests of the synthesis of translations into speech."""
+
+import pytest
+
+import synthesize
+from conftest import BUCKET
+
+# Keys of the translation and of the audio synthesized from it
+TRANSLATION_KEY = 'translations/meeting_translation_es-0123456789abcdef.txt'
+AUDIO_KEY = 'audio_outputs/meeting_es-0123456789abcdef.mp3'
+
+# Polly voice of the translation
+VOICE = {'voice_id': 'Lucia', 'engine': 'neural'}
+
+def test_empty_translation_is_an_error(fake_s3):
+    fake_s3.store(BUCKET, TRANSLATION_KEY, b' \n ')
+
+    with pytest.raises(ValueError, match='empty'):
+        synthesize.synthesize_language(BUCKET, f's3://{BUCKET}/{TRANSLATION_KEY}', VOICE, AUDIO_KEY)
+
+    assert fake_s3.load(BUCKET, AUDIO_KEY) is None
@@ -0,0 +1,63 @@
+"""Tests of the splitting of transcripts into chunks for Amazon Translate."""
+
+import pytest
+
+from helpers.text_chunker import chunk_text, utf8_length
+
+# Transcript of many short sentences
+SENTENCES = ' '.join(f'This is sentence number {index}.' for index in range(500))
+
+def test_empty_text_has_no_chunks():
+    assert chunk_text('', 100) == []
+
+def test_max_size_must_be_positive():
+    with pytest.raises(ValueError):
+        chunk_text('Hello.', 0)
+
+def test_short_text_is_one_chunk():
+    assert chunk_text('Hello there. How are you?', 100) == ['Hello there. How are you?']
+
+@pytest.mark.parametrize('max_size', [40, 100, 1000, 10000])
+def test_chunks_respect_byte_limit_and_reassemble(max_size):
+    chunks = chunk_text(SENTENCES, max_size)
+    assert all(utf8_length(chunk) <= max_size for chunk in chunks)
+    assert ''.join(chunks) == SENTENCES
+
+def test_chunks_break_at_sentence_boundaries():
+    chunks = chunk_text(SENTENCES, 100)
+    assert len(chunks) > 1
+    assert all(chunk.rstrip().endswith('.') for chunk in chunks)
+
+def test_oversized_sentence_is_split_at_words():
+    sentence = ' '.join(['word'] * 100) + '.'
+    chunks = chunk_text(sentence, 50)
+    assert all(utf8_length(chunk) <= 50 for chunk in chunks)
+    assert ''.join(chunks) == sentence
+    assert all(chunk.strip().rstrip('.').replace('word', '').strip() == '' for chunk in chunks)
+
+def test_oversized_word_is_split_between_characters():
+    word = 'x' * 125
+    chunks = chunk_text(word, 50)
+    assert chunks == ['x' * 50, 'x' * 50, 'x' * 25]
+
+def test_multibyte_text_is_measured_in_bytes():
+    # Each of these characters takes three bytes in UTF-8
+    text = '这是一个测试。' * 50
+    chunks = chunk_text(text, 30)
+    assert all(utf8_length(chunk) <= 30 for chunk in chunks)
+    assert ''.join(chunks) == text
+
+def test_multibyte_characters_are_never_split():
+    # Four-byte characters cannot fill a five-byte chunk twice
+    text = '😀' * 10
+    chunks = chunk_text(text, 5)
+    assert chunks == ['😀'] * 10
+
+def test_custom_measure():
+    chunks = chunk_text('ab. cd. ef.', 4, measure=len)
+    assert all(len(chunk) <= 4 for chunk in chunks)
+    assert ''.join(chunks) == 'ab. cd. ef.'
+
+@pytest.mark.parametrize('text, max_size', [('   ', 100), (' \n\t ', 1), ('\n' * 50, 10)])
+def test_whitespace_only_text_has_no_chunks(text, max_size):
+    assert chunk_text(text, max_size) == []
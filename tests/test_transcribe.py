@@ -0,0 +1,58 @@
+"""Tests of starting transcription jobs and waiting for them in sync mode."""
+
+import json
+from typing import Any, Dict
+
+import pytest
+
+import transcribe
+from conftest import BUCKET
+from helpers.clients import set_client
+
+# Key of the uploaded audio
+AUDIO_KEY = 'audio_inputs/meeting.mp3'
+
+class StubTranscribe:
+    """Amazon Transcribe stand-in whose jobs complete as soon as they start."""
+
+    def __init__(self, s3: Any) -> None:
+        self.s3 = s3
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+
+    def start_transcription_job(self, **job: Any) -> Dict[str, Any]:
+        output = {'results': {'transcripts': [{'transcript': 'Hello there.'}]}}
+        self.s3.store(job['OutputBucketName'], job['OutputKey'], json.dumps(output).encode('utf-8'))
+        self.jobs[job['TranscriptionJobName']] = {
+            **job,
+            'TranscriptionJobStatus': 'COMPLETED',
+            'Transcript': {'TranscriptFileUri': f"https://s3.us-east-1.amazonaws.com/{job['OutputBucketName']}/{job['OutputKey']}"}
+        }
+        return {'TranscriptionJob': self.jobs[job['TranscriptionJobName']]}
+
+    def get_transcription_job(self, TranscriptionJobName: str) -> Dict[str, Any]:
+        return {'TranscriptionJob': self.jobs[TranscriptionJobName]}
+
+@pytest.fixture
+def uploaded(fake_s3, monkeypatch):
+    monkeypatch.setenv('TRANSCRIPT_CACHE_BACKEND', 'none')
+    set_client('transcribe', StubTranscribe(fake_s3))
+    fake_s3.store(BUCKET, AUDIO_KEY, b'ID3' + bytes(4000))
+    return fake_s3
+
+def test_sync_mode_returns_the_transcript_uri(uploaded):
+    result = transcribe.lambda_handler({'bucket': BUCKET, 'key': AUDIO_KEY, 'mode': 'sync'}, None)
+
+    assert result['status'] == 'COMPLETED'
+    assert result['cached'] is False
+    assert result['transcript_uri'] == f"https://s3.us-east-1.amazonaws.com/{BUCKET}/{result['transcript_key']}"
+    assert uploaded.load(BUCKET, result['transcript_key']) == b'Hello there.'
+
+def test_completed_results_have_the_same_fields(uploaded):
+    sync_result = transcribe.lambda_handler({'bucket': BUCKET, 'key': AUDIO_KEY, 'mode': 'sync'}, None)
+
+    # A retry of the same upload finds the saved transcript
+    retry_result = transcribe.lambda_handler({'bucket': BUCKET, 'key': AUDIO_KEY, 'mode': 'sync'}, None)
+
+    assert retry_result['status'] == 'COMPLETED'
+    assert retry_result['transcript_uri'] == sync_result['transcript_uri']
+    assert set(sync_result) - {'metrics'} <= set(retry_result)
@@ -0,0 +1,96 @@
+"""Tests of resuming the executions waiting for a transcription job."""
+
+import json
+from typing import Any, Dict
+
+import pytest
+
+import transcription_callback
+from conftest import BUCKET
+from helpers.clients import set_client
+from helpers.task_tokens import load_task_tokens, save_task_token, task_token_key, task_token_prefix
+from local_runner.fake_aws import FakeBehaviour, FakeStepFunctions
+
+# Job and transcript shared by every execution of the same upload
+JOB_NAME = 'meeting-0123456789abcdef'
+TRANSCRIPT_KEY = 'transcripts/meeting_transcript_en-US-0123456789abcdef.txt'
+
+class StubTranscribe:
+    """Amazon Transcribe stand-in that reports every job as failed."""
+
+    def get_transcription_job(self, TranscriptionJobName: str) -> Dict[str, Any]:
+        return {'TranscriptionJob': {'TranscriptionJobName': TranscriptionJobName, 'FailureReason': 'Unsupported audio'}}
+
+@pytest.fixture
+def stepfunctions(monkeypatch) -> FakeStepFunctions:
+    monkeypatch.setenv('S3_BUCKET', BUCKET)
+    client = FakeStepFunctions(FakeBehaviour({'latency_scale': 0}))
+    set_client('stepfunctions', client)
+    return client
+
+def job_event(status: str) -> Dict[str, Any]:
+    return {'detail': {'TranscriptionJobName': JOB_NAME, 'TranscriptionJobStatus': status}}
+
+def wait_for_job(s3, task_token: str) -> None:
+    save_task_token(s3, BUCKET, JOB_NAME, task_token, {
+        'bucket': BUCKET,
+        'key': 'audio_inputs/meeting.wav',
+        'original_filename': 'meeting.wav',
+        'transcript_key': TRANSCRIPT_KEY,
+        'cache_key': None
+    })
+
+def test_each_execution_keeps_its_own_token(fake_s3):
+    wait_for_job(fake_s3, 'token-1')
+    wait_for_job(fake_s3, 'token-2')
+
+    assert task_token_key(JOB_NAME, 'token-1') != task_token_key(JOB_NAME, 'token-2')
+    assert len(fake_s3.keys(BUCKET, task_token_prefix(JOB_NAME))) == 2
+    assert sorted(callback['task_token'] for callback in load_task_tokens(fake_s3, BUCKET, JOB_NAME)) == ['token-1', 'token-2']
+
+def test_completed_job_resumes_every_waiting_execution(fake_s3, stepfunctions):
+    fake_s3.store(BUCKET, TRANSCRIPT_KEY, json.dumps({'results': {'transcripts': [{'transcript': 'Hello.'}]}}).encode('utf-8'))
+    wait_for_job(fake_s3, 'token-1')
+    wait_for_job(fake_s3, 'token-2')
+
+    response = transcription_callback.lambda_handler(job_event('COMPLETED'), None)
+
+    assert response['handled'] is True
+    assert response['executions'] == 2
+    assert fake_s3.load(BUCKET, TRANSCRIPT_KEY) == b'Hello.'
+    for token in ('token-1', 'token-2'):
+        output = stepfunctions.take_task_outcome(token)['output']
+        assert output['status'] == 'COMPLETED'
+        assert output['transcript_key'] == TRANSCRIPT_KEY
+    assert fake_s3.keys(BUCKET, task_token_prefix(JOB_NAME)) == []
+
+    # A repeated delivery of the event finds no waiting execution
+    assert transcription_callback.lambda_handler(job_event('COMPLETED'), None)['handled'] is False
+
+def test_failed_job_fails_every_waiting_execution(fake_s3, stepfunctions):
+    set_client('transcribe', StubTranscribe())
+    wait_for_job(fake_s3, 'token-1')
+    wait_for_job(fake_s3, 'token-2')
+
+    response = transcription_callback.lambda_handler(job_event('FAILED'), None)
+
+    assert response['executions'] == 2
+    for token in ('token-1', 'token-2'):
+        outcome = stepfunctions.take_task_outcome(token)
+        assert outcome['error'] == 'TranscriptionFailed'
+        assert 'Unsupported audio' in outcome['cause']
+
+def test_ended_execution_does_not_block_the_others(fake_s3, stepfunctions):
+    fake_s3.store(BUCKET, TRANSCRIPT_KEY, json.dumps({'results': {'transcripts': [{'transcript': 'Hello.'}]}}).encode('utf-8'))
+    wait_for_job(fake_s3, 'token-1')
+    wait_for_job(fake_s3, 'token-2')
+
+    # The first execution was already resumed, as if by an earlier attempt
+    stepfunctions.send_task_success(taskToken='token-1', output='{}')
+    stepfunctions.take_task_outcome('token-1')
+
+    response = transcription_callback.lambda_handler(job_event('COMPLETED'), None)
+
+    assert response['executions'] == 2
+    assert stepfunctions.take_task_outcome('token-2')['output']['status'] == 'COMPLETED'
+    assert fake_s3.keys(BUCKET, task_token_prefix(JOB_NAME)) == []
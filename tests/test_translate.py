@@ -0,0 +1,115 @@
+"""Tests of the chunked translation of transcripts, against a stubbed Amazon Translate client."""
+
+import random
+import threading
+import time
+from typing import Any, Dict, List
+
+import pytest
+from botocore.exceptions import ClientError
+
+import translate
+from conftest import BUCKET
+from helpers.clients import set_client
+from helpers.text_chunker import chunk_text
+
+# Key the translations are saved to
+TRANSLATION_KEY = 'translations/meeting_translation_es-0123456789abcdef.txt'
+
+class StubTranslate:
+    """Amazon Translate stand-in that tags each chunk and finishes chunks in random order."""
+
+    def __init__(self, fail_on: str = '') -> None:
+        self.fail_on = fail_on
+        self.requests: List[Dict[str, Any]] = []
+        self.lock = threading.Lock()
+
+    def translate_text(self, Text: str, SourceLanguageCode: str, TargetLanguageCode: str, **kwargs: Any) -> Dict[str, Any]:
+        with self.lock:
+            self.requests.append({'Text': Text, 'TargetLanguageCode': TargetLanguageCode, **kwargs})
+
+        # Delay the response so later chunks often finish first
+        time.sleep(random.uniform(0, 0.005))
+        if self.fail_on and self.fail_on in Text:
+            raise ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, 'TranslateText')
+
+        # Amazon Translate trims the whitespace around the text
+        return {'TranslatedText': f'[{TargetLanguageCode}] {Text.strip()}'}
+
+class BrokenCache:
+    """Cache that reports every entry as present but cannot copy any of them."""
+
+    def __init__(self) -> None:
+        self.stored: List[str] = []
+
+    def contains(self, cache_key: str) -> bool:
+        return True
+
+    def copy_to(self, cache_key: str, bucket: str, key: str) -> None:
+        raise ClientError({'Error': {'Code': 'NoSuchKey', 'Message': 'Gone'}}, 'CopyObject')
+
+    def store_from(self, cache_key: str, bucket: str, key: str) -> None:
+        self.stored.append(cache_key)
+
+@pytest.fixture
+def synthetic_transcript() -> str:
+    """Build a transcript large enough to need many TranslateText requests."""
+    return ' '.join(f'Sentence {index} of the synthetic transcript.' for index in range(5000))
+
+def install_stub(monkeypatch: pytest.MonkeyPatch, stub: StubTranslate) -> StubTranslate:
+    set_client('translate', stub)
+    monkeypatch.setenv('TRANSLATE_CHUNK_MAX_WORKERS', '8')
+    return stub
+
+def test_translation_keeps_chunk_order(fake_s3, monkeypatch, synthetic_transcript):
+    stub = install_stub(monkeypatch, StubTranslate())
+    chunks = chunk_text(synthetic_transcript, translate.MAX_TRANSLATE_BYTES)
+    assert len(chunks) > 10
+
+    uri, error = translate.translate_language(chunks, 'es', BUCKET, TRANSLATION_KEY, [], 'hash')
+
+    assert error is None
+    assert uri == f's3://{BUCKET}/{TRANSLATION_KEY}'
+    assert len(stub.requests) == len(chunks)
+    assert all(len(request['Text'].encode('utf-8')) <= translate.MAX_TRANSLATE_BYTES for request in stub.requests)
+    expected = ' '.join(f'[es] {chunk.strip()}' for chunk in chunks)
+    assert fake_s3.load(BUCKET, TRANSLATION_KEY).decode('utf-8') == expected
+
+def test_translation_passes_terminologies(fake_s3, monkeypatch):
+    stub = install_stub(monkeypatch, StubTranslate())
+
+    uri, error = translate.translate_language(['Hello.'], 'fr', BUCKET, TRANSLATION_KEY, ['glossary'], 'hash')
+
+    assert error is None
+    assert stub.requests == [{'Text': 'Hello.', 'TargetLanguageCode': 'fr', 'TerminologyNames': ['glossary']}]
+
+def test_failing_chunk_fails_the_language(fake_s3, monkeypatch, synthetic_transcript):
+    install_stub(monkeypatch, StubTranslate(fail_on='Sentence 2500 '))
+    chunks = chunk_text(synthetic_transcript, translate.MAX_TRANSLATE_BYTES)
+
+    uri, error = translate.translate_language(chunks, 'de', BUCKET, TRANSLATION_KEY, [], 'hash')
+
+    assert uri is None
+    assert error.startswith('Translation failed for de.')
+    assert 'ThrottlingException' in error
+
+def test_cache_copy_failure_falls_back_to_translating(fake_s3, monkeypatch):
+    stub = install_stub(monkeypatch, StubTranslate())
+    cache = BrokenCache()
+
+    uri, error = translate.translate_language(['Hello.'], 'it', BUCKET, TRANSLATION_KEY, [], 'hash', cache=cache)
+
+    assert error is None
+    assert len(stub.requests) == 1
+    assert len(cache.stored) == 1
+    assert fake_s3.load(BUCKET, TRANSLATION_KEY) == b'[it] Hello.'
+
+def test_empty_transcript_is_an_error(fake_s3, monkeypatch):
+    stub = install_stub(monkeypatch, StubTranslate())
+
+    uri, error = translate.translate_language(chunk_text('  \n ', translate.MAX_TRANSLATE_BYTES), 'es', BUCKET, TRANSLATION_KEY, [], 'hash')
+
+    assert uri is None
+    assert 'empty' in error
+    assert stub.requests == []
+    assert fake_s3.load(BUCKET, TRANSLATION_KEY) is None
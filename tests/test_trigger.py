@@ -0,0 +1,91 @@
+"""Tests of starting executions for the uploads delivered to the trigger."""
+
+import json
+from typing import Any, Dict
+
+import pytest
+
+import trigger
+from conftest import BUCKET
+from helpers.clients import set_client
+from local_runner.fake_aws import FakeBehaviour, FakeStepFunctions
+
+# State machine the executions are started on
+STATE_MACHINE_ARN = 'arn:aws:states:us-east-1:123456789012:stateMachine:speakeasy-test'
+
+@pytest.fixture
+def stepfunctions(fake_s3, monkeypatch) -> FakeStepFunctions:
+    monkeypatch.setenv('STATE_MACHINE_ARN', STATE_MACHINE_ARN)
+    monkeypatch.setenv('MAX_BATCH_SIZE', '1')
+    client = FakeStepFunctions(FakeBehaviour({'latency_scale': 0}))
+    set_client('stepfunctions', client)
+    return client
+
+def sqs_record(message_id: str, key: str) -> Dict[str, Any]:
+    notification = {'Records': [{'s3': {'bucket': {'name': BUCKET}, 'object': {'key': key}}}]}
+    return {'eventSource': 'aws:sqs', 'messageId': message_id, 'body': json.dumps(notification)}
+
+def upload(fake_s3, key: str) -> None:
+    fake_s3.store(BUCKET, key, b'ID3' + bytes(100))
+
+def test_valid_records_are_started(fake_s3, stepfunctions):
+    upload(fake_s3, 'audio_inputs/one.mp3')
+    upload(fake_s3, 'audio_inputs/two two.mp3')
+
+    response = trigger.lambda_handler({'Records': [sqs_record('m1', 'audio_inputs/one.mp3'), sqs_record('m2', 'audio_inputs/two+two.mp3')]}, None)
+
+    assert response['statusCode'] == 200
+    assert response['batchItemFailures'] == []
+    assert [execution['input']['key'] for execution in stepfunctions.executions] == ['audio_inputs/one.mp3', 'audio_inputs/two two.mp3']
+
+@pytest.mark.parametrize('malformed', [
+    {'eventSource': 'aws:sqs', 'messageId': 'bad', 'body': 'not json'},
+    {'eventSource': 'aws:sqs', 'messageId': 'bad', 'body': json.dumps({'Records': [{'s3': {'bucket': {}}}]})},
+    {'eventSource': 'aws:sqs', 'messageId': 'bad'}
+])
+def test_malformed_record_is_reported_and_others_started(fake_s3, stepfunctions, malformed):
+    upload(fake_s3, 'audio_inputs/one.mp3')
+    upload(fake_s3, 'audio_inputs/two.mp3')
+    event = {'Records': [sqs_record('m1', 'audio_inputs/one.mp3'), malformed, sqs_record('m2', 'audio_inputs/two.mp3')]}
+
+    response = trigger.lambda_handler(event, None)
+
+    assert response['statusCode'] == 207
+    assert response['batchItemFailures'] == [{'itemIdentifier': 'bad'}]
+    assert len(stepfunctions.executions) == 2
+    results = json.loads(response['body'])['results']
+    assert [result['status'] for result in results] == ['STARTED', 'STARTED', 'FAILED']
+
+def test_only_malformed_records(fake_s3, stepfunctions):
+    event = {'Records': [{'eventSource': 'aws:sqs', 'messageId': 'bad', 'body': '{'}]}
+
+    response = trigger.lambda_handler(event, None)
+
+    assert response['statusCode'] == 400
+    assert response['batchItemFailures'] == [{'itemIdentifier': 'bad'}]
+    assert stepfunctions.executions == []
+
+def test_event_without_records(fake_s3, stepfunctions):
+    assert trigger.lambda_handler({}, None)['statusCode'] == 400
+
+def test_redelivered_batch_is_started_once(fake_s3, stepfunctions):
+    upload(fake_s3, 'audio_inputs/one.mp3')
+    event = {'Records': [sqs_record('m1', 'audio_inputs/one.mp3')]}
+
+    first = trigger.lambda_handler(event, None)
+    second = trigger.lambda_handler(event, None)
+
+    assert len(stepfunctions.executions) == 1
+    assert [result['status'] for result in json.loads(first['body'])['results']] == ['STARTED']
+    assert [result['status'] for result in json.loads(second['body'])['results']] == ['ALREADY_STARTED']
+    assert second['batchItemFailures'] == []
+
+def test_new_upload_under_same_key_is_started_again(fake_s3, stepfunctions):
+    event = {'Records': [sqs_record('m1', 'audio_inputs/one.mp3')]}
+
+    upload(fake_s3, 'audio_inputs/one.mp3')
+    trigger.lambda_handler(event, None)
+    fake_s3.store(BUCKET, 'audio_inputs/one.mp3', b'ID3' + bytes(200))
+    trigger.lambda_handler(event, None)
+
+    assert len(stepfunctions.executions) == 2